@@ -0,0 +1,238 @@
+from collections import Counter, deque
+import asyncio
+import threading
+import time
+
+from rest_framework import status
+
+from .conf import import_setting
+from .constants import RATE_LIMIT_ERROR_TYPE, SERVER_BUSY_ERROR_TYPE
+from .metrics import (
+    IMPORT_ADMISSION_EVENTS,
+    IMPORT_MEMORY_RESERVED,
+    IMPORT_QUEUE_DEPTH,
+    IMPORT_QUEUE_WAIT_SECONDS,
+    IMPORTS_RUNNING,
+)
+from .parsing import ESTIMATED_ROW_BYTES
+from .utils import ServiceError
+
+
+class AdmissionRejected(ServiceError):
+    """An import refused by ``AdmissionController``, answered with ``Retry-After``."""
+
+    def __init__(self, detail, status_code, error_type, retry_after=None):
+        super().__init__(detail=detail, status_code=status_code, error_type=error_type)
+        self.retry_after = retry_after
+
+
+def declared_length(request):
+    """The request's ``Content-Length`` as an int, or None when missing or invalid."""
+    try:
+        return int(request.META.get("CONTENT_LENGTH") or 0) or None
+    except ValueError:
+        return None
+
+
+def estimate_import_memory(content_length: int = None) -> int:
+    """Bytes an import of a ``content_length`` bytes request holds at its peak.
+
+    Rows are estimated from the length. Uploads small enough to be parsed
+    while received keep all their rows in memory until the import runs,
+    larger ones are read one ``CHUNK_SIZE`` chunk at a time; unknown lengths
+    count as one full chunk.
+    """
+    chunk_rows = import_setting("CHUNK_SIZE")
+    if not content_length:
+        rows = chunk_rows
+    else:
+        rows = max(content_length // ESTIMATED_ROW_BYTES, 1)
+        stream_limit = import_setting("STREAM_PARSE_MAX_BYTES")
+        if not (stream_limit and content_length <= stream_limit):
+            rows = min(rows, chunk_rows)
+    return rows * import_setting("IMPORT_ROW_MEMORY_BYTES")
+
+
+class AdmissionTicket:
+    """A place in the queue, then a running slot until ``release`` is called."""
+
+    def __init__(self, controller, ident, memory, wake=None):
+        self.controller = controller
+        self.ident = ident
+        self.memory = memory
+        self.wake = wake
+        self.granted = False
+        self.released = False
+        self.queued_at = time.monotonic()
+
+    def release(self):
+        self.controller.release(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+class AdmissionController:
+    """Process wide limits on the imports running at the same time.
+
+    An import is admitted when fewer than ``IMPORT_MAX_CONCURRENT`` imports
+    run and its ``estimate_import_memory`` fits in what is left of
+    ``IMPORT_MEMORY_BUDGET``; an import larger than the whole budget is
+    admitted once nothing else runs. Otherwise it waits in a FIFO queue of
+    at most ``IMPORT_QUEUE_SIZE`` entries for ``IMPORT_QUEUE_TIMEOUT``
+    seconds and is refused with a 503 when the queue is full or the wait
+    runs out. A client with ``IMPORT_MAX_CONCURRENT_PER_USER`` imports
+    running or queued is refused at once with a 429. A limit of 0 turns it
+    off.
+
+    Sync views block in ``acquire`` and async views await ``aacquire``; both
+    are woken by ``release`` in queue order.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queue = deque()
+        self._per_ident = Counter()
+        self.running = 0
+        self.memory = 0
+
+    def acquire(self, ident, content_length: int = None) -> AdmissionTicket:
+        event = threading.Event()
+        ticket = self._enqueue(ident, content_length, event.set)
+        if not ticket.granted:
+            event.wait(import_setting("IMPORT_QUEUE_TIMEOUT"))
+            self._finish_wait(ticket)
+        return ticket
+
+    async def aacquire(self, ident, content_length: int = None) -> AdmissionTicket:
+        loop = asyncio.get_running_loop()
+        admitted = loop.create_future()
+
+        def wake():
+            # Called by ``release`` from whichever thread finished an import.
+            loop.call_soon_threadsafe(
+                lambda: admitted.done() or admitted.set_result(None)
+            )
+
+        ticket = self._enqueue(ident, content_length, wake)
+        if not ticket.granted:
+            try:
+                await asyncio.wait_for(admitted, import_setting("IMPORT_QUEUE_TIMEOUT"))
+            except asyncio.TimeoutError:
+                pass
+            except asyncio.CancelledError:
+                # The client went away while queued.
+                self._finish_wait(ticket, raise_on_timeout=False)
+                ticket.release()
+                raise
+            self._finish_wait(ticket)
+        return ticket
+
+    def release(self, ticket: AdmissionTicket):
+        with self._lock:
+            if not ticket.granted or ticket.released:
+                return
+            ticket.released = True
+            self.running -= 1
+            self.memory -= ticket.memory
+            self._leave(ticket.ident)
+            woken = self._admit_waiting()
+            self._publish()
+        for wake in woken:
+            wake()
+
+    def _enqueue(self, ident, content_length, wake) -> AdmissionTicket:
+        ticket = AdmissionTicket(self, ident, estimate_import_memory(content_length), wake)
+        with self._lock:
+            per_user = import_setting("IMPORT_MAX_CONCURRENT_PER_USER")
+            if per_user and self._per_ident[ident] >= per_user:
+                IMPORT_ADMISSION_EVENTS.inc(outcome="rejected_per_user")
+                raise AdmissionRejected(
+                    detail="Too many concurrent imports for this client",
+                    status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                    error_type=RATE_LIMIT_ERROR_TYPE,
+                    retry_after=self._retry_after(),
+                )
+            if not self._queue and self._fits(ticket):
+                self._per_ident[ident] += 1
+                self._admit(ticket)
+                self._publish()
+                IMPORT_ADMISSION_EVENTS.inc(outcome="admitted")
+                return ticket
+            queue_size = import_setting("IMPORT_QUEUE_SIZE")
+            timeout = import_setting("IMPORT_QUEUE_TIMEOUT")
+            if not timeout or len(self._queue) >= queue_size:
+                IMPORT_ADMISSION_EVENTS.inc(outcome="rejected_queue_full")
+                raise self._busy("Import queue is full, try again later")
+            self._per_ident[ident] += 1
+            self._queue.append(ticket)
+            self._publish()
+            IMPORT_ADMISSION_EVENTS.inc(outcome="queued")
+            return ticket
+
+    def _finish_wait(self, ticket, raise_on_timeout=True):
+        with self._lock:
+            granted = ticket.granted
+            woken = []
+            if not granted:
+                self._queue.remove(ticket)
+                self._leave(ticket.ident)
+                # The head of the queue may have been what held the rest back.
+                woken = self._admit_waiting()
+                self._publish()
+        for wake in woken:
+            wake()
+        outcome = "admitted" if granted else "timeout" if raise_on_timeout else "cancelled"
+        IMPORT_QUEUE_WAIT_SECONDS.observe(time.monotonic() - ticket.queued_at, outcome=outcome)
+        if not granted and raise_on_timeout:
+            IMPORT_ADMISSION_EVENTS.inc(outcome="timeout")
+            raise self._busy("Timed out waiting for an import slot, try again later")
+
+    def _leave(self, ident):
+        self._per_ident[ident] -= 1
+        if not self._per_ident[ident]:
+            del self._per_ident[ident]
+
+    def _fits(self, ticket) -> bool:
+        max_running = import_setting("IMPORT_MAX_CONCURRENT")
+        if max_running and self.running >= max_running:
+            return False
+        budget = import_setting("IMPORT_MEMORY_BUDGET")
+        return not budget or not self.running or self.memory + ticket.memory <= budget
+
+    def _admit(self, ticket):
+        ticket.granted = True
+        self.running += 1
+        self.memory += ticket.memory
+
+    def _admit_waiting(self):
+        """Admit queued tickets in order while the head fits; returns their wake-ups."""
+        woken = []
+        while self._queue and self._fits(self._queue[0]):
+            ticket = self._queue.popleft()
+            self._admit(ticket)
+            woken.append(ticket.wake)
+        return woken
+
+    def _publish(self):
+        IMPORTS_RUNNING.set(self.running)
+        IMPORT_MEMORY_RESERVED.set(self.memory)
+        IMPORT_QUEUE_DEPTH.set(len(self._queue))
+
+    def _busy(self, detail):
+        return AdmissionRejected(
+            detail=detail,
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            error_type=SERVER_BUSY_ERROR_TYPE,
+            retry_after=self._retry_after(),
+        )
+
+    @staticmethod
+    def _retry_after():
+        return max(1, import_setting("IMPORT_QUEUE_TIMEOUT"))
+
+
+import_admission = AdmissionController()
@@ -0,0 +1,54 @@
+import hashlib
+
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+from django.core.cache import cache
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+from .conf import import_setting
+from .dedup import lower_emails
+from .models import SERVICE_ACCOUNT_HASHER
+
+
+class ServiceAccountPasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 with ``SERVICE_ACCOUNT_HASH_ITERATIONS`` rounds.
+
+    Used for users flagged ``is_service_account``: machine clients that log
+    in often with long random passwords, where the default million rounds
+    cost more than they protect. Changing the setting rehashes a password on
+    its next successful login.
+    """
+
+    algorithm = SERVICE_ACCOUNT_HASHER
+
+    @property
+    def iterations(self):
+        return import_setting("SERVICE_ACCOUNT_HASH_ITERATIONS")
+
+
+def _missing_key(email: str) -> str:
+    # Hashed so that any email is a valid key for every cache backend.
+    digest = hashlib.sha256(email.strip().lower().encode()).hexdigest()
+    return f"login:missing:{digest}"
+
+
+def find_login_user(email: str):
+    """Return the user whose email matches ``email`` ignoring case, or None.
+
+    Both sides are lowered by the database so the lookup uses the
+    ``Lower("email")`` index, unlike ``email__iexact``. Emails without a user
+    are remembered for ``LOGIN_MISSING_CACHE_TTL`` seconds, so repeated
+    attempts with an unknown email skip the query.
+    """
+    ttl = import_setting("LOGIN_MISSING_CACHE_TTL")
+    key = _missing_key(email)
+    if ttl and cache.get(key):
+        return None
+    user = lower_emails().filter(lower_email=Lower(Value(email))).order_by("pk").first()
+    if user is None and ttl:
+        cache.set(key, True, ttl)
+    return user
+
+
+def forget_missing_email(email: str):
+    cache.delete(_missing_key(email))
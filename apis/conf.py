@@ -0,0 +1,80 @@
+from django.conf import settings
+
+DEFAULTS = {
+    # Number of csv rows parsed and validated at a time.
+    "CHUNK_SIZE": 50_000,
+    # csv parser: "pyarrow", "c", or "auto" for pyarrow when it is installed.
+    "PARSER_ENGINE": "auto",
+    # Number of users sent to the database per INSERT statement; every batch
+    # runs in its own transaction.
+    "BATCH_SIZE": 1_000,
+    # Existing emails at insert time: "error" fails the batch, "ignore" skips
+    # them and "update" overwrites their name and age.
+    "INSERT_CONFLICTS": "error",
+    # Parse uploads spooled to disk from a memory map of the temporary file.
+    "MMAP_UPLOADS": True,
+    # Multipart csv uploads up to this many bytes are parsed while they are
+    # received (see apis.upload_handlers); 0 turns it off. Parsed chunks are
+    # held in memory until the import runs.
+    "STREAM_PARSE_MAX_BYTES": 32 * 1024 * 1024,
+    # Admission control of synchronous uploads, per worker process; 0 turns
+    # a limit off. Imports running at once, in total and per client.
+    "IMPORT_MAX_CONCURRENT": 4,
+    "IMPORT_MAX_CONCURRENT_PER_USER": 2,
+    # Estimated bytes the running imports may hold together, at
+    # IMPORT_ROW_MEMORY_BYTES per row resident during an import.
+    "IMPORT_MEMORY_BUDGET": 1024 * 1024 * 1024,
+    "IMPORT_ROW_MEMORY_BYTES": 600,
+    # Uploads waiting for a slot, and seconds they wait before a 503.
+    "IMPORT_QUEUE_SIZE": 16,
+    "IMPORT_QUEUE_TIMEOUT": 30,
+    # Number of background threads running asynchronous import jobs.
+    "JOB_WORKERS": 2,
+    # Largest file a resumable upload session may declare, 0 for no limit.
+    "UPLOAD_SESSION_MAX_BYTES": 4 * 1024 * 1024 * 1024,
+    # Seconds an open upload session is kept after its last part.
+    "UPLOAD_SESSION_TTL": 86_400,
+    # Seconds the file of a failed import job is kept for resuming it.
+    "FAILED_IMPORT_TTL": 86_400,
+    # How existing emails are found: "query" looks up only the emails of each
+    # chunk, "snapshot" loads the whole table once per upload as strings,
+    # "hashed" as a sorted array of 64-bit hashes, "shared" reuses one hashed
+    # snapshot across uploads and refreshes it incrementally, "bloom" uses a
+    # Bloom filter confirmed against the database, and "none" leaves it to
+    # INSERT_CONFLICTS.
+    "EMAIL_LOOKUP": "shared",
+    "BLOOM_FALSE_POSITIVE_RATE": 0.01,
+    # Seconds before the shared email snapshot is fully reloaded.
+    "EMAIL_SNAPSHOT_MAX_AGE": 300,
+    # Worker processes used to validate large chunks, 0 keeps validation serial.
+    "PARALLEL_WORKERS": 0,
+    # Chunks with fewer rows than this are always validated serially.
+    "PARALLEL_MIN_ROWS": 20_000,
+    # Replay results of identical re-uploads: "off", "hash" for any upload
+    # with the same content, "key" only for requests with an Idempotency-Key.
+    # "hash" replays even when the database changed since the first upload.
+    "RESULT_CACHE": "key",
+    "RESULT_CACHE_TTL": 3600,
+    "RESULT_CACHE_MAX_ENTRIES": 1000,
+    # Seconds a per-row rejection report stays downloadable.
+    "REJECTION_REPORT_TTL": 86_400,
+    # PBKDF2 rounds for the passwords of users flagged is_service_account.
+    "SERVICE_ACCOUNT_HASH_ITERATIONS": 10_000,
+    # Seconds an email without a user is answered from the cache on login,
+    # 0 always queries the database.
+    "LOGIN_MISSING_CACHE_TTL": 30,
+    # SQLite PRAGMAs applied to every connection, see apis.db.DB_PROFILES:
+    # "import" enables WAL, "default" keeps SQLite's settings.
+    "DB_PROFILE": "import",
+    # Per-stage upload timing: Server-Timing headers, logs and /api/metrics/.
+    "METRICS_ENABLED": True,
+    # Upload throttling algorithm: "token_bucket" or "sliding_window".
+    "THROTTLE_ALGORITHM": "token_bucket",
+    # Where throttle state lives: "local", "cache" or "database".
+    "THROTTLE_STORE": "local",
+}
+
+
+def import_setting(name: str):
+    """Read a value from ``settings.CSV_IMPORT`` falling back to the defaults."""
+    return getattr(settings, "CSV_IMPORT", {}).get(name, DEFAULTS[name])
@@ -1,3 +1,21 @@
 VALIDATION_ERROR_TYPE = "validation_error"
 INTERNAL_ERROR_TYPE = "server_error"
 CLIENT_ERROR_TYPE = "client_error"
+RATE_LIMIT_ERROR_TYPE = "rate_limit_error"
+SERVER_BUSY_ERROR_TYPE = "server_busy_error"
+
+NULL_EMAIL_FAILURE = "null_email"
+EXISTING_EMAIL_FAILURE = "existing_email"
+DUPLICATE_EMAIL_FAILURE = "duplicate_email"
+INVALID_NAME_FAILURE = "invalid_name"
+INVALID_EMAIL_FAILURE = "invalid_email"
+INVALID_AGE_FAILURE = "invalid_age"
+
+UPLOAD_FAILURE_MESSAGES = {
+    NULL_EMAIL_FAILURE: "user records failed due to null email",
+    EXISTING_EMAIL_FAILURE: "user records failed due to existing email",
+    DUPLICATE_EMAIL_FAILURE: "user records failed due to duplicate email within file",
+    INVALID_NAME_FAILURE: "user records failed due to invalid name",
+    INVALID_EMAIL_FAILURE: "user records failed due to invalid email",
+    INVALID_AGE_FAILURE: "user records failed due to invalid age",
+}
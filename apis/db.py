@@ -0,0 +1,50 @@
+from .conf import import_setting
+
+# PRAGMAs run on every new SQLite connection, by ``DB_PROFILE`` name.
+DB_PROFILES = {
+    # Leaves SQLite's defaults alone. journal_mode is stored in the database
+    # file, so switching back from "import" does not leave WAL mode.
+    "default": {},
+    # WAL lets readers carry on while an import writes and commits; with it
+    # synchronous=NORMAL only syncs at checkpoints, which can lose the last
+    # commits on power loss but never corrupts the database.
+    "import": {
+        "journal_mode": "wal",
+        "synchronous": "normal",
+        # Negative sizes are KiB: 64 MiB of page cache per connection.
+        "cache_size": -65_536,
+        "mmap_size": 256 * 1024 * 1024,
+    },
+}
+
+
+def get_db_profile(name: str = None) -> dict:
+    name = name or import_setting("DB_PROFILE")
+    try:
+        return DB_PROFILES[name]
+    except KeyError:
+        raise ValueError(
+            f"Unknown DB_PROFILE {name!r}, expected one of {sorted(DB_PROFILES)}"
+        )
+
+
+def apply_db_profile(connection, name: str = None):
+    """Run the PRAGMAs of a profile on a freshly opened SQLite connection."""
+    if connection.vendor != "sqlite":
+        return
+    pragmas = get_db_profile(name)
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in pragmas.items():
+            cursor.execute(f"PRAGMA {pragma} = {value}")
+
+
+def read_pragmas(connection, names=("journal_mode", "synchronous", "cache_size", "mmap_size")):
+    with connection.cursor() as cursor:
+        values = {}
+        for name in names:
+            cursor.execute(f"PRAGMA {name}")
+            row = cursor.fetchone()
+            values[name] = row[0] if row else None
+        return values
@@ -0,0 +1,381 @@
+from collections import Counter
+import math
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from django.db import connection
+from django.db.models import F
+from django.db.models.functions import Lower
+
+from .conf import import_setting
+from .metrics import EMAIL_SNAPSHOT_EVENTS
+from .models import User
+from .schema import EMAIL
+
+# Keeps every IN (...) below SQLite's host parameter limit.
+LOOKUP_BATCH_SIZE = 500
+# Emails streamed from the database per batch while building an index.
+LOAD_BATCH_SIZE = 50_000
+
+
+def lower_emails():
+    return User.objects.annotate(lower_email=Lower("email"))
+
+
+class QueryIndex:
+    """Look up only the values present in the chunk being validated.
+
+    Queries run in batches against an index on ``field``, so the cost follows
+    the size of the upload instead of the size of the table. Rows inserted
+    by earlier chunks are already in the table and need no separate
+    bookkeeping. ``lowercase`` compares against ``Lower(field)``.
+    """
+
+    def __init__(
+        self,
+        model,
+        field: str,
+        lowercase: bool = False,
+        batch_size: int = LOOKUP_BATCH_SIZE,
+    ):
+        self.queryset = model.objects.annotate(
+            lookup_value=Lower(field) if lowercase else F(field)
+        )
+        self.batch_size = batch_size
+
+    def find_existing(self, values) -> set:
+        values = list(values)
+        found = set()
+        for start in range(0, len(values), self.batch_size):
+            batch = values[start : start + self.batch_size]
+            found.update(
+                self.queryset.filter(lookup_value__in=batch).values_list(
+                    "lookup_value", flat=True
+                )
+            )
+        return found
+
+    def contains(self, values: pd.Series) -> pd.Series:
+        return values.isin(self.find_existing(values.dropna().unique()))
+
+    async def afind_existing(self, values) -> set:
+        values = list(values)
+        found = set()
+        for start in range(0, len(values), self.batch_size):
+            batch = values[start : start + self.batch_size]
+            async for value in self.queryset.filter(lookup_value__in=batch).values_list(
+                "lookup_value", flat=True
+            ):
+                found.add(value)
+        return found
+
+    async def acontains(self, values: pd.Series) -> pd.Series:
+        return values.isin(await self.afind_existing(values.dropna().unique()))
+
+    def add(self, values):
+        pass
+
+
+class QueryEmailIndex(QueryIndex):
+    """``QueryIndex`` over the ``Lower("email")`` index of ``User``."""
+
+    def __init__(self, batch_size: int = LOOKUP_BATCH_SIZE):
+        super().__init__(User, "email", lowercase=True, batch_size=batch_size)
+
+
+class SnapshotEmailIndex:
+    """Load every existing email once into a set; fast lookups, memory grows with the table."""
+
+    def __init__(self):
+        self.emails = set(lower_emails().values_list("lower_email", flat=True))
+
+    def contains(self, emails: pd.Series) -> pd.Series:
+        return emails.isin(self.emails)
+
+    def add(self, emails):
+        self.emails.update(emails)
+
+
+def hash_emails(emails) -> np.ndarray:
+    """Vectorized, process independent 64-bit hashes of normalized emails."""
+    return pd.util.hash_array(np.asarray(emails, dtype=object), categorize=False)
+
+
+def iter_email_batches(after_pk: int = 0):
+    """Yield ``(last_pk, emails)`` for users above ``after_pk`` in primary key order."""
+    while True:
+        rows = list(
+            lower_emails()
+            .filter(pk__gt=after_pk)
+            .order_by("pk")
+            .values_list("pk", "lower_email")[:LOAD_BATCH_SIZE]
+        )
+        if not rows:
+            return
+        after_pk = rows[-1][0]
+        yield after_pk, [email for _, email in rows]
+
+
+def iter_email_hashes():
+    """Yield hashes of every stored email without holding all strings at once."""
+    for _, emails in iter_email_batches():
+        yield hash_emails(emails)
+
+
+def load_email_hashes(after_pk: int = 0):
+    """Return the sorted hashes of users above ``after_pk`` and the highest pk seen."""
+    parts = []
+    for after_pk, emails in iter_email_batches(after_pk):
+        parts.append(hash_emails(emails))
+    hashes = np.sort(np.concatenate(parts)) if parts else np.empty(0, np.uint64)
+    return hashes, after_pk
+
+
+def merge_sorted(hashes: np.ndarray, new: np.ndarray) -> np.ndarray:
+    """Merge sorted ``new`` into sorted ``hashes`` without a full re-sort."""
+    if not len(new):
+        return hashes
+    return np.insert(hashes, np.searchsorted(hashes, new), new)
+
+
+class HashedEmailIndex:
+    """Sorted array of 64-bit email hashes, about 8 bytes per email.
+
+    Lookups are a vectorized ``searchsorted`` per chunk. Hashes added after
+    inserts go to a small pending array that is merged once it grows past a
+    tenth of the main array. Two different emails share a hash with
+    probability around ``n**2 / 2**65``, which is negligible for realistic
+    table sizes.
+    """
+
+    def __init__(self, hashes: np.ndarray = None):
+        # ``hashes`` may be shared with other indexes and is never modified.
+        self.hashes = load_email_hashes()[0] if hashes is None else hashes
+        self.pending = np.empty(0, np.uint64)
+
+    def __len__(self):
+        return len(self.hashes) + len(self.pending)
+
+    def contains_hashes(self, hashes: np.ndarray) -> np.ndarray:
+        found = np.zeros(len(hashes), dtype=bool)
+        if len(self.hashes):
+            positions = np.searchsorted(self.hashes, hashes)
+            found = self.hashes[np.minimum(positions, len(self.hashes) - 1)] == hashes
+        if len(self.pending):
+            found |= np.isin(hashes, self.pending)
+        return found
+
+    def contains(self, emails: pd.Series) -> pd.Series:
+        mask = pd.Series(False, index=emails.index)
+        present = emails.notna()
+        if present.any():
+            mask[present] = self.contains_hashes(hash_emails(emails[present]))
+        return mask
+
+    def add(self, emails):
+        if not len(emails):
+            return
+        self.pending = np.concatenate([self.pending, hash_emails(emails)])
+        if len(self.pending) > max(len(self.hashes) // 10, LOOKUP_BATCH_SIZE):
+            self.hashes = merge_sorted(self.hashes, np.sort(self.pending))
+            self.pending = np.empty(0, np.uint64)
+
+
+class EmailSnapshot:
+    """Process wide sorted array of email hashes shared by every upload.
+
+    The table is scanned once, lazily. Later uploads only load users above
+    the highest primary key seen so far, so back-to-back uploads skip the
+    full scan. Deleting a user or editing an email invalidates the snapshot
+    through model signals, and it is fully reloaded after
+    ``EMAIL_SNAPSHOT_MAX_AGE`` seconds to pick up such changes made by other
+    processes or by ``QuerySet.update``.
+
+    Rows read inside an atomic block may still be rolled back, so they are
+    never stored in the shared snapshot; they are loaded privately on top of
+    it instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stats = Counter()
+        self._reset()
+
+    def _reset(self):
+        self.hashes = None
+        self.high_water = 0
+        self.loaded_at = None
+
+    def _count(self, event, value=1):
+        self.stats[event] += value
+        EMAIL_SNAPSHOT_EVENTS.inc(value, event=event)
+
+    def invalidate(self):
+        with self._lock:
+            if self.hashes is not None:
+                self._reset()
+                self._count("invalidations")
+
+    def _is_stale(self):
+        return (
+            self.hashes is None
+            or time.monotonic() - self.loaded_at > import_setting("EMAIL_SNAPSHOT_MAX_AGE")
+        )
+
+    def current(self) -> np.ndarray:
+        """Return sorted hashes of every email currently visible to this connection."""
+        shareable = not connection.in_atomic_block
+        with self._lock:
+            if self._is_stale():
+                if not shareable:
+                    self._count("private_loads")
+                    return load_email_hashes()[0]
+                hashes, self.high_water = load_email_hashes()
+                self.hashes = hashes
+                self.loaded_at = time.monotonic()
+                self._count("loads")
+                self._count("rows_loaded", len(hashes))
+                return self.hashes
+
+            new, high_water = load_email_hashes(self.high_water)
+            if not len(new):
+                self._count("hits")
+                return self.hashes
+            if not shareable:
+                self._count("private_refreshes")
+                return merge_sorted(self.hashes, new)
+            self.hashes = merge_sorted(self.hashes, new)
+            self.high_water = high_water
+            self._count("refreshes")
+            self._count("rows_loaded", len(new))
+            return self.hashes
+
+
+email_snapshot = EmailSnapshot()
+
+
+class SharedEmailIndex(HashedEmailIndex):
+    """``HashedEmailIndex`` over the process wide ``email_snapshot``.
+
+    Emails added by an upload stay private to it; the snapshot picks up the
+    inserted users by primary key on the next upload.
+    """
+
+    def __init__(self):
+        super().__init__(hashes=email_snapshot.current())
+
+
+class BloomEmailIndex:
+    """Bloom filter over email hashes, confirmed against the database on a hit.
+
+    Around 10 bits per email at a 1% false positive rate. Only emails that
+    hit the filter are looked up with ``QueryEmailIndex``, so a mostly new
+    upload costs almost no queries and no false positive reaches the result.
+    """
+
+    def __init__(self, false_positive_rate: float = None):
+        self.false_positive_rate = false_positive_rate or import_setting(
+            "BLOOM_FALSE_POSITIVE_RATE"
+        )
+        # Leave room for the table to double before the rate degrades.
+        capacity = max(lower_emails().count() * 2, LOAD_BATCH_SIZE)
+        self.size = math.ceil(
+            -capacity * math.log(self.false_positive_rate) / math.log(2) ** 2
+        )
+        self.num_hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = np.zeros((self.size + 7) // 8, dtype=np.uint8)
+        self.confirm = QueryEmailIndex()
+        for hashes in iter_email_hashes():
+            self._set(hashes)
+
+    def _positions(self, hashes: np.ndarray) -> np.ndarray:
+        # Double hashing: k bit positions from the two 32-bit halves.
+        low = hashes & np.uint64(0xFFFFFFFF)
+        high = hashes >> np.uint64(32)
+        steps = np.arange(self.num_hashes, dtype=np.uint64)[:, None]
+        return (low + steps * high) % np.uint64(self.size)
+
+    def _set(self, hashes: np.ndarray):
+        positions = self._positions(hashes).ravel()
+        np.bitwise_or.at(
+            self.bits,
+            positions >> np.uint64(3),
+            np.left_shift(1, positions & np.uint64(7)).astype(np.uint8),
+        )
+
+    def might_contain(self, hashes: np.ndarray) -> np.ndarray:
+        positions = self._positions(hashes)
+        bytes_ = self.bits[positions >> np.uint64(3)]
+        bits = (bytes_ >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return bits.all(axis=0)
+
+    def contains(self, emails: pd.Series) -> pd.Series:
+        mask = pd.Series(False, index=emails.index)
+        present = emails.notna()
+        if not present.any():
+            return mask
+        candidates = emails[present][self.might_contain(hash_emails(emails[present]))]
+        if len(candidates):
+            mask[candidates.index] = self.confirm.contains(candidates)
+        return mask
+
+    async def acontains(self, emails: pd.Series) -> pd.Series:
+        mask = pd.Series(False, index=emails.index)
+        present = emails.notna()
+        if not present.any():
+            return mask
+        candidates = emails[present][self.might_contain(hash_emails(emails[present]))]
+        if len(candidates):
+            mask[candidates.index] = await self.confirm.acontains(candidates)
+        return mask
+
+    def add(self, emails):
+        if len(emails):
+            self._set(hash_emails(emails))
+
+
+class NoEmailIndex:
+    """Skip the lookup and rely on insert conflict handling for existing emails.
+
+    Only meaningful with ``INSERT_CONFLICTS`` set to ``ignore`` or ``update``.
+    The unique constraint on ``User.email`` is case sensitive, so users stored
+    with different casing are not detected this way.
+    """
+
+    def contains(self, emails: pd.Series) -> pd.Series:
+        return pd.Series(False, index=emails.index)
+
+    def add(self, emails):
+        pass
+
+
+EMAIL_INDEXES = {
+    "query": QueryEmailIndex,
+    "snapshot": SnapshotEmailIndex,
+    "hashed": HashedEmailIndex,
+    "shared": SharedEmailIndex,
+    "bloom": BloomEmailIndex,
+    "none": NoEmailIndex,
+}
+
+
+def get_email_index(strategy: str = None):
+    return EMAIL_INDEXES[strategy or import_setting("EMAIL_LOOKUP")]()
+
+
+def get_existing_index(schema):
+    """Index of the values already stored for the unique column of ``schema``.
+
+    The ``EMAIL_LOOKUP`` strategies only apply to ``User.email``; any other
+    unique column is looked up per chunk with a ``QueryIndex``.
+    """
+    unique = schema.unique_column
+    if unique is None:
+        return NoEmailIndex()
+    if schema.get_model() is User and unique.model_field == "email":
+        return get_email_index()
+    return QueryIndex(
+        schema.get_model(), unique.model_field, lowercase=unique.type == EMAIL
+    )
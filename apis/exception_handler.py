@@ -1,7 +1,10 @@
 from rest_framework.views import exception_handler
+from rest_framework.exceptions import Throttled
 import logging
 from rest_framework.response import Response
 
+from apis.constants import RATE_LIMIT_ERROR_TYPE
+from apis.throttling import retry_after
 from apis.utils import ServiceError
 
 logger = logging.getLogger(__name__)
@@ -15,6 +18,10 @@ def custom_exception_handler(exc, context):
             f"METHOD: {request.method}, PATH: {request.path}, STATUS_CODE: {exc.status_code}, MESSAGE: {exc.detail}"
         )
 
+        headers = {}
+        if getattr(exc, "retry_after", None) is not None:
+            headers["Retry-After"] = retry_after(exc.retry_after)
+
         return Response(
             {
                 "message": exc.detail,
@@ -22,6 +29,25 @@ def custom_exception_handler(exc, context):
                 "detail": exc.detail_error_response,
             },
             status=exc.status_code,
+            headers=headers,
+        )
+
+    if isinstance(exc, Throttled):
+        logger.error(
+            f"METHOD: {request.method}, PATH: {request.path}, STATUS_CODE: {exc.status_code}, MESSAGE: {exc.detail}"
+        )
+        headers = {}
+        if exc.wait is not None:
+            headers["Retry-After"] = retry_after(exc.wait)
+
+        return Response(
+            {
+                "message": "Upload rate limit exceeded",
+                "error_type": RATE_LIMIT_ERROR_TYPE,
+                "detail": {"retry_after": exc.wait},
+            },
+            status=exc.status_code,
+            headers=headers,
         )
 
     response = exception_handler(exc, context)
@@ -0,0 +1,301 @@
+import asyncio
+from collections import Counter, namedtuple
+from dataclasses import dataclass, field, replace
+import logging
+
+import numpy as np
+import pandas as pd
+from django.db import transaction
+
+from .conf import import_setting
+from .dedup import HashedEmailIndex, get_existing_index
+from .inserts import CONFLICT_UPDATE, ainsert_records, insert_records
+from .parsing import CSV, detect_format, open_upload, read_chunks, read_csv_blocks
+from .metrics import StageTimer
+from .parallel import check_rows_parallel, should_validate_in_parallel
+from .schema import USER_SCHEMA, ImportSchema
+from .utils import get_upload_detail
+from .validation import afind_known, check_rows, find_known, resolve_rows
+
+logger = logging.getLogger(__name__)
+
+# Where a chunk read by ``read_csv_blocks`` lies in the file: byte offsets of
+# its start and end, and the numbers of its first row and of the row after it.
+BlockPosition = namedtuple("BlockPosition", "start end first_row end_row")
+
+
+@dataclass
+class ImportCheckpoint:
+    """Progress of an import up to its last committed insert batch.
+
+    The first ``rows`` rows are done: accepted ones are committed, rejected
+    ones counted and written to the rejection report, which then held
+    ``report_rows`` rows in ``report_bytes`` bytes. ``offset`` is the byte
+    offset of the csv block holding the next row, that block starts at row
+    ``offset_row``. It is None when the upload is not read by offset, a
+    resumed import then skips the first ``rows`` rows of the re-read chunks.
+    """
+
+    rows: int = 0
+    uploaded_count: int = 0
+    updated_count: int = None
+    failures: dict = field(default_factory=dict)
+    offset: int = None
+    offset_row: int = 0
+    report_rows: int = 0
+    report_bytes: int = 0
+
+
+class CsvImporter:
+    """Stream a csv upload through validation and insertion one chunk at a time.
+
+    Columns, checks and the target model all come from ``schema``. Only a
+    single chunk of rows and one insert batch of model objects are held in
+    memory, so peak memory follows ``CHUNK_SIZE`` instead of the size of the
+    uploaded file.
+
+    ``checkpoint`` is updated after every committed insert batch. With
+    ``on_checkpoint`` it is also handed to that callback inside the batch's
+    transaction, so a stored checkpoint always matches the committed rows,
+    and plain csv files are read in blocks at known byte offsets. An
+    importer created from a stored checkpoint continues after it.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int = None,
+        batch_size: int = None,
+        timer: StageTimer = None,
+        schema: ImportSchema = USER_SCHEMA,
+        rejections=None,
+        checkpoint: ImportCheckpoint = None,
+        on_checkpoint=None,
+    ):
+        self.schema = schema
+        # Optional ``apis.reports.RejectionWriter`` receiving every skipped row.
+        self.rejections = rejections
+        self.chunk_size = chunk_size or import_setting("CHUNK_SIZE")
+        self.batch_size = batch_size or import_setting("BATCH_SIZE")
+        self.on_checkpoint = on_checkpoint
+        self.timer = timer or StageTimer()
+        self.conflict_mode = import_setting("INSERT_CONFLICTS")
+        self.restore(checkpoint or ImportCheckpoint())
+        self.existing = get_existing_index(schema)
+        # Unique values accepted so far from this file, as 64-bit hashes, so
+        # repeats in later chunks count as duplicates rather than existing.
+        # A resumed import starts it empty: repeats of values committed
+        # before the checkpoint count as existing.
+        self.seen = None
+        if schema.unique_column is not None:
+            self.seen = HashedEmailIndex(hashes=np.empty(0, dtype=np.uint64))
+
+    def restore(self, checkpoint: ImportCheckpoint):
+        self.checkpoint = checkpoint
+        self.rows_processed = checkpoint.rows
+        self.uploaded_count = checkpoint.uploaded_count
+        # Only reported when conflicting rows are upserted.
+        self.updated_count = None
+        if self.conflict_mode == CONFLICT_UPDATE:
+            self.updated_count = checkpoint.updated_count or 0
+        self.failures = Counter(checkpoint.failures)
+
+    def read_chunks(self, file):
+        """Yield ``(frame, position)`` pairs, position is a ``BlockPosition`` or None."""
+        parsed = getattr(file, "parsed_chunks", None)
+        if parsed is not None:
+            # Parsed by ``StreamingCsvUploadHandler`` while it was received.
+            for name, seconds in parsed.durations.items():
+                self.timer.add(name, seconds)
+            for df in parsed.drain():
+                yield df, None
+            return
+        with open_upload(file) as source:
+            if self.on_checkpoint is not None and detect_format(source) == CSV:
+                row = self.checkpoint.offset_row if self.checkpoint.offset is not None else 0
+                blocks = read_csv_blocks(
+                    source,
+                    self.chunk_size,
+                    timer=self.timer,
+                    schema=self.schema,
+                    offset=self.checkpoint.offset,
+                )
+                for start, end, df in blocks:
+                    if start is None:
+                        # Read without offsets, resumed by skipping rows.
+                        yield df, None
+                        continue
+                    yield df, BlockPosition(start, end, row, row + len(df))
+                    row += len(df)
+                return
+            chunks = read_chunks(source, self.chunk_size, timer=self.timer, schema=self.schema)
+            for df in chunks:
+                yield df, None
+
+    def resume_chunks(self, chunks):
+        """Drop the rows before ``checkpoint`` from ``read_chunks`` output."""
+        row = self.checkpoint.offset_row if self.checkpoint.offset is not None else 0
+        for df, position in chunks:
+            if position is not None:
+                row = position.first_row
+            skip = min(max(self.checkpoint.rows - row, 0), len(df))
+            row += len(df)
+            if skip and skip == len(df):
+                continue
+            if skip:
+                df = df.iloc[skip:].reset_index(drop=True)
+            yield df, position
+
+    def run(self, file):
+        chunks = self.resume_chunks(self.read_chunks(file))
+        while True:
+            with self.timer.stage("read"):
+                chunk = next(chunks, None)
+            if chunk is None:
+                return self
+            self.import_chunk(*chunk)
+
+    def check_rows(self, df: pd.DataFrame) -> pd.DataFrame:
+        if should_validate_in_parallel(df):
+            return check_rows_parallel(df, schema=self.schema)
+        return check_rows(df, self.schema)
+
+    def import_chunk(self, df: pd.DataFrame, position: BlockPosition = None):
+        with self.timer.stage("validate"):
+            checked = self.check_rows(df)
+        with self.timer.stage("existing_emails"):
+            known = find_known(checked, self.existing, self.schema)
+        with self.timer.stage("validate"):
+            result = resolve_rows(
+                checked, self.existing, known=known, schema=self.schema, seen=self.seen
+            )
+        for records, reasons in self.batches(result):
+            if self.on_checkpoint is None:
+                inserted = self.insert_records(records)
+                self.restore(self.advance(inserted, reasons, position))
+                continue
+            with transaction.atomic():
+                inserted = self.insert_records(records)
+                checkpoint = self.advance(inserted, reasons, position)
+                with self.timer.stage("checkpoint"):
+                    self.on_checkpoint(checkpoint)
+            self.restore(checkpoint)
+        self.remember_accepted(result)
+
+    async def arun(self, file):
+        """``run`` for async views.
+
+        Parsing and validation run in the event loop's default executor and
+        database work goes through the async ORM, so the loop stays free to
+        serve other requests while a large file is imported. The importer
+        itself should be created with ``sync_to_async`` because building the
+        existing value index may query the database. ``on_checkpoint`` is
+        not called, the async ORM cannot share a transaction with it.
+        """
+        loop = asyncio.get_running_loop()
+        chunks = self.resume_chunks(self.read_chunks(file))
+        while True:
+            with self.timer.stage("read"):
+                chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk is None:
+                return self
+            await self.aimport_chunk(*chunk)
+
+    async def aimport_chunk(self, df: pd.DataFrame, position: BlockPosition = None):
+        loop = asyncio.get_running_loop()
+        with self.timer.stage("validate"):
+            checked = await loop.run_in_executor(None, self.check_rows, df)
+        with self.timer.stage("existing_emails"):
+            if hasattr(self.existing, "acontains"):
+                known = await afind_known(checked, self.existing, self.schema)
+            else:
+                # In-memory indexes never query the database.
+                known = await loop.run_in_executor(
+                    None, find_known, checked, self.existing, self.schema
+                )
+        with self.timer.stage("validate"):
+            result = await loop.run_in_executor(
+                None,
+                lambda: resolve_rows(
+                    checked, self.existing, known, self.schema, seen=self.seen
+                ),
+            )
+        for records, reasons in self.batches(result):
+            with self.timer.stage("insert"):
+                inserted = await ainsert_records(
+                    records, self.batch_size, self.conflict_mode, self.schema
+                )
+            self.restore(self.advance(inserted, reasons, position))
+        self.remember_accepted(result)
+
+    def batches(self, result):
+        """Split a validated chunk into ``(records, reasons)`` per insert batch.
+
+        ``records`` is one insert batch of accepted rows and ``reasons`` holds
+        the reasons of every input row from the first row of the batch up to
+        the first row of the next one, so rejected rows are checkpointed with
+        the batch before them. A chunk without accepted rows is one step.
+        """
+        accepted = np.flatnonzero(result.reasons == 0)
+        start = 0
+        for first in range(0, len(accepted), self.batch_size):
+            following = first + self.batch_size
+            end = accepted[following] if following < len(accepted) else len(result.reasons)
+            yield result.users.iloc[first:following], result.reasons[start:end]
+            start = end
+        if not len(accepted):
+            yield result.users, result.reasons
+
+    def advance(self, inserted, reasons: np.ndarray, position: BlockPosition = None):
+        """The checkpoint after one batch was inserted and ``reasons`` counted."""
+        current = self.checkpoint
+        failures = Counter(current.failures)
+        counts = np.bincount(reasons, minlength=len(self.schema.failure_reasons) + 1)
+        for reason, count in zip(self.schema.failure_reasons, counts[1:].tolist()):
+            failures[reason] += count
+        updated_count = current.updated_count
+        if self.conflict_mode == CONFLICT_UPDATE:
+            updated_count = (updated_count or 0) + inserted.conflicted
+        elif inserted.conflicted:
+            failures[self.schema.unique_column.existing_failure] += inserted.conflicted
+
+        checkpoint = replace(
+            current,
+            rows=current.rows + len(reasons),
+            uploaded_count=current.uploaded_count + inserted.created,
+            updated_count=updated_count,
+            failures=dict(failures),
+        )
+        if self.rejections is not None:
+            with self.timer.stage("report"):
+                self.record_rejections(current.rows, reasons)
+            checkpoint.report_rows = self.rejections.rows
+            checkpoint.report_bytes = self.rejections.size
+        if position is not None:
+            if checkpoint.rows >= position.end_row:
+                checkpoint.offset, checkpoint.offset_row = position.end, position.end_row
+            else:
+                checkpoint.offset, checkpoint.offset_row = position.start, position.first_row
+        return checkpoint
+
+    def remember_accepted(self, result):
+        keys = result.accepted_keys
+        self.existing.add(keys)
+        if self.seen is not None:
+            self.seen.add(keys)
+
+    def record_rejections(self, first_row: int, reasons: np.ndarray):
+        # Row 1 is the first row after the header.
+        rejected = np.flatnonzero(reasons)
+        self.rejections.write(first_row + rejected + 1, reasons[rejected])
+
+    def insert_records(self, records: pd.DataFrame):
+        with self.timer.stage("insert"):
+            return insert_records(records, self.batch_size, self.conflict_mode, self.schema)
+
+    def detail(self):
+        return get_upload_detail(
+            self.uploaded_count,
+            self.failures,
+            updated_count=self.updated_count,
+            schema=self.schema,
+        )
@@ -0,0 +1,147 @@
+from dataclasses import dataclass
+
+import pandas as pd
+from django.db import transaction
+
+from .schema import USER_SCHEMA, ImportSchema
+
+CONFLICT_ERROR = "error"
+CONFLICT_IGNORE = "ignore"
+CONFLICT_UPDATE = "update"
+CONFLICT_MODES = (CONFLICT_ERROR, CONFLICT_IGNORE, CONFLICT_UPDATE)
+
+
+@dataclass
+class InsertResult:
+    created: int = 0
+    conflicted: int = 0
+
+    def __iadd__(self, other):
+        self.created += other.created
+        self.conflicted += other.conflicted
+        return self
+
+
+def _build_objects(model, records: pd.DataFrame):
+    fields = list(records.columns)
+    return [
+        model(**dict(zip(fields, values)))
+        for values in records.itertuples(index=False, name=None)
+    ]
+
+
+def insert_batch(
+    records: pd.DataFrame,
+    conflict_mode: str = CONFLICT_ERROR,
+    schema: ImportSchema = USER_SCHEMA,
+):
+    """Insert one batch of validated records inside its own transaction.
+
+    ``error`` lets a unique violation abort the batch, ``ignore`` skips rows
+    whose unique value already exists and ``update`` overwrites their other
+    fields. In the last two modes conflicting rows are counted with an
+    indexed lookup on the unique column in the same transaction; on SQLite
+    that needs the IMMEDIATE ``transaction_mode`` of the settings, or a
+    concurrent import fails the batch when its read turns into a write.
+    """
+    model = schema.get_model()
+    fields = list(records.columns)
+    objs = _build_objects(model, records)
+    unique = schema.unique_column
+    with transaction.atomic():
+        if conflict_mode == CONFLICT_ERROR or unique is None:
+            model.objects.bulk_create(
+                objs, ignore_conflicts=conflict_mode == CONFLICT_IGNORE
+            )
+            return InsertResult(created=len(objs))
+
+        key = unique.model_field
+        conflicted = model.objects.filter(
+            **{f"{key}__in": records[key].tolist()}
+        ).count()
+        if conflict_mode == CONFLICT_IGNORE:
+            model.objects.bulk_create(objs, ignore_conflicts=True)
+        else:
+            model.objects.bulk_create(
+                objs,
+                update_conflicts=True,
+                unique_fields=[key],
+                update_fields=[name for name in fields if name != key],
+            )
+    return InsertResult(created=len(objs) - conflicted, conflicted=conflicted)
+
+
+async def ainsert_batch(
+    records: pd.DataFrame,
+    conflict_mode: str = CONFLICT_ERROR,
+    schema: ImportSchema = USER_SCHEMA,
+):
+    """``insert_batch`` through the async ORM.
+
+    ``abulk_create`` is atomic on its own, but the async ORM cannot hold a
+    transaction across calls, so the conflict count of the ``ignore`` and
+    ``update`` modes is taken just before the insert instead of inside it.
+    """
+    model = schema.get_model()
+    fields = list(records.columns)
+    objs = _build_objects(model, records)
+    unique = schema.unique_column
+    if conflict_mode == CONFLICT_ERROR or unique is None:
+        await model.objects.abulk_create(
+            objs, ignore_conflicts=conflict_mode == CONFLICT_IGNORE
+        )
+        return InsertResult(created=len(objs))
+
+    key = unique.model_field
+    conflicted = await model.objects.filter(
+        **{f"{key}__in": records[key].tolist()}
+    ).acount()
+    if conflict_mode == CONFLICT_IGNORE:
+        await model.objects.abulk_create(objs, ignore_conflicts=True)
+    else:
+        await model.objects.abulk_create(
+            objs,
+            update_conflicts=True,
+            unique_fields=[key],
+            update_fields=[name for name in fields if name != key],
+        )
+    return InsertResult(created=len(objs) - conflicted, conflicted=conflicted)
+
+
+def _check_conflict_mode(conflict_mode: str, schema: ImportSchema):
+    if conflict_mode not in CONFLICT_MODES:
+        raise ValueError(f"Unknown insert conflict mode: {conflict_mode}")
+    if conflict_mode == CONFLICT_UPDATE and schema.unique_column is None:
+        raise ValueError("Updating conflicts needs a unique column in the schema")
+
+
+def insert_records(
+    records: pd.DataFrame,
+    batch_size: int,
+    conflict_mode: str = CONFLICT_ERROR,
+    schema: ImportSchema = USER_SCHEMA,
+) -> InsertResult:
+    """Insert ``records`` in batches of ``batch_size``, one transaction per batch."""
+    _check_conflict_mode(conflict_mode, schema)
+    result = InsertResult()
+    for start in range(0, len(records), batch_size):
+        result += insert_batch(
+            records.iloc[start : start + batch_size], conflict_mode, schema
+        )
+    return result
+
+
+async def ainsert_records(
+    records: pd.DataFrame,
+    batch_size: int,
+    conflict_mode: str = CONFLICT_ERROR,
+    schema: ImportSchema = USER_SCHEMA,
+) -> InsertResult:
+    """Async ``insert_records``, one ``abulk_create`` per batch."""
+    _check_conflict_mode(conflict_mode, schema)
+    result = InsertResult()
+    for start in range(0, len(records), batch_size):
+        result += await ainsert_batch(
+            records.iloc[start : start + batch_size], conflict_mode, schema
+        )
+    return result
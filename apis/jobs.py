@@ -0,0 +1,238 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+import logging
+import threading
+
+from django.db import connection, transaction
+from django.utils import timezone
+from rest_framework import status
+
+from .conf import import_setting
+from .constants import CLIENT_ERROR_TYPE
+from .importer import CsvImporter, ImportCheckpoint
+from .metrics import StageTimer, record_upload
+from .models import ImportJob, RejectionReport
+from .reports import RejectionWriter, create_report
+from .schema import get_schema
+from .throttling import UploadRowsThrottle
+from .utils import ServiceError
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Return the process wide pool that runs background imports."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=import_setting("JOB_WORKERS"),
+                thread_name_prefix="import-job",
+            )
+    return _executor
+
+
+def submit_import_job(job_id):
+    return get_executor().submit(_run_in_worker, job_id)
+
+
+def queue_import_job(
+    user, file, client_ident: str, schema_name: str, rejection_report=False
+):
+    """Store an uploaded file and run it in the background once committed."""
+    delete_expired_uploads()
+    job = ImportJob.objects.create(
+        user=user,
+        file=file,
+        client_ident=client_ident,
+        schema=schema_name,
+        rejection_report=rejection_report,
+    )
+    transaction.on_commit(lambda: submit_import_job(job.pk))
+    return job
+
+
+def delete_expired_uploads():
+    """Delete the files of jobs that failed more than ``FAILED_IMPORT_TTL`` ago.
+
+    The jobs stay listed with their counters but can no longer be resumed.
+    """
+    ttl = timedelta(seconds=import_setting("FAILED_IMPORT_TTL"))
+    expired = ImportJob.objects.filter(
+        state=ImportJob.State.FAILED, finished_at__lt=timezone.now() - ttl
+    ).exclude(file="")
+    for job in expired:
+        job.file.delete(save=False)
+        job.save(update_fields=["file", "updated_at"])
+
+
+def _run_in_worker(job_id):
+    try:
+        run_import_job(job_id)
+    except Exception as e:
+        # Nothing waits on the future, so the error would be lost.
+        logger.exception(f"IMPORT JOB: {job_id}, MESSAGE: {e}")
+    finally:
+        # Worker threads own their connection, release it between jobs.
+        connection.close()
+
+
+def load_checkpoint(job: ImportJob) -> ImportCheckpoint:
+    return ImportCheckpoint(
+        rows=job.rows_processed,
+        uploaded_count=job.uploaded_count,
+        updated_count=job.updated_count,
+        failures=dict(job.failures),
+        **job.checkpoint,
+    )
+
+
+def _store_checkpoint(job: ImportJob, checkpoint: ImportCheckpoint):
+    job.rows_processed = checkpoint.rows
+    job.uploaded_count = checkpoint.uploaded_count
+    job.updated_count = checkpoint.updated_count
+    job.failures = dict(checkpoint.failures)
+    job.checkpoint = {
+        "offset": checkpoint.offset,
+        "offset_row": checkpoint.offset_row,
+        "report_rows": checkpoint.report_rows,
+        "report_bytes": checkpoint.report_bytes,
+    }
+
+
+def _save_checkpoint(job: ImportJob, checkpoint: ImportCheckpoint):
+    _store_checkpoint(job, checkpoint)
+    job.save(
+        update_fields=[
+            "rows_processed",
+            "uploaded_count",
+            "updated_count",
+            "failures",
+            "checkpoint",
+            "updated_at",
+        ]
+    )
+
+
+def _open_report(job: ImportJob, checkpoint: ImportCheckpoint) -> RejectionWriter:
+    report = RejectionReport.objects.filter(pk=job.pk).first()
+    if report is None:
+        report = create_report(
+            job.user, job.schema, report_id=job.pk, client_ident=job.client_ident
+        )
+        return RejectionWriter(report)
+    # Rows rejected after the checkpoint are written again by this run.
+    return RejectionWriter(
+        report, rows=checkpoint.report_rows, size=checkpoint.report_bytes
+    )
+
+
+def run_import_job(job_id):
+    """Import the stored file of a job from its last checkpoint.
+
+    A checkpoint is saved with every committed insert batch, so a failed or
+    interrupted job continues where it stopped instead of at row 1.
+    """
+    job = ImportJob.objects.get(pk=job_id)
+    job.state = ImportJob.State.RUNNING
+    job.attempts += 1
+    job.error = ""
+    job.save(update_fields=["state", "attempts", "error", "updated_at"])
+
+    started = load_checkpoint(job)
+    checkpoint = started
+    timer = StageTimer()
+    rejections = None
+    importer = None
+    try:
+        if job.rejection_report:
+            rejections = _open_report(job, started)
+        importer = CsvImporter(
+            on_checkpoint=lambda checkpoint: _save_checkpoint(job, checkpoint),
+            timer=timer,
+            schema=get_schema(job.schema),
+            rejections=rejections,
+            checkpoint=started,
+        )
+        with job.file.open("rb") as file:
+            importer.run(file)
+    except ServiceError as e:
+        job.state = ImportJob.State.FAILED
+        job.error = str(e.detail)
+    except Exception as e:
+        logger.error(f"IMPORT JOB: {job_id}, MESSAGE: {e}")
+        job.state = ImportJob.State.FAILED
+        job.error = "Unable to read a uploaded csv file"
+    else:
+        job.state = ImportJob.State.COMPLETED
+        record_upload(timer, importer, job.file.size)
+        job.file.delete(save=False)
+    finally:
+        # A failed job keeps the rows it rejected up to its checkpoint.
+        if rejections is not None:
+            rejections.close()
+
+    # The batch in flight when a job failed was rolled back, so the counters
+    # are those of the last checkpoint.
+    if importer is not None:
+        checkpoint = importer.checkpoint
+    _store_checkpoint(job, checkpoint)
+    job.finished_at = timezone.now()
+    job.save()
+    UploadRowsThrottle().charge(job.client_ident, checkpoint.rows - started.rows)
+    return job
+
+
+def resume_import_job(job: ImportJob) -> ImportJob:
+    """Queue a failed job again, it continues after its last checkpoint."""
+    with transaction.atomic():
+        job = ImportJob.objects.select_for_update().get(pk=job.pk)
+        if job.state != ImportJob.State.FAILED:
+            raise ServiceError(
+                detail=f"Only failed import jobs can be resumed, this one is {job.state}",
+                status_code=status.HTTP_409_CONFLICT,
+                error_type=CLIENT_ERROR_TYPE,
+            )
+        if not job.file:
+            raise ServiceError(
+                detail="The file of this import job is no longer stored",
+                status_code=status.HTTP_409_CONFLICT,
+                error_type=CLIENT_ERROR_TYPE,
+            )
+        job.state = ImportJob.State.PENDING
+        job.finished_at = None
+        job.save(update_fields=["state", "finished_at", "updated_at"])
+        transaction.on_commit(lambda: submit_import_job(job.pk))
+    return job
+
+
+def keep_failed_upload(
+    user, file, client_ident: str, schema_name: str, importer: CsvImporter, rejections=None
+) -> ImportJob:
+    """Store a synchronous upload that failed part way as a failed job.
+
+    The job holds the file and the importer's last checkpoint, so
+    ``resume_import_job`` continues it without the client sending the file
+    again. A rejection report of the upload becomes the job's report.
+    """
+    delete_expired_uploads()
+    job = ImportJob(
+        user=user,
+        file=file,
+        client_ident=client_ident,
+        schema=schema_name,
+        rejection_report=rejections is not None,
+        state=ImportJob.State.FAILED,
+        error="Unable to read a uploaded csv file",
+        attempts=1,
+        finished_at=timezone.now(),
+    )
+    if rejections is not None:
+        job.id = rejections.report.pk
+    _store_checkpoint(job, importer.checkpoint)
+    job.save()
+    UploadRowsThrottle().charge(client_ident, importer.rows_processed)
+    return job
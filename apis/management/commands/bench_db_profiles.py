@@ -0,0 +1,187 @@
+from contextlib import contextmanager
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.test.utils import override_settings
+
+from apis.db import DB_PROFILES, read_pragmas
+from apis.dedup import email_snapshot, lower_emails
+from apis.importer import CsvImporter
+from apis.management.commands.bench_import import write_synthetic_csv
+from apis.metrics import StageTimer
+from apis.models import User
+
+
+@contextmanager
+def scratch_database(path, profile):
+    """Point the default database at a new SQLite file using ``profile``.
+
+    Every thread's connection is built from the same settings dict, so
+    reader threads started inside the block use the scratch file too.
+    """
+    settings_dict = connection.settings_dict
+    original_name = settings_dict["NAME"]
+    connection.close()
+    settings_dict["NAME"] = path
+    email_snapshot.invalidate()
+    csv_import = {**getattr(settings, "CSV_IMPORT", {}), "DB_PROFILE": profile}
+    try:
+        with override_settings(CSV_IMPORT=csv_import):
+            yield
+    finally:
+        connection.close()
+        settings_dict["NAME"] = original_name
+        email_snapshot.invalidate()
+
+
+class Reader(threading.Thread):
+    """Look up random existing users until stopped, timing every query."""
+
+    def __init__(self, table_size, interval):
+        super().__init__(daemon=True)
+        self.table_size = table_size
+        self.interval = interval
+        self.latencies = []
+        self.errors = 0
+        self.stop = threading.Event()
+
+    def run(self):
+        rng = random.Random(0)
+        try:
+            while not self.stop.is_set():
+                email = f"seed{rng.randrange(self.table_size)}@example.com"
+                started = time.perf_counter()
+                try:
+                    lower_emails().filter(lower_email=email).exists()
+                except OperationalError:
+                    self.errors += 1
+                else:
+                    self.latencies.append(time.perf_counter() - started)
+                self.stop.wait(self.interval)
+        finally:
+            connection.close()
+
+    def summary(self):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return {"reads": 0, "errors": self.errors}
+
+        def percentile(fraction):
+            position = min(len(latencies) - 1, int(len(latencies) * fraction))
+            return round(latencies[position] * 1000, 3)
+
+        return {
+            "reads": len(latencies),
+            "errors": self.errors,
+            "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+            "p50_ms": percentile(0.5),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(latencies[-1] * 1000, 3),
+        }
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure import throughput and concurrent reader latency for each "
+        "database profile on scratch SQLite files"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--profiles",
+            nargs="+",
+            default=list(DB_PROFILES),
+            choices=list(DB_PROFILES),
+            help="profiles from apis.db.DB_PROFILES to compare",
+        )
+        parser.add_argument("--rows", type=int, default=200_000, help="rows in the imported csv")
+        parser.add_argument(
+            "--table-size", type=int, default=100_000, help="users stored before the import"
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=None,
+            help="rows per insert transaction, defaults to BATCH_SIZE",
+        )
+        parser.add_argument(
+            "--readers", type=int, default=2, help="threads querying users during the import"
+        )
+        parser.add_argument(
+            "--read-interval",
+            type=float,
+            default=0.005,
+            help="seconds each reader waits between queries",
+        )
+        parser.add_argument(
+            "--output", type=str, default=None, help="write JSON results to this file"
+        )
+
+    def handle(self, *args, **kwargs):
+        results = []
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = os.path.join(tmp, "users.csv")
+            write_synthetic_csv(csv_path, kwargs["rows"], invalid_ratio=0.1)
+            for profile in kwargs["profiles"]:
+                db_path = os.path.join(tmp, f"{profile}.sqlite3")
+                with scratch_database(db_path, profile):
+                    result = self._run(profile, csv_path, kwargs)
+                results.append(result)
+                self.stdout.write(self.style.HTTP_INFO(json.dumps(result)))
+
+        output = json.dumps(results, indent=2)
+        if kwargs["output"]:
+            with open(kwargs["output"], "w") as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+    def _run(self, profile, csv_path, kwargs):
+        call_command("migrate", verbosity=0)
+        self._seed_users(kwargs["table_size"])
+
+        readers = [
+            Reader(kwargs["table_size"], kwargs["read_interval"])
+            for _ in range(kwargs["readers"])
+        ]
+        for reader in readers:
+            reader.start()
+
+        timer = StageTimer(enabled=True)
+        started = time.perf_counter()
+        importer = CsvImporter(batch_size=kwargs["batch_size"], timer=timer).run(csv_path)
+        total = time.perf_counter() - started
+
+        for reader in readers:
+            reader.stop.set()
+        for reader in readers:
+            reader.join()
+
+        return {
+            "profile": profile,
+            "pragmas": read_pragmas(connection),
+            "rows": importer.rows_processed,
+            "uploaded": importer.uploaded_count,
+            "total_seconds": round(total, 4),
+            "insert_seconds": round(timer.durations.get("insert", 0.0), 4),
+            "rows_per_second": round(importer.rows_processed / total) if total else None,
+            "readers": [reader.summary() for reader in readers],
+        }
+
+    def _seed_users(self, table_size):
+        batch = 10_000
+        for start in range(0, table_size, batch):
+            User.objects.bulk_create(
+                User(email=f"seed{i}@example.com", name="Seed", age=30)
+                for i in range(start, min(start + batch, table_size))
+            )
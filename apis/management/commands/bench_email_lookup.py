@@ -0,0 +1,91 @@
+import json
+import time
+import tracemalloc
+
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apis.dedup import EMAIL_INDEXES
+from apis.models import User
+
+
+class Command(BaseCommand):
+    help = "Compare existing email lookup strategies at different user table sizes"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--table-sizes",
+            type=int,
+            nargs="+",
+            default=[10_000, 100_000, 1_000_000],
+            help="number of users in the table for each run",
+        )
+        parser.add_argument(
+            "--upload-rows", type=int, default=10_000, help="emails checked per run"
+        )
+        parser.add_argument(
+            "--output", type=str, default=None, help="write JSON results to this file"
+        )
+
+    def handle(self, *args, **kwargs):
+        results = []
+        for table_size in kwargs["table_sizes"]:
+            # Seeded users are rolled back, so the command is safe to run on a
+            # database that already has data.
+            with transaction.atomic():
+                self._seed_users(table_size)
+                upload = self._upload_emails(table_size, kwargs["upload_rows"])
+                for strategy, index_class in EMAIL_INDEXES.items():
+                    results.append(
+                        self._measure(strategy, index_class, table_size, upload)
+                    )
+                transaction.set_rollback(True)
+
+        output = json.dumps(results, indent=2)
+        if kwargs["output"]:
+            with open(kwargs["output"], "w") as f:
+                f.write(output)
+        self.stdout.write(self.style.HTTP_INFO(output))
+
+    def _seed_users(self, table_size):
+        batch = 10_000
+        for start in range(0, table_size, batch):
+            User.objects.bulk_create(
+                User(email=f"bench{i}@example.com", name="Bench", age=30)
+                for i in range(start, min(start + batch, table_size))
+            )
+
+    def _upload_emails(self, table_size, upload_rows):
+        # Half of the upload collides with existing users, half is new.
+        return pd.Series(
+            [
+                f"bench{i * 2 % max(table_size, 1)}@example.com"
+                if i % 2
+                else f"new{i}@example.com"
+                for i in range(upload_rows)
+            ],
+            dtype=object,
+        )
+
+    def _measure(self, strategy, index_class, table_size, upload):
+        tracemalloc.start()
+        started = time.perf_counter()
+        index = index_class()
+        built = time.perf_counter()
+        found = int(index.contains(upload).sum())
+        finished = time.perf_counter()
+        retained, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            "strategy": strategy,
+            "table_size": table_size,
+            "upload_rows": len(upload),
+            "existing_found": found,
+            "build_seconds": round(built - started, 4),
+            "lookup_seconds": round(finished - built, 4),
+            "peak_memory_bytes": peak,
+            # Still allocated after the lookup, i.e. what the index itself keeps.
+            "retained_memory_bytes": retained,
+        }
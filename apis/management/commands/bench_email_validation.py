@@ -0,0 +1,86 @@
+import json
+import re
+import time
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+
+from apis.utils import EMAIL_PATTERN, EMAIL_REGEX, is_valid_email, validate_emails
+
+
+def synthetic_emails(rows, invalid_ratio, seed=0):
+    """Mostly valid addresses with about ``invalid_ratio`` malformed ones."""
+    rng = np.random.default_rng(seed)
+    ids = np.arange(rows).astype(str)
+    emails = pd.Series(
+        np.char.add(np.char.add("user.", ids), "@mail-example.com"), dtype=object
+    )
+    invalid = rng.random(rows) < invalid_ratio
+    emails[invalid] = np.char.add("user ", ids[invalid])
+    return emails
+
+
+def _uncompiled_per_row(emails):
+    # ``is_valid_email`` before the pattern was precompiled.
+    return pd.Series([re.match(EMAIL_REGEX, email) is not None for email in emails])
+
+
+def _per_row(emails):
+    return pd.Series([is_valid_email(email) for email in emails])
+
+
+def _pandas_str_match(emails):
+    return emails.str.match(EMAIL_PATTERN, na=False)
+
+
+STRATEGIES = {
+    "per_row_uncompiled": _uncompiled_per_row,
+    "per_row": _per_row,
+    "pandas_str_match": _pandas_str_match,
+    "validate_emails": validate_emails,
+}
+
+
+class Command(BaseCommand):
+    help = "Compare per-row and batched email validation"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=1_000_000)
+        parser.add_argument(
+            "--invalid-ratio",
+            type=float,
+            default=0.1,
+            help="fraction of generated addresses that are malformed",
+        )
+        parser.add_argument("--repeat", type=int, default=3, help="best of N runs")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--output", type=str, default=None, help="write JSON results to this file"
+        )
+
+    def handle(self, *args, **kwargs):
+        emails = synthetic_emails(kwargs["rows"], kwargs["invalid_ratio"], kwargs["seed"])
+        results = []
+        for name, validate in STRATEGIES.items():
+            timings = []
+            for _ in range(kwargs["repeat"]):
+                started = time.perf_counter()
+                valid = int(validate(emails).sum())
+                timings.append(time.perf_counter() - started)
+            seconds = min(timings)
+            results.append(
+                {
+                    "strategy": name,
+                    "rows": len(emails),
+                    "valid": valid,
+                    "seconds": round(seconds, 4),
+                    "rows_per_second": int(len(emails) / seconds) if seconds else None,
+                }
+            )
+
+        output = json.dumps(results, indent=2)
+        if kwargs["output"]:
+            with open(kwargs["output"], "w") as f:
+                f.write(output)
+        self.stdout.write(self.style.HTTP_INFO(output))
@@ -0,0 +1,134 @@
+import json
+import os
+import platform
+import resource
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apis.importer import CsvImporter
+from apis.metrics import StageTimer
+
+INVALID_KINDS = ("null_email", "bad_email", "blank_name", "bad_age", "duplicate")
+
+
+def write_synthetic_csv(path, rows, invalid_ratio, seed=0, block_size=100_000):
+    """Write ``rows`` users to ``path`` where about ``invalid_ratio`` of them fail validation.
+
+    Invalid rows are spread evenly over ``INVALID_KINDS``.
+    """
+    rng = np.random.default_rng(seed)
+    with open(path, "w") as f:
+        f.write("name,email,age\n")
+        for start in range(0, rows, block_size):
+            ids = np.arange(start, min(start + block_size, rows))
+            names = pd.Series(np.char.add("User ", ids.astype(str)), dtype=object)
+            emails = pd.Series(
+                np.char.add(np.char.add("user", ids.astype(str)), "@example.com"),
+                dtype=object,
+            )
+            ages = pd.Series(rng.integers(0, 121, len(ids)), dtype=object)
+
+            invalid = rng.random(len(ids)) < invalid_ratio
+            kinds = rng.integers(0, len(INVALID_KINDS), len(ids))
+            emails[invalid & (kinds == 0)] = ""
+            emails[invalid & (kinds == 1)] = "not-an-email"
+            names[invalid & (kinds == 2)] = " "
+            ages[invalid & (kinds == 3)] = 500
+            duplicates = invalid & (kinds == 4)
+            emails[duplicates] = "duplicate@example.com"
+
+            pd.DataFrame({"name": names, "email": emails, "age": ages}).to_csv(
+                f, header=False, index=False
+            )
+
+
+class Command(BaseCommand):
+    help = "Benchmark the csv import pipeline stage by stage on synthetic files"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--rows",
+            type=int,
+            nargs="+",
+            default=[10_000, 100_000, 1_000_000],
+            help="file sizes to benchmark, e.g. --rows 10000 5000000",
+        )
+        parser.add_argument(
+            "--invalid-ratio",
+            type=float,
+            default=0.1,
+            help="fraction of generated rows that fail validation",
+        )
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument(
+            "--trace-memory",
+            action="store_true",
+            help="measure peak Python allocations with tracemalloc (slower)",
+        )
+        parser.add_argument(
+            "--keep", action="store_true", help="commit inserted users instead of rolling back"
+        )
+        parser.add_argument(
+            "--output", type=str, default=None, help="write JSON results to this file"
+        )
+
+    def handle(self, *args, **kwargs):
+        results = []
+        for rows in kwargs["rows"]:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = os.path.join(tmp, f"users_{rows}.csv")
+                write_synthetic_csv(path, rows, kwargs["invalid_ratio"], kwargs["seed"])
+                file_bytes = os.path.getsize(path)
+                with transaction.atomic():
+                    result = self._run(path, kwargs["trace_memory"])
+                    transaction.set_rollback(not kwargs["keep"])
+            result.update(
+                rows=rows, invalid_ratio=kwargs["invalid_ratio"], file_bytes=file_bytes
+            )
+            results.append(result)
+            self.stdout.write(self.style.HTTP_INFO(json.dumps(result)))
+
+        report = {
+            "created_at": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "pandas": pd.__version__,
+            "results": results,
+        }
+        output = json.dumps(report, indent=2)
+        if kwargs["output"]:
+            with open(kwargs["output"], "w") as f:
+                f.write(output)
+        else:
+            self.stdout.write(output)
+
+    def _run(self, path, trace_memory):
+        if trace_memory:
+            tracemalloc.start()
+
+        timer = StageTimer(enabled=True)
+        started = time.perf_counter()
+        importer = CsvImporter(timer=timer).run(path)
+        total = time.perf_counter() - started
+
+        peak_traced = None
+        if trace_memory:
+            _, peak_traced = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+        return {
+            "seconds": {name: round(value, 4) for name, value in timer.durations.items()},
+            "total_seconds": round(total, 4),
+            "rows_per_second": round(importer.rows_processed / total) if total else None,
+            "uploaded": importer.uploaded_count,
+            "failures": dict(importer.failures),
+            "peak_traced_bytes": peak_traced,
+            # ru_maxrss is the process high-water mark, in KiB on Linux.
+            "max_rss_kib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        }
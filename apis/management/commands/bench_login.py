@@ -0,0 +1,105 @@
+import json
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apis.auth import find_login_user, forget_missing_email
+from apis.models import User
+from apis.utils import get_tokens_for_user
+
+PASSWORD = "bench-password-0123456789"
+MISSING_EMAIL = "nobody@example.com"
+
+
+def login_iexact(email, password):
+    """The token view before the indexed lookup and service account hasher."""
+    try:
+        user = User.objects.get(email__iexact=email)
+    except User.DoesNotExist:
+        return None
+    if not user.check_password(password):
+        return None
+    return get_tokens_for_user(user)
+
+
+def login_indexed(email, password):
+    user = find_login_user(email)
+    if user is None or not user.check_password(password):
+        return None
+    return get_tokens_for_user(user)
+
+
+class Command(BaseCommand):
+    help = "Measure token logins per second for the lookup and hasher variants"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--table-size", type=int, default=100_000, help="number of users in the table"
+        )
+        parser.add_argument(
+            "--seconds", type=float, default=2.0, help="time spent on each scenario"
+        )
+        parser.add_argument(
+            "--output", type=str, default=None, help="write JSON results to this file"
+        )
+
+    def handle(self, *args, **kwargs):
+        # Seeded users are rolled back, so the command is safe to run on a
+        # database that already has data.
+        with transaction.atomic():
+            self._seed_users(kwargs["table_size"])
+            user = User.objects.create_user(email="Bench.User@example.com", password=PASSWORD)
+            service = User.objects.create_user(
+                email="Bench.Service@example.com",
+                password=PASSWORD,
+                is_service_account=True,
+            )
+            # Logins use a different case than the stored email.
+            scenarios = [
+                ("iexact", "default", login_iexact, user.email.lower()),
+                ("indexed", "default", login_indexed, user.email.lower()),
+                ("iexact", "service_account", login_iexact, service.email.lower()),
+                ("indexed", "service_account", login_indexed, service.email.lower()),
+                ("iexact", "missing", login_iexact, MISSING_EMAIL),
+                ("indexed", "missing_cached", login_indexed, MISSING_EMAIL),
+            ]
+            results = [
+                self._measure(lookup, account, login, email, kwargs)
+                for lookup, account, login, email in scenarios
+            ]
+            forget_missing_email(MISSING_EMAIL)
+            transaction.set_rollback(True)
+
+        output = json.dumps(results, indent=2)
+        if kwargs["output"]:
+            with open(kwargs["output"], "w") as f:
+                f.write(output)
+        self.stdout.write(self.style.HTTP_INFO(output))
+
+    def _seed_users(self, table_size):
+        batch = 10_000
+        for start in range(0, table_size, batch):
+            User.objects.bulk_create(
+                User(email=f"bench{i}@example.com", name="Bench", age=30)
+                for i in range(start, min(start + batch, table_size))
+            )
+
+    def _measure(self, lookup, account, login, email, kwargs):
+        logins = 0
+        started = time.perf_counter()
+        deadline = started + kwargs["seconds"]
+        while True:
+            login(email, PASSWORD)
+            logins += 1
+            if time.perf_counter() >= deadline:
+                break
+        elapsed = time.perf_counter() - started
+        return {
+            "lookup": lookup,
+            "account": account,
+            "table_size": kwargs["table_size"],
+            "logins": logins,
+            "logins_per_second": round(logins / elapsed, 1),
+            "ms_per_login": round(elapsed / logins * 1000, 3),
+        }
@@ -1,4 +1,5 @@
 from django.core.management.base import BaseCommand
+from apis.auth import find_login_user
 from apis.models import User
 
 from apis.utils import get_tokens_for_user
@@ -10,18 +11,20 @@ class Command(BaseCommand):
         parser.add_argument("password", type=str, default='testuser@123', nargs='?', help='password')
         parser.add_argument('--superuser', action='store_true', help='Create superuser')
         parser.add_argument('--skip_validation', action='store_true', help='Skip validation')
+        parser.add_argument('--service_account', action='store_true', help='Hash the password with the service account hasher')
     
     def handle(self, *args, **kwargs):
         password = kwargs['password']
         email = kwargs['email']
         superuser = kwargs['superuser']
         skip_validation = kwargs['skip_validation']
+        service_account = kwargs['service_account']
 
-        user_queryset = User.objects.filter(email__iexact=email)
-        if user_queryset.exists():
-            user = user_queryset.first()
+        user = find_login_user(email)
+        if user is not None:
             if skip_validation:
                 user.is_superuser = superuser
+                user.is_service_account = service_account
                 user.set_password(password)
                 user.save()
             else:
@@ -31,7 +34,12 @@ class Command(BaseCommand):
             
         else:
                 
-            user = User.objects.create_user(password=password, email=email, is_superuser=superuser)
+            user = User.objects.create_user(
+                password=password,
+                email=email,
+                is_superuser=superuser,
+                is_service_account=service_account,
+            )
 
         
         tokens = get_tokens_for_user(user)
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+from apis.jobs import run_import_job
+from apis.models import ImportJob
+
+
+class Command(BaseCommand):
+    help = (
+        "Run import jobs again from their last checkpoint: jobs left pending or "
+        "running by a stopped server, failed jobs with --failed, or the given job ids"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("job_ids", nargs="*", help="ids of the jobs to resume")
+        parser.add_argument(
+            "--failed", action="store_true", help="also resume every failed job"
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs["job_ids"]:
+            jobs = ImportJob.objects.filter(pk__in=kwargs["job_ids"])
+        else:
+            # Only safe while no server is running jobs: a job still marked
+            # pending was never picked up and one marked running was interrupted.
+            states = [ImportJob.State.PENDING, ImportJob.State.RUNNING]
+            if kwargs["failed"]:
+                states.append(ImportJob.State.FAILED)
+            jobs = ImportJob.objects.filter(state__in=states)
+        jobs = jobs.exclude(state=ImportJob.State.COMPLETED).exclude(file="")
+
+        for job_id in jobs.order_by("created_at").values_list("pk", flat=True):
+            job = run_import_job(job_id)
+            self.stdout.write(
+                self.style.HTTP_INFO(
+                    f"{job.pk}: {job.state}, {job.rows_processed} rows, "
+                    f"attempt {job.attempts}"
+                )
+            )
@@ -0,0 +1,231 @@
+from bisect import bisect_left
+from contextlib import contextmanager, nullcontext
+import threading
+import time
+
+from .conf import import_setting
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+_NULL_STAGE = nullcontext()
+
+
+def metrics_enabled() -> bool:
+    return import_setting("METRICS_ENABLED")
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    items = list(key) + list(extra)
+    if not items:
+        return ""
+    body = ",".join(f'{name}="{value}"' for name, value in items)
+    return "{" + body + "}"
+
+
+class CounterMetric:
+    kind = "counter"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + value
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+
+class GaugeMetric:
+    kind = "gauge"
+
+    def __init__(self, name, documentation):
+        self.name = name
+        self.documentation = documentation
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def value(self, **labels):
+        return self._values.get(_label_key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            values = dict(self._values)
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(key)} {value}"
+
+
+class HistogramMetric:
+    kind = "histogram"
+
+    def __init__(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels):
+        series = self._series.get(_label_key(labels))
+        return series[2] if series else 0
+
+    def samples(self):
+        with self._lock:
+            series = {key: (list(b), s, c) for key, (b, s, c) in self._series.items()}
+        for key, (bucket_counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + ("+Inf",), bucket_counts):
+                cumulative += bucket_count
+                labels = _format_labels(key, [("le", bound)])
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(key)} {total}"
+            yield f"{self.name}_count{_format_labels(key)} {count}"
+
+
+class MetricsRegistry:
+    """In-process registry rendered in the Prometheus text exposition format."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, metric_class, name, documentation, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, documentation, **kwargs)
+        return metric
+
+    def counter(self, name, documentation):
+        return self._get_or_create(CounterMetric, name, documentation)
+
+    def gauge(self, name, documentation):
+        return self._get_or_create(GaugeMetric, name, documentation)
+
+    def histogram(self, name, documentation, buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(HistogramMetric, name, documentation, buckets=buckets)
+
+    def render(self) -> str:
+        lines = []
+        for name, metric in sorted(self._metrics.items()):
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+UPLOAD_STAGE_SECONDS = registry.histogram(
+    "csv_upload_stage_seconds", "Time spent in each stage of a csv upload."
+)
+UPLOAD_DURATION_SECONDS = registry.histogram(
+    "csv_upload_duration_seconds", "Total time spent importing a csv upload."
+)
+UPLOAD_ROWS = registry.counter("csv_upload_rows_total", "Csv rows read from uploads.")
+UPLOAD_BYTES = registry.counter("csv_upload_bytes_total", "Bytes of uploaded csv files.")
+UPLOAD_USERS_CREATED = registry.counter(
+    "csv_upload_users_created_total", "Users created from csv uploads."
+)
+UPLOAD_ROWS_REJECTED = registry.counter(
+    "csv_upload_rows_rejected_total", "Csv rows skipped, by failure reason."
+)
+EMAIL_SNAPSHOT_EVENTS = registry.counter(
+    "csv_upload_email_snapshot_events_total",
+    "Loads, refreshes, hits and invalidations of the shared email snapshot.",
+)
+
+IMPORTS_RUNNING = registry.gauge(
+    "csv_upload_imports_running", "Imports admitted and not yet finished."
+)
+IMPORT_MEMORY_RESERVED = registry.gauge(
+    "csv_upload_import_memory_reserved_bytes",
+    "Estimated memory reserved by the running imports.",
+)
+IMPORT_QUEUE_DEPTH = registry.gauge(
+    "csv_upload_import_queue_depth", "Imports waiting for admission."
+)
+IMPORT_QUEUE_WAIT_SECONDS = registry.histogram(
+    "csv_upload_import_queue_wait_seconds",
+    "Time imports waited for admission, by outcome.",
+)
+IMPORT_ADMISSION_EVENTS = registry.counter(
+    "csv_upload_import_admission_total",
+    "Imports admitted at once, queued or rejected by the admission controller.",
+)
+
+
+class StageTimer:
+    """Accumulate wall time per named stage of one upload.
+
+    When disabled ``stage`` hands out a shared no-op context manager, so the
+    hot path only pays for an attribute check.
+    """
+
+    def __init__(self, enabled: bool = None):
+        self.enabled = metrics_enabled() if enabled is None else enabled
+        self.durations = {}
+
+    def stage(self, name):
+        if not self.enabled:
+            return _NULL_STAGE
+        return self._measure(name)
+
+    @contextmanager
+    def _measure(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds: float):
+        if self.enabled:
+            self.durations[name] = self.durations.get(name, 0.0) + seconds
+
+    def server_timing(self) -> str:
+        return ", ".join(
+            f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.durations.items()
+        )
+
+
+def record_upload(timer: StageTimer, importer, file_bytes: int):
+    """Publish the outcome of one upload to the metrics registry."""
+    if not timer.enabled:
+        return
+    for name, seconds in timer.durations.items():
+        UPLOAD_STAGE_SECONDS.observe(seconds, stage=name)
+    UPLOAD_DURATION_SECONDS.observe(sum(timer.durations.values()))
+    UPLOAD_ROWS.inc(importer.rows_processed)
+    UPLOAD_BYTES.inc(file_bytes or 0)
+    UPLOAD_USERS_CREATED.inc(importer.uploaded_count)
+    for reason, count in importer.failures.items():
+        UPLOAD_ROWS_REJECTED.inc(count, reason=reason)
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:32
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0003_throttlebucket'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='apis_user_email_lower_idx'),
+        ),
+    ]
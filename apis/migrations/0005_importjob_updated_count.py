@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0004_user_email_lower_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='updated_count',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+    ]
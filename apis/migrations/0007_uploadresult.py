@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0006_uploadsession'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadResult',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('client_ident', models.CharField(max_length=255)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('idempotency_key', models.CharField(blank=True, max_length=255)),
+                ('detail', models.JSONField()),
+                ('hits', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['client_ident', 'content_hash'], name='apis_upload_client__e1a52d_idx'), models.Index(fields=['client_ident', 'idempotency_key'], name='apis_upload_client__8fb6f4_idx'), models.Index(fields=['last_used_at'], name='apis_upload_last_us_6ee59c_idx')],
+            },
+        ),
+    ]
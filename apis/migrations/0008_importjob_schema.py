@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0007_uploadresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='schema',
+            field=models.CharField(default='users', max_length=64),
+        ),
+    ]
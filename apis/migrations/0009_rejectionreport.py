@@ -0,0 +1,32 @@
+# Generated by Django 5.2.4 on 2026-10-18 11:54
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0008_importjob_schema'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='rejection_report',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.CreateModel(
+            name='RejectionReport',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('schema', models.CharField(default='users', max_length=64)),
+                ('file', models.FileField(upload_to='reports/')),
+                ('rows', models.PositiveBigIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rejection_reports', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
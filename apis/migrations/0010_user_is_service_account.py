@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:02
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0009_rejectionreport'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='is_service_account',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0010_user_is_service_account'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='importjob',
+            name='attempts',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='importjob',
+            name='checkpoint',
+            field=models.JSONField(default=dict),
+        ),
+    ]
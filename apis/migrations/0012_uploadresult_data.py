@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0011_importjob_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadresult',
+            name='data',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.4 on 2026-10-18 12:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('apis', '0012_uploadresult_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rejectionreport',
+            name='client_ident',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+        migrations.AddField(
+            model_name='uploadsession',
+            name='client_ident',
+            field=models.CharField(blank=True, max_length=255),
+        ),
+    ]
@@ -1,5 +1,13 @@
+import uuid
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager
 from django.db import models
+from django.db.models.functions import Lower
+
+# Algorithm of ``apis.auth.ServiceAccountPasswordHasher``.
+SERVICE_ACCOUNT_HASHER = "pbkdf2_sha256_service"
 
 
 class CustomUserManager(BaseUserManager):
@@ -32,6 +40,8 @@ class User(AbstractBaseUser):
     is_staff = models.BooleanField(default=False)
     is_superuser = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
+    # Machine clients whose passwords use the cheaper service account hasher.
+    is_service_account = models.BooleanField(default=False)
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = [
@@ -40,6 +50,29 @@ class User(AbstractBaseUser):
 
     objects = CustomUserManager()
 
+    class Meta:
+        indexes = [models.Index(Lower("email"), name="apis_user_email_lower_idx")]
+
+    @property
+    def password_hasher(self):
+        return SERVICE_ACCOUNT_HASHER if self.is_service_account else "default"
+
+    def set_password(self, raw_password):
+        self.password = make_password(raw_password, hasher=self.password_hasher)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        # Same as the base class but rehashes towards this user's hasher, so
+        # flipping is_service_account takes effect on the next login.
+        def setter(raw_password):
+            self.set_password(raw_password)
+            self._password = None
+            self.save(update_fields=["password"])
+
+        return check_password(
+            raw_password, self.password, setter, preferred=self.password_hasher
+        )
+
     def has_perm(self, perm, obj=None):
         return self.is_superuser
 
@@ -48,3 +81,139 @@ class User(AbstractBaseUser):
 
     def __str__(self):
         return f"{self.email} - {self.name}"
+
+
+class ImportJob(models.Model):
+    class State(models.TextChoices):
+        PENDING = "pending", "Pending"
+        RUNNING = "running", "Running"
+        COMPLETED = "completed", "Completed"
+        FAILED = "failed", "Failed"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="import_jobs",
+    )
+    file = models.FileField(upload_to="imports/")
+    client_ident = models.CharField(max_length=255, blank=True)
+    # Name of the ``apis.schema.ImportSchema`` the file is imported with.
+    schema = models.CharField(max_length=64, default="users")
+    # Record skipped rows in a ``RejectionReport`` with the same id.
+    rejection_report = models.BooleanField(default=False)
+    state = models.CharField(
+        max_length=16, choices=State.choices, default=State.PENDING
+    )
+    rows_processed = models.PositiveBigIntegerField(default=0)
+    uploaded_count = models.PositiveBigIntegerField(default=0)
+    updated_count = models.PositiveBigIntegerField(null=True, blank=True)
+    failures = models.JSONField(default=dict)
+    # Where a resumed run continues, the counters above hold the totals of
+    # the same ``apis.importer.ImportCheckpoint``.
+    checkpoint = models.JSONField(default=dict)
+    attempts = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-created_at"]
+
+    def __str__(self):
+        return f"{self.id} - {self.state}"
+
+
+class ThrottleBucket(models.Model):
+    key = models.CharField(max_length=255, unique=True)
+    state = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return self.key
+
+
+class UploadSession(models.Model):
+    class State(models.TextChoices):
+        OPEN = "open", "Open"
+        FINALIZED = "finalized", "Finalized"
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="upload_sessions",
+    )
+    # ``UploadThrottle.get_client_ident`` of the creator, owner of anonymous sessions.
+    client_ident = models.CharField(max_length=255, blank=True)
+    filename = models.CharField(max_length=255)
+    file = models.FileField(upload_to="uploads/")
+    size = models.PositiveBigIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)
+    received_bytes = models.PositiveBigIntegerField(default=0)
+    state = models.CharField(max_length=16, choices=State.choices, default=State.OPEN)
+    job = models.OneToOneField(
+        ImportJob,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="upload_session",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.id} - {self.received_bytes}/{self.size}"
+
+
+class UploadResult(models.Model):
+    client_ident = models.CharField(max_length=255)
+    content_hash = models.CharField(max_length=64)
+    idempotency_key = models.CharField(max_length=255, blank=True)
+    detail = models.JSONField()
+    # ``data`` of the replayed response, the ``upload_id`` of a rejection report.
+    data = models.JSONField(null=True, blank=True)
+    hits = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["client_ident", "content_hash"]),
+            models.Index(fields=["client_ident", "idempotency_key"]),
+            models.Index(fields=["last_used_at"]),
+        ]
+
+    def __str__(self):
+        return f"{self.client_ident} - {self.content_hash}"
+
+
+class RejectionReport(models.Model):
+    """Row number and failure reason of every row skipped by one upload.
+
+    Background jobs share their id with the report, synchronous uploads get
+    a new id that is returned in the upload response.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="rejection_reports",
+    )
+    client_ident = models.CharField(max_length=255, blank=True)
+    # Name of the ``apis.schema.ImportSchema`` whose failure reasons are stored.
+    schema = models.CharField(max_length=64, default="users")
+    file = models.FileField(upload_to="reports/")
+    rows = models.PositiveBigIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.id} - {self.rows}"
@@ -0,0 +1,64 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+import multiprocessing
+import threading
+
+import django
+import numpy as np
+import pandas as pd
+
+from .conf import import_setting
+from .schema import USER_SCHEMA, ImportSchema
+from .validation import ValidationResult, check_rows, resolve_rows
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Return the shared pool used for parallel validation.
+
+    Workers are spawned rather than forked because uploads may be validated
+    from the threads of the background job pool. ``django.setup`` runs before
+    anything from this app is unpickled in the worker.
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=import_setting("PARALLEL_WORKERS"),
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=django.setup,
+            )
+    return _executor
+
+
+def should_validate_in_parallel(df: pd.DataFrame) -> bool:
+    workers = import_setting("PARALLEL_WORKERS")
+    return workers > 1 and len(df) >= import_setting("PARALLEL_MIN_ROWS")
+
+
+def check_rows_parallel(
+    df: pd.DataFrame, workers: int = None, schema: ImportSchema = USER_SCHEMA
+) -> pd.DataFrame:
+    """Run ``check_rows`` on contiguous partitions in worker processes.
+
+    Each worker compiles ``schema`` once and reuses it for later partitions.
+    """
+    workers = workers or import_setting("PARALLEL_WORKERS")
+    bounds = np.linspace(0, len(df), workers + 1, dtype=int)
+    partitions = [df.iloc[start:end] for start, end in zip(bounds, bounds[1:])]
+    return pd.concat(
+        get_process_pool().map(partial(check_rows, schema=schema), partitions)
+    )
+
+
+def validate_user_frame_parallel(
+    df: pd.DataFrame, existing_emails, workers: int = None
+) -> ValidationResult:
+    """Check rows in worker processes, then resolve existing emails serially.
+
+    Existing and in-file duplicate emails are resolved on the concatenated
+    partitions in the parent, so the result is identical to the serial path.
+    """
+    return resolve_rows(check_rows_parallel(df, workers), existing_emails)
@@ -0,0 +1,499 @@
+import codecs
+from contextlib import contextmanager, nullcontext
+import csv
+import gzip
+import io
+import itertools
+import mmap
+import os
+
+import pandas as pd
+from rest_framework import status
+
+from .conf import import_setting
+from .constants import CLIENT_ERROR_TYPE, VALIDATION_ERROR_TYPE
+from .schema import USER_SCHEMA, ImportSchema
+from .utils import ServiceError
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+    pa_csv = None
+    pq = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - zstandard is optional
+    zstandard = None
+
+# Rough csv row width used to turn CHUNK_SIZE into a pyarrow block size.
+ESTIMATED_ROW_BYTES = 64
+# Blocks read ahead for one row boundary before a csv is read without them.
+MAX_PENDING_BLOCKS = 4
+
+CSV = "csv"
+GZIP_CSV = "csv.gz"
+ZSTD_CSV = "csv.zst"
+PARQUET = "parquet"
+NDJSON = "ndjson"
+UPLOAD_FORMATS = (CSV, GZIP_CSV, ZSTD_CSV, PARQUET, NDJSON)
+
+# Errors of malformed uploads, reading the same file again fails the same way.
+# pandas and pyarrow parse errors and bad text encodings are ValueErrors.
+PARSE_ERRORS = (ValueError, csv.Error, EOFError, gzip.BadGzipFile)
+if zstandard is not None:
+    PARSE_ERRORS += (zstandard.ZstdError,)
+
+MAGIC_BYTES = (
+    (b"\x1f\x8b", GZIP_CSV),
+    (b"\x28\xb5\x2f\xfd", ZSTD_CSV),
+    (b"PAR1", PARQUET),
+)
+# Bytes looked at to tell text formats apart and reject binary files.
+SNIFF_BYTES = 4096
+UTF8_BOM = b"\xef\xbb\xbf"
+
+
+def detect_format(file) -> str:
+    """Name the upload format from the first bytes of ``file``, left at the start."""
+    file.seek(0)
+    head = file.read(SNIFF_BYTES)
+    file.seek(0)
+    return sniff_format(head)
+
+
+def sniff_format(head: bytes) -> str:
+    """Name the format of content starting with ``head``.
+
+    Compressed uploads are assumed to hold csv. Anything else with a NUL
+    byte near the start (zip, xlsx, images) is rejected with ``ValueError``.
+    """
+    head = head[:SNIFF_BYTES]
+    for magic, file_format in MAGIC_BYTES:
+        if head.startswith(magic):
+            return file_format
+    if b"\x00" in head:
+        raise ValueError(
+            f"Unsupported file format, expected one of: {', '.join(UPLOAD_FORMATS)}"
+        )
+    if head.removeprefix(UTF8_BOM).lstrip().startswith(b"{"):
+        return NDJSON
+    return CSV
+
+
+def decompress(file, file_format: str):
+    """Wrap ``file`` in a streaming decompressor, nothing is read up front."""
+    if file_format == GZIP_CSV:
+        return gzip.GzipFile(fileobj=file, mode="rb")
+    if zstandard is not None:
+        return io.BufferedReader(
+            zstandard.ZstdDecompressor().stream_reader(file, closefd=False)
+        )
+    if pa is not None and pa.Codec.is_available("zstd"):
+        return io.BufferedReader(pa.CompressedInputStream(file, "zstd"))
+    raise ServiceError(
+        detail="zstd compressed uploads are not supported on this server",
+        status_code=status.HTTP_400_BAD_REQUEST,
+        error_type=VALIDATION_ERROR_TYPE,
+    )
+
+
+def read_header(file):
+    """Read and parse only the header line, leaving ``file`` after it.
+
+    Blank lines before the header are skipped, as ``pd.read_csv`` does.
+    """
+    line = file.readline()
+    while line and is_blank_line(line):
+        line = file.readline()
+    return parse_header_line(line)
+
+
+def is_blank_line(line) -> bool:
+    if isinstance(line, bytes):
+        return not line.removeprefix(codecs.BOM_UTF8).strip()
+    return not line.lstrip("\ufeff").strip()
+
+
+def parse_header_line(line):
+    if isinstance(line, bytes):
+        line = line.decode("utf-8-sig")
+    else:
+        line = line.lstrip("\ufeff")
+    if not line.strip():
+        raise ValueError("No columns to parse from file")
+    return next(csv.reader(io.StringIO(line)))
+
+
+@contextmanager
+def open_upload(file):
+    """Yield a source to parse ``file`` from.
+
+    Files on disk, paths and uploads Django spooled to a temporary file, are
+    memory mapped when ``MMAP_UPLOADS`` is on, so parsers read the page
+    cache directly instead of through a Python file object. Anything else
+    is yielded as is.
+    """
+    if isinstance(file, (str, os.PathLike)):
+        path = file
+    elif hasattr(file, "temporary_file_path"):
+        path = file.temporary_file_path()
+    else:
+        yield file
+        return
+
+    with open(path, "rb") as f:
+        mapped = None
+        if import_setting("MMAP_UPLOADS"):
+            try:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty files cannot be mapped
+                pass
+        if mapped is None:
+            yield f
+            return
+        try:
+            yield mapped
+        finally:
+            try:
+                mapped.close()
+            except BufferError:
+                # An arrow buffer still points into the map, it is unmapped
+                # when that buffer is freed.
+                pass
+
+
+def _arrow_source(file):
+    """Let pyarrow read a memory map in place rather than through ``read``."""
+    if isinstance(file, mmap.mmap):
+        source = pa.BufferReader(pa.py_buffer(file))
+        source.seek(file.tell())
+        return source
+    return file
+
+
+class RowScanner:
+    """Find the complete csv rows of a buffer that grows at its end.
+
+    The buffer must begin at a row boundary. A newline ends a row only after
+    an even number of quote characters; an escaped quote ("") counts twice,
+    so it never changes the parity. The parity and the scan position are
+    kept between calls, so every byte is scanned once however the buffer
+    grows. A literal quote inside an unquoted field, which parsers accept,
+    flips the parity for the rest of the buffer, so callers bound how far
+    they wait for a row boundary.
+    """
+
+    def __init__(self):
+        self.scanned = 0
+        self.quoted = False
+        # Offsets just past the first and the last complete row, or -1 and 0.
+        self.first = -1
+        self.last = 0
+
+    def scan(self, buffer) -> int:
+        """Offset just past the last complete row of ``buffer``, 0 when there is none."""
+        position = self.scanned
+        while True:
+            quote = buffer.find(b'"', position)
+            stop = len(buffer) if quote < 0 else quote
+            if not self.quoted:
+                if self.first < 0:
+                    newline = buffer.find(b"\n", position, stop)
+                    self.first = newline + 1 if newline >= 0 else -1
+                newline = buffer.rfind(b"\n", position, stop)
+                if newline >= 0:
+                    self.last = newline + 1
+            if quote < 0:
+                break
+            self.quoted = not self.quoted
+            position = quote + 1
+        self.scanned = len(buffer)
+        return self.last
+
+    def cut(self, size: int):
+        """Account for the first ``size`` bytes being removed from the buffer."""
+        self.scanned = max(self.scanned - size, 0)
+        self.last = max(self.last - size, 0)
+        self.first = -1
+
+
+def check_header(header, required_columns):
+    """Normalize header names and map each required column to its position.
+
+    Duplicate or missing columns are rejected before any row is parsed.
+    """
+    required_columns = set(required_columns)
+    normalized = [column.strip().lower() for column in header]
+    if len(set(normalized)) != len(normalized):
+        raise ServiceError(
+            detail="Duplicate column names found in uploaded csv file",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            error_type=CLIENT_ERROR_TYPE,
+        )
+    if not required_columns.issubset(set(normalized)):
+        missing_columns = required_columns - set(normalized)
+        raise ServiceError(
+            detail=f"Missing required columns: {', '.join(missing_columns)}",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            error_type=VALIDATION_ERROR_TYPE,
+        )
+    return {
+        column: normalized.index(column) for column in sorted(required_columns)
+    }
+
+
+def resolve_engine(engine: str = None) -> str:
+    engine = engine or import_setting("PARSER_ENGINE")
+    if engine == "auto":
+        return "pyarrow" if pa_csv is not None else "c"
+    if engine == "pyarrow" and pa_csv is None:
+        return "c"
+    return engine
+
+
+def read_chunks(
+    file,
+    chunk_size: int,
+    engine: str = None,
+    timer=None,
+    schema: ImportSchema = USER_SCHEMA,
+):
+    """Yield frames of the schema columns from any of ``UPLOAD_FORMATS``.
+
+    The format is detected from the content, so every format feeds the same
+    validation and insert steps.
+    """
+    with timer.stage("header") if timer else nullcontext():
+        file_format = detect_format(file)
+
+    if file_format == PARQUET:
+        yield from read_parquet_chunks(file, chunk_size, timer, schema)
+    elif file_format == NDJSON:
+        yield from read_ndjson_chunks(file, chunk_size, timer, schema)
+    elif file_format == CSV:
+        yield from read_csv_chunks(file, chunk_size, engine, timer, schema)
+    else:
+        # Not closed here: closing some decompressors closes ``file`` too,
+        # which belongs to the caller.
+        stream = decompress(file, file_format)
+        yield from read_csv_chunks(stream, chunk_size, engine, timer, schema)
+
+
+def read_csv_chunks(
+    file,
+    chunk_size: int,
+    engine: str = None,
+    timer=None,
+    schema: ImportSchema = USER_SCHEMA,
+):
+    """Yield frames of the schema columns only, named by their normalized header.
+
+    Everything is read as text; validation does its own coercion. ``file``
+    is read once from its current position, so it may be a decompressing
+    stream.
+    """
+    with timer.stage("header") if timer else nullcontext():
+        header = read_header(file)
+        positions = check_header(header, schema.column_names)
+    yield from _read_csv_rows(file, header, positions, chunk_size, engine, schema)
+
+
+def _read_csv_rows(file, header, positions, chunk_size, engine, schema):
+    """Yield frames of the csv rows after ``file``'s position, which has no header."""
+    if resolve_engine(engine) == "pyarrow":
+        yield from _read_with_pyarrow(file, header, positions, chunk_size)
+        return
+
+    renames = {index: column for column, index in positions.items()}
+    try:
+        reader = pd.read_csv(
+            file,
+            header=None,
+            usecols=list(positions.values()),
+            dtype={index: str for index in positions.values()},
+            chunksize=chunk_size,
+            engine=resolve_engine(engine),
+        )
+    except pd.errors.EmptyDataError:
+        # Only a header line.
+        yield empty_frame(schema)
+        return
+    for df in reader:
+        yield df.rename(columns=renames)
+
+
+def read_parquet_chunks(
+    file, chunk_size: int, timer=None, schema: ImportSchema = USER_SCHEMA
+):
+    """Yield record batches of the schema columns straight from Parquet.
+
+    Values keep their stored types, no text is parsed.
+    """
+    if pq is None:
+        raise ServiceError(
+            detail="Parquet uploads are not supported on this server",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            error_type=VALIDATION_ERROR_TYPE,
+        )
+    with timer.stage("header") if timer else nullcontext():
+        parquet = pq.ParquetFile(_arrow_source(file))
+        names = parquet.schema_arrow.names
+        positions = check_header(names, schema.column_names)
+    columns = {names[index]: column for column, index in positions.items()}
+
+    emitted = False
+    for batch in parquet.iter_batches(batch_size=chunk_size, columns=list(columns)):
+        emitted = True
+        yield batch.to_pandas().rename(columns=columns)
+    if not emitted:
+        yield empty_frame(schema)
+
+
+def read_ndjson_chunks(
+    file, chunk_size: int, timer=None, schema: ImportSchema = USER_SCHEMA
+):
+    """Yield frames from newline delimited JSON objects, one row per line.
+
+    Keys are matched like csv header names. Values keep their JSON types and
+    keys missing from an object read as nulls.
+    """
+    # pandas reads lines straight from file objects, so decode them here.
+    # A codecs reader, unlike TextIOWrapper, never closes ``file``.
+    reader = pd.read_json(
+        codecs.getreader("utf-8-sig")(file),
+        lines=True,
+        chunksize=chunk_size,
+        dtype=False,
+        convert_dates=False,
+    )
+    chunks = iter(reader)
+    with timer.stage("header") if timer else nullcontext():
+        first = next(chunks, None)
+        if first is None:
+            raise ValueError("No columns to parse from file")
+        check_header(list(first.columns), schema.column_names)
+
+    for df in itertools.chain([first], chunks):
+        check_header(list(df.columns), ())
+        df.columns = [column.strip().lower() for column in df.columns]
+        yield df.reindex(columns=list(schema.column_names))
+
+
+def empty_frame(schema):
+    return pd.DataFrame({column: pd.Series(dtype=object) for column in schema.column_names})
+
+
+def _pyarrow_options(header, positions, chunk_size):
+    """Read and convert options selecting the schema columns as strings."""
+    names = [f"column_{index}" for index in range(len(header))]
+    columns = {f"column_{index}": column for column, index in positions.items()}
+    read_options = pa_csv.ReadOptions(
+        column_names=names,
+        block_size=max(chunk_size * ESTIMATED_ROW_BYTES, 1 << 20),
+    )
+    convert_options = pa_csv.ConvertOptions(
+        include_columns=list(columns),
+        column_types={name: pa.string() for name in columns},
+        strings_can_be_null=True,
+    )
+    return read_options, convert_options, columns
+
+
+def _read_with_pyarrow(file, header, positions, chunk_size):
+    """Stream record batches with pyarrow's multithreaded csv reader."""
+    read_options, convert_options, columns = _pyarrow_options(header, positions, chunk_size)
+    try:
+        reader = pa_csv.open_csv(
+            _arrow_source(file),
+            read_options=read_options,
+            convert_options=convert_options,
+        )
+    except pa.ArrowInvalid as error:
+        # The header was already read, so an empty rest is a header-only file.
+        if "Empty CSV file" not in str(error):
+            raise
+        reader = []
+    emitted = False
+    for batch in reader:
+        emitted = True
+        yield batch.to_pandas().rename(columns=columns)
+    if not emitted:
+        yield pd.DataFrame({column: pd.Series(dtype=object) for column in columns.values()})
+
+
+def parse_rows(block: bytes, header, positions, engine: str = None) -> pd.DataFrame:
+    """Parse complete csv rows without a header line, like ``read_csv_chunks``.
+
+    Used by ``apis.upload_handlers`` to parse an upload while it arrives.
+    """
+    if resolve_engine(engine) == "pyarrow":
+        read_options, convert_options, columns = _pyarrow_options(
+            header, positions, len(block) // ESTIMATED_ROW_BYTES
+        )
+        table = pa_csv.read_csv(
+            pa.BufferReader(block),
+            read_options=read_options,
+            convert_options=convert_options,
+        )
+        return table.to_pandas().rename(columns=columns)
+    df = pd.read_csv(
+        io.BytesIO(block),
+        header=None,
+        usecols=list(positions.values()),
+        dtype={index: str for index in positions.values()},
+        engine=resolve_engine(engine),
+    )
+    return df.rename(columns={index: column for column, index in positions.items()})
+
+
+def read_csv_blocks(
+    file,
+    chunk_size: int,
+    engine: str = None,
+    timer=None,
+    schema: ImportSchema = USER_SCHEMA,
+    offset: int = None,
+):
+    """Yield ``(start, end, frame)`` for blocks of complete rows of a plain csv file.
+
+    Like ``read_csv_chunks`` but ``file`` is cut into blocks of about
+    ``chunk_size`` rows whose byte offsets are known, so a later read can
+    continue from any block boundary by passing it as ``offset``. ``file``
+    must be seekable; the header is always read from the start.
+
+    When ``RowScanner`` finds no row boundary within ``MAX_PENDING_BLOCKS``
+    blocks, the rest is read like ``read_csv_chunks`` and yielded with
+    ``start`` and ``end`` set to None.
+    """
+    with timer.stage("header") if timer else nullcontext():
+        file.seek(0)
+        header = read_header(file)
+        positions = check_header(header, schema.column_names)
+    if offset is not None:
+        file.seek(offset)
+    position = file.tell()
+    block_size = chunk_size * ESTIMATED_ROW_BYTES
+    pending = bytearray()
+    rows = RowScanner()
+    while True:
+        data = file.read(block_size)
+        pending += data
+        end = rows.scan(pending) if data else len(pending)
+        block = bytes(pending[:end])
+        # Blank lines alone are no rows, as for the other readers.
+        if block.strip():
+            yield position, position + end, parse_rows(block, header, positions, engine)
+        position += end
+        del pending[:end]
+        rows.cut(end)
+        if not data:
+            return
+        if len(pending) > MAX_PENDING_BLOCKS * block_size:
+            file.seek(position)
+            for df in _read_csv_rows(file, header, positions, chunk_size, engine, schema):
+                yield None, None, df
+            return
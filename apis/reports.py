@@ -0,0 +1,126 @@
+from datetime import timedelta
+import json
+import os
+
+import numpy as np
+from django.utils import timezone
+
+from .conf import import_setting
+from .models import RejectionReport
+from .schema import get_schema
+
+# A report file is a sequence of blocks, one per imported chunk: the number
+# of rows, then their row numbers, then one reason code per row. About nine
+# bytes per rejected row, and a reader only ever holds one block.
+COUNT_DTYPE = np.dtype("<i8")
+ROW_DTYPE = np.dtype("<i8")
+CODE_DTYPE = np.dtype("u1")
+
+CSV_CONTENT_TYPE = "text/csv"
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+
+
+def create_report(
+    user=None, schema_name: str = "users", report_id=None, client_ident: str = ""
+):
+    """Create an empty report, removing reports older than ``REJECTION_REPORT_TTL``."""
+    ttl = timedelta(seconds=import_setting("REJECTION_REPORT_TTL"))
+    for expired in RejectionReport.objects.filter(created_at__lt=timezone.now() - ttl):
+        delete_report(expired)
+
+    report = RejectionReport(user=user, schema=schema_name, client_ident=client_ident)
+    if report_id is not None:
+        report.id = report_id
+    report.file.name = f"reports/{report.id}.bin"
+    os.makedirs(os.path.dirname(report.file.path), exist_ok=True)
+    open(report.file.path, "wb").close()
+    report.save()
+    return report
+
+
+def delete_report(report):
+    report.file.delete(save=False)
+    report.delete()
+
+
+class RejectionWriter:
+    """Append the rejected rows of each chunk to a report file.
+
+    Reason codes index ``ImportSchema.failure_reasons`` starting at 1, as
+    produced by ``resolve_rows``.
+    """
+
+    def __init__(self, report: RejectionReport, rows: int = 0, size: int = None):
+        self.report = report
+        self.rows = rows
+        if size is not None:
+            # Continue a report after a checkpoint, dropping later blocks.
+            os.truncate(report.file.path, size)
+        self._file = open(report.file.path, "ab")
+
+    @property
+    def size(self) -> int:
+        """Bytes written so far, flushed to the report file."""
+        self._file.flush()
+        return self._file.tell()
+
+    def write(self, row_numbers: np.ndarray, codes: np.ndarray):
+        if not len(row_numbers):
+            return
+        self._file.write(np.array([len(row_numbers)], dtype=COUNT_DTYPE).tobytes())
+        self._file.write(np.asarray(row_numbers, dtype=ROW_DTYPE).tobytes())
+        self._file.write(np.asarray(codes, dtype=CODE_DTYPE).tobytes())
+        self.rows += len(row_numbers)
+
+    def close(self):
+        self._file.close()
+        self.report.rows = self.rows
+        self.report.save(update_fields=["rows"])
+
+    def discard(self):
+        self._file.close()
+        delete_report(self.report)
+
+
+def iter_blocks(path):
+    """Yield ``(row_numbers, codes)`` arrays block by block."""
+    with open(path, "rb") as f:
+        while True:
+            header = f.read(COUNT_DTYPE.itemsize)
+            if not header:
+                return
+            count = int(np.frombuffer(header, dtype=COUNT_DTYPE)[0])
+            rows = np.frombuffer(f.read(count * ROW_DTYPE.itemsize), dtype=ROW_DTYPE)
+            codes = np.frombuffer(f.read(count * CODE_DTYPE.itemsize), dtype=CODE_DTYPE)
+            yield rows, codes
+
+
+def _reason_names(report):
+    return np.array([""] + get_schema(report.schema).failure_reasons, dtype=object)
+
+
+def stream_csv(report):
+    """Yield the report as csv text, one chunk of lines per block."""
+    reasons = _reason_names(report)
+    yield "row,reason\n"
+    for rows, codes in iter_blocks(report.file.path):
+        yield "".join(
+            f"{row},{reason}\n" for row, reason in zip(rows.tolist(), reasons[codes])
+        )
+
+
+def stream_ndjson(report):
+    """Yield the report as newline delimited JSON objects."""
+    # Reasons are encoded once instead of calling json.dumps per row.
+    reasons = np.array([json.dumps(reason) for reason in _reason_names(report)])
+    for rows, codes in iter_blocks(report.file.path):
+        yield "".join(
+            f'{{"row": {row}, "reason": {reason}}}\n'
+            for row, reason in zip(rows.tolist(), reasons[codes].tolist())
+        )
+
+
+REPORT_FORMATS = {
+    "csv": (stream_csv, CSV_CONTENT_TYPE),
+    "ndjson": (stream_ndjson, NDJSON_CONTENT_TYPE),
+}
@@ -0,0 +1,109 @@
+from datetime import timedelta
+import hashlib
+
+from django.utils import timezone
+from rest_framework import status
+
+from .conf import import_setting
+from .constants import CLIENT_ERROR_TYPE
+from .models import RejectionReport, UploadResult
+from .utils import ServiceError
+
+CACHE_OFF = "off"
+CACHE_BY_HASH = "hash"
+CACHE_BY_KEY = "key"
+
+
+def result_cache_enabled(idempotency_key: str = "") -> bool:
+    mode = import_setting("RESULT_CACHE")
+    return mode == CACHE_BY_HASH or (mode == CACHE_BY_KEY and bool(idempotency_key))
+
+
+def new_fingerprint(schema_name: str = ""):
+    """sha256 state that ``fingerprint`` feeds the file content into."""
+    digest = hashlib.sha256()
+    if schema_name:
+        digest.update(schema_name.encode() + b"\0")
+    return digest
+
+
+def fingerprint(file, schema_name: str = "") -> str:
+    """Streaming sha256 of an uploaded file, leaving it rewound for parsing.
+
+    The import schema name is hashed first so the same file imported as a
+    different type never replays a result.
+    """
+    streamed = getattr(file, "fingerprints", {}).get(schema_name)
+    if streamed is not None:
+        # Hashed by ``StreamingCsvUploadHandler`` while it was received.
+        return streamed
+    digest = new_fingerprint(schema_name)
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _fresh_results():
+    ttl = timedelta(seconds=import_setting("RESULT_CACHE_TTL"))
+    return UploadResult.objects.filter(created_at__gte=timezone.now() - ttl)
+
+
+def _has_report(result: UploadResult) -> bool:
+    upload_id = (result.data or {}).get("upload_id")
+    return upload_id is not None and RejectionReport.objects.filter(pk=upload_id).exists()
+
+
+def get_cached_result(
+    client_ident: str, content_hash: str, idempotency_key: str = "", with_report=False
+):
+    """Return the cached ``UploadResult`` of an identical re-upload, if any.
+
+    In ``key`` mode only requests carrying an ``Idempotency-Key`` are
+    replayed, and reusing a key for different content is rejected. An
+    upload asking for a rejection report is only replayed from a result
+    whose report can still be downloaded.
+    """
+    if not result_cache_enabled(idempotency_key):
+        return None
+
+    results = _fresh_results().filter(client_ident=client_ident).order_by("-created_at")
+    if import_setting("RESULT_CACHE") == CACHE_BY_KEY:
+        result = results.filter(idempotency_key=idempotency_key).first()
+        if result is not None and result.content_hash != content_hash:
+            raise ServiceError(
+                detail="Idempotency-Key was already used for a different file",
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                error_type=CLIENT_ERROR_TYPE,
+            )
+    else:
+        result = results.filter(content_hash=content_hash).first()
+
+    if result is None or (with_report and not _has_report(result)):
+        return None
+    result.hits += 1
+    result.last_used_at = timezone.now()
+    result.save(update_fields=["hits", "last_used_at"])
+    return result
+
+
+def store_result(
+    client_ident: str, content_hash: str, detail, idempotency_key: str = "", data=None
+):
+    """Cache ``detail`` and ``data`` and evict expired and least recently used entries."""
+    if not result_cache_enabled(idempotency_key):
+        return
+    UploadResult.objects.create(
+        client_ident=client_ident,
+        content_hash=content_hash,
+        idempotency_key=idempotency_key,
+        detail=detail,
+        data=data,
+    )
+    ttl = timedelta(seconds=import_setting("RESULT_CACHE_TTL"))
+    UploadResult.objects.filter(created_at__lt=timezone.now() - ttl).delete()
+    stale = UploadResult.objects.order_by("-last_used_at").values_list("pk", flat=True)[
+        import_setting("RESULT_CACHE_MAX_ENTRIES") :
+    ]
+    UploadResult.objects.filter(pk__in=list(stale)).delete()
@@ -0,0 +1,163 @@
+from dataclasses import dataclass
+
+from django.apps import apps
+
+from .constants import (
+    DUPLICATE_EMAIL_FAILURE,
+    EXISTING_EMAIL_FAILURE,
+    INVALID_AGE_FAILURE,
+    INVALID_EMAIL_FAILURE,
+    INVALID_NAME_FAILURE,
+    NULL_EMAIL_FAILURE,
+    UPLOAD_FAILURE_MESSAGES,
+)
+
+STRING = "string"
+EMAIL = "email"
+INTEGER = "integer"
+COLUMN_TYPES = (STRING, EMAIL, INTEGER)
+
+MIN_AGE = 0
+MAX_AGE = 120
+
+
+@dataclass(frozen=True)
+class Column:
+    """One csv column: how it is parsed, checked and stored.
+
+    ``string`` values are kept as uploaded and blank text counts as null,
+    ``email`` values are stripped and lowercased, ``integer`` values are
+    truncated like ``int()``. Failure reasons default to
+    ``invalid_<name>``, and to the same reason for nulls. Unique columns
+    also report ``existing_<name>`` for values already stored and
+    ``duplicate_<name>`` for values accepted earlier in the same upload.
+    """
+
+    name: str
+    type: str = STRING
+    nullable: bool = False
+    regex: str = None
+    min_value: int = None
+    max_value: int = None
+    # Unique within the upload and against rows already stored in ``field``.
+    unique: bool = False
+    field: str = None
+    failure: str = None
+    null_failure: str = None
+    existing_failure: str = None
+    duplicate_failure: str = None
+
+    def __post_init__(self):
+        if self.type not in COLUMN_TYPES:
+            raise ValueError(f"Unknown column type: {self.type}")
+        if self.failure is None:
+            object.__setattr__(self, "failure", f"invalid_{self.name}")
+        if self.null_failure is None:
+            object.__setattr__(self, "null_failure", self.failure)
+        if self.existing_failure is None:
+            object.__setattr__(self, "existing_failure", f"existing_{self.name}")
+        if self.duplicate_failure is None:
+            object.__setattr__(self, "duplicate_failure", f"duplicate_{self.name}")
+
+    @property
+    def model_field(self) -> str:
+        return self.field or self.name
+
+
+@dataclass(frozen=True)
+class ImportSchema:
+    """Declarative description of one csv import type.
+
+    Columns are checked in declaration order and a row is counted under the
+    first check it fails, so the order of ``columns`` is also the priority
+    of the failure reasons. ``failure_messages`` holds ``(reason, message)``
+    pairs in the order they are reported.
+    """
+
+    name: str
+    model: str
+    columns: tuple
+    # Noun put before "records" in messages, such as "user"; empty by default.
+    record_label: str = ""
+    failure_messages: tuple = ()
+
+    def __post_init__(self):
+        if sum(column.unique for column in self.columns) > 1:
+            raise ValueError("An import schema supports a single unique column")
+
+    @property
+    def column_names(self):
+        return [column.name for column in self.columns]
+
+    @property
+    def unique_column(self):
+        return next((column for column in self.columns if column.unique), None)
+
+    @property
+    def failure_reasons(self):
+        reasons = []
+        for column in self.columns:
+            candidates = [column.null_failure, column.failure]
+            if column.unique:
+                candidates += [column.existing_failure, column.duplicate_failure]
+            for reason in candidates:
+                if reason not in reasons:
+                    reasons.append(reason)
+        return reasons
+
+    @property
+    def records(self) -> str:
+        """How records are named in messages: "user records" or just "records"."""
+        return f"{self.record_label} records".lstrip()
+
+    @property
+    def messages(self):
+        """Detail message per failure reason, generated for undeclared reasons."""
+        messages = dict(self.failure_messages)
+        for reason in self.failure_reasons:
+            messages.setdefault(
+                reason,
+                f"{self.records} failed due to {reason.replace('_', ' ')}",
+            )
+        return messages
+
+    def get_model(self):
+        return apps.get_model(self.model)
+
+
+USER_SCHEMA = ImportSchema(
+    name="users",
+    model="apis.User",
+    record_label="user",
+    columns=(
+        Column(
+            "email",
+            type=EMAIL,
+            unique=True,
+            failure=INVALID_EMAIL_FAILURE,
+            null_failure=NULL_EMAIL_FAILURE,
+            existing_failure=EXISTING_EMAIL_FAILURE,
+            duplicate_failure=DUPLICATE_EMAIL_FAILURE,
+        ),
+        Column("name", failure=INVALID_NAME_FAILURE),
+        Column(
+            "age",
+            type=INTEGER,
+            min_value=MIN_AGE,
+            max_value=MAX_AGE,
+            failure=INVALID_AGE_FAILURE,
+        ),
+    ),
+    failure_messages=tuple(UPLOAD_FAILURE_MESSAGES.items()),
+)
+
+SCHEMAS = {USER_SCHEMA.name: USER_SCHEMA}
+
+
+def register_schema(schema: ImportSchema) -> ImportSchema:
+    SCHEMAS[schema.name] = schema
+    return schema
+
+
+def get_schema(name: str) -> ImportSchema:
+    return SCHEMAS[name]
@@ -1,5 +1,9 @@
 from rest_framework import serializers
 
+from .conf import import_setting
+from .models import ImportJob, UploadSession
+from .parsing import detect_format
+
 
 class LoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
@@ -13,10 +17,15 @@ class LoginSerializer(serializers.Serializer):
 
 class FileUploadSerializer(serializers.Serializer):
     file = serializers.FileField()
+    async_mode = serializers.BooleanField(required=False, default=False)
+    rejection_report = serializers.BooleanField(required=False, default=False)
 
     def validate_file(self, value):
-        if not value.name.endswith(".csv"):
-            raise serializers.ValidationError("Only .csv files are allowed.")
+        # The format comes from the content, not the file name.
+        try:
+            detect_format(value)
+        except ValueError as error:
+            raise serializers.ValidationError(str(error))
         return value
 
 
@@ -32,3 +41,49 @@ class TokenSerializer(serializers.Serializer):
 
 class TokenResponseSerializer(BaseApiResponseSerializer):
     data = TokenSerializer()
+
+
+class ImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ImportJob
+        fields = [
+            "id",
+            "state",
+            "rows_processed",
+            "uploaded_count",
+            "updated_count",
+            "failures",
+            "attempts",
+            "error",
+            "rejection_report",
+            "created_at",
+            "finished_at",
+        ]
+
+
+class UploadSessionCreateSerializer(serializers.Serializer):
+    filename = serializers.CharField(max_length=255)
+    size = serializers.IntegerField(min_value=1)
+    sha256 = serializers.RegexField(r"^[0-9a-fA-F]{64}$", required=False, default="")
+
+    def validate_size(self, size):
+        limit = import_setting("UPLOAD_SESSION_MAX_BYTES")
+        if limit and size > limit:
+            raise serializers.ValidationError(
+                f"Ensure this value is less than or equal to {limit}."
+            )
+        return size
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadSession
+        fields = [
+            "id",
+            "filename",
+            "size",
+            "received_bytes",
+            "state",
+            "job",
+            "created_at",
+        ]
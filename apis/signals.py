@@ -0,0 +1,32 @@
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .auth import forget_missing_email
+from .db import apply_db_profile
+from .dedup import email_snapshot
+from .models import User
+
+
+@receiver(post_save, sender=User)
+def invalidate_snapshot_on_email_edit(sender, instance, created, update_fields, **kwargs):
+    # New users are picked up by the primary key refresh; only edits that may
+    # change an existing email make the snapshot wrong.
+    if not created and (update_fields is None or "email" in update_fields):
+        email_snapshot.invalidate()
+
+
+@receiver(post_delete, sender=User)
+def invalidate_snapshot_on_delete(sender, instance, **kwargs):
+    email_snapshot.invalidate()
+
+
+@receiver(post_save, sender=User)
+def forget_missing_login_email(sender, instance, created, update_fields, **kwargs):
+    if created or update_fields is None or "email" in update_fields:
+        forget_missing_email(instance.email)
+
+
+@receiver(connection_created)
+def apply_db_profile_on_connect(sender, connection, **kwargs):
+    apply_db_profile(connection)
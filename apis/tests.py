@@ -1,11 +1,52 @@
+from datetime import timedelta
+import gzip
+import hashlib
 import io
+import json
+import mmap
+import os
+import threading
 import pandas as pd
 import pytest
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.backends.sqlite3.base import DatabaseWrapper
+from django.utils import timezone
 from rest_framework.test import APIClient
 import random
 from faker import Faker
 
+from apis.admission import AdmissionController, AdmissionRejected, import_admission
+from apis.auth import forget_missing_email
+from apis.db import read_pragmas
+from apis.dedup import EMAIL_INDEXES, SharedEmailIndex, email_snapshot
+from apis import importer as importer_module, jobs
+from apis.importer import CsvImporter
+from apis.inserts import _build_objects
+from apis.jobs import run_import_job
+from apis.models import (
+    SERVICE_ACCOUNT_HASHER,
+    ImportJob,
+    ThrottleBucket,
+    UploadResult,
+    UploadSession,
+    User,
+)
+from apis.parallel import validate_user_frame_parallel
+from apis.parsing import open_upload, read_chunks, read_csv_blocks, read_csv_chunks
+from apis.schema import EMAIL, INTEGER, Column, ImportSchema
+from apis.throttling import STORES, DatabaseThrottleStore, sliding_window, token_bucket
+from apis.upload_handlers import StreamingCsvParser
+from apis.utils import get_upload_detail, is_valid_email, validate_emails
+from apis.validation import (
+    check_rows,
+    compile_schema,
+    resolve_rows,
+    validate_user_frame,
+    validate_user_rows,
+)
+
 fake = Faker()
 
 
@@ -14,6 +55,7 @@ class TestCSVImportAPI:
     def setup_method(self):
         self.client = APIClient()
         self.url = "/api/file-upload/"
+        STORES["local"].clear()
 
     def create_csv_file_with_records(self, records):
         df = pd.DataFrame(records)
@@ -54,12 +96,1303 @@ class TestCSVImportAPI:
         response = self.client.post(self.url, {"file": file}, format="multipart")
         assert response.status_code == 200
 
+    def test_csv_import_reports_failure_counts(self):
+        file = self.create_csv_file_with_records(
+            [
+                {"name": "Ann", "email": "Ann@Example.com", "age": 30},
+                {"name": "Ann Again", "email": " ann@example.com ", "age": 31},
+                {"name": "", "email": "bob@example.com", "age": 30},
+                {"name": "Cid", "email": "cid@example", "age": 30},
+                {"name": "Dee", "email": None, "age": 30},
+                {"name": "Eve", "email": "eve@example.com", "age": 130},
+            ]
+        )
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 200
+        assert response.data["detail"] == {
+            "success": ["1 user records uploaded successfully"],
+            "failed": [
+                "1 user records failed due to null email",
+                "0 user records failed due to existing email",
+                "1 user records failed due to duplicate email within file",
+                "1 user records failed due to invalid name",
+                "1 user records failed due to invalid email",
+                "1 user records failed due to invalid age",
+                "5 total user records skipped",
+            ],
+        }
+
+    def test_csv_import_in_small_chunks(self, settings):
+        settings.CSV_IMPORT = {"CHUNK_SIZE": 2, "BATCH_SIZE": 1}
+        file = self.create_csv_file_with_records(
+            [
+                {"name": "Ann", "email": "ann@example.com", "age": 30},
+                {"name": "Bob", "email": "bob@example.com", "age": 30},
+                {"name": "Ann Again", "email": "ANN@example.com", "age": 30},
+                {"name": "Cid", "email": "cid@example.com", "age": "old"},
+                {"name": "Dee", "email": "dee@example.com", "age": 30},
+            ]
+        )
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 200
+        assert response.data["detail"]["success"] == [
+            "3 user records uploaded successfully"
+        ]
+        assert (
+            "1 user records failed due to duplicate email within file"
+            in response.data["detail"]["failed"]
+        )
+        assert User.objects.count() == 3
+
+    def test_csv_import_accepts_float_ages_written_by_pandas(self):
+        # An integer column with gaps is written as "22.0" by ``to_csv``.
+        file = self.create_csv_file_with_records(
+            [
+                {"name": "Ann", "email": "ann@example.com", "age": 22},
+                {"name": "Bob", "email": "bob@example.com"},
+                {"name": "Cid", "email": "cid@example.com", "age": 25.5},
+            ]
+        )
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 200
+        assert response.data["detail"]["success"] == [
+            "2 user records uploaded successfully"
+        ]
+        assert "1 user records failed due to invalid age" in response.data["detail"]["failed"]
+        assert sorted(User.objects.values_list("age", flat=True)) == [22, 25]
+
+    def test_csv_with_stray_quote_is_imported(self, settings):
+        settings.CSV_IMPORT = {"CHUNK_SIZE": 10}
+        rows = b"".join(b"User,user%d@example.com,30\n" % i for i in range(100))
+        file = SimpleUploadedFile(
+            "users.csv",
+            b'name,email,age\nBob "The Builder,bob@example.com,30\n' + rows,
+            content_type="text/csv",
+        )
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 200
+        assert response.data["detail"]["success"] == [
+            "101 user records uploaded successfully"
+        ]
+
+    @pytest.mark.parametrize("stream_limit", [0, 1024 * 1024])
+    def test_blank_lines_before_the_header_are_skipped(self, settings, stream_limit):
+        settings.CSV_IMPORT = {"STREAM_PARSE_MAX_BYTES": stream_limit}
+        file = SimpleUploadedFile(
+            "users.csv",
+            b"\n \r\nname,email,age\nAnn,ann@example.com,30\n",
+            content_type="text/csv",
+        )
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 200
+        assert response.data["detail"]["success"] == [
+            "1 user records uploaded successfully"
+        ]
+
+    def test_duplicates_are_counted_across_chunks(self, settings):
+        settings.CSV_IMPORT = {"CHUNK_SIZE": 1}
+        User.objects.create(email="ann@example.com", name="Ann")
+        file = self.create_csv_file_with_records(
+            [
+                {"name": "Ann", "email": "ann@example.com", "age": 30},
+                {"name": "Bob", "email": "bob@example.com", "age": 300},
+                {"name": "Bob", "email": "bob@example.com", "age": 30},
+                {"name": "Bob", "email": "Bob@example.com", "age": 30},
+            ]
+        )
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        failed = response.data["detail"]["failed"]
+        assert response.data["detail"]["success"] == ["1 user records uploaded successfully"]
+        assert "1 user records failed due to existing email" in failed
+        assert "1 user records failed due to duplicate email within file" in failed
+        assert "1 user records failed due to invalid age" in failed
+
+    def test_rejected_rows_are_streamed_as_a_report(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        settings.CSV_IMPORT = {"CHUNK_SIZE": 2}
+        file = self.create_csv_file_with_records(
+            [
+                {"name": "Ann", "email": "ann@example.com", "age": 30},
+                {"name": "Bob", "email": "bob@example", "age": 30},
+                {"name": "Ann Again", "email": "ANN@example.com", "age": 30},
+                {"name": "", "email": "cid@example.com", "age": 30},
+                {"name": "Dee", "email": "dee@example.com", "age": 30},
+            ]
+        )
+        response = self.client.post(
+            self.url, {"file": file, "rejection_report": True}, format="multipart"
+        )
+        assert response.status_code == 200
+        upload_id = response.data["data"]["upload_id"]
+
+        csv_response = self.client.get(f"{self.url}{upload_id}/rejections.csv")
+        ndjson_response = self.client.get(f"{self.url}{upload_id}/rejections.ndjson")
+
+        assert csv_response.status_code == 200
+        assert b"".join(csv_response.streaming_content).decode() == (
+            "row,reason\n2,invalid_email\n3,duplicate_email\n4,invalid_name\n"
+        )
+        lines = b"".join(ndjson_response.streaming_content).decode().splitlines()
+        assert json.loads(lines[1]) == {"row": 3, "reason": "duplicate_email"}
+
+    def test_async_import_job_records_rejections(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        file = self.create_csv_file_with_records(
+            [{"name": "Bob", "email": "bob@example.com", "age": 300}]
+        )
+        response = self.client.post(
+            self.url,
+            {"file": file, "async_mode": True, "rejection_report": True},
+            format="multipart",
+        )
+        job_id = response.data["data"]["job_id"]
+        run_import_job(job_id)
+
+        report = self.client.get(f"{self.url}{job_id}/rejections.csv")
+
+        assert b"".join(report.streaming_content) == b"row,reason\n1,invalid_age\n"
+
+    def test_jobs_and_reports_are_only_visible_to_their_owner(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        records = [{"name": "Bob", "email": "bob@example", "age": 30}]
+        upload = self.client.post(
+            self.url,
+            {"file": self.create_csv_file_with_records(records), "rejection_report": True},
+            format="multipart",
+        )
+        queued = self.client.post(
+            self.url,
+            {"file": self.create_csv_file_with_records(records), "async_mode": True},
+            format="multipart",
+        )
+        upload_id = upload.data["data"]["upload_id"]
+        job_id = queued.data["data"]["job_id"]
+
+        other = APIClient(REMOTE_ADDR="10.0.0.2")
+        assert other.get(f"{self.url}{upload_id}/rejections.csv").status_code == 404
+        assert other.get(f"{self.url}{job_id}/").status_code == 404
+        assert other.post(f"{self.url}{job_id}/resume/").status_code == 404
+        assert self.client.get(f"{self.url}{job_id}/").status_code == 200
+
+    resume_records = [
+        {"name": "Ann", "email": "ann@example.com", "age": 30},
+        {"name": "Bob", "email": "bob@example", "age": 30},
+        {"name": "Cid", "email": "cid@example.com", "age": 30},
+        {"name": "Dee", "email": "dee@example.com", "age": 30},
+        {"name": "Eve", "email": "eve@example.com", "age": 300},
+        {"name": "Fay", "email": "fay@example.com", "age": 30},
+    ]
+
+    def test_failed_import_job_resumes_from_checkpoint(self, settings, tmp_path, monkeypatch):
+        settings.MEDIA_ROOT = tmp_path
+        settings.CSV_IMPORT = {"CHUNK_SIZE": 2, "BATCH_SIZE": 1}
+        save_checkpoint = jobs._save_checkpoint
+
+        def fail_after_third_row(job, checkpoint):
+            if checkpoint.rows > 3:
+                raise RuntimeError("database went away")
+            save_checkpoint(job, checkpoint)
+
+        monkeypatch.setattr(jobs, "_save_checkpoint", fail_after_third_row)
+        file = self.create_csv_file_with_records(self.resume_records)
+        response = self.client.post(
+            self.url,
+            {"file": file, "async_mode": True, "rejection_report": True},
+            format="multipart",
+        )
+        job_id = response.data["data"]["job_id"]
+        failed = run_import_job(job_id)
+
+        assert failed.state == "failed"
+        assert (failed.rows_processed, failed.uploaded_count) == (3, 2)
+        assert failed.checkpoint["offset"] > 0
+        assert User.objects.count() == 2
+
+        monkeypatch.setattr(jobs, "_save_checkpoint", save_checkpoint)
+        resumed = self.client.post(f"{self.url}{job_id}/resume/")
+        assert resumed.status_code == 202
+        job = run_import_job(job_id)
+        report = self.client.get(f"{self.url}{job_id}/rejections.csv")
+
+        assert (job.state, job.attempts, job.rows_processed) == ("completed", 2, 6)
+        assert job.uploaded_count == 4
+        assert job.failures["invalid_email"] == job.failures["invalid_age"] == 1
+        assert b"".join(report.streaming_content) == (
+            b"row,reason\n2,invalid_email\n5,invalid_age\n"
+        )
+        assert self.client.post(f"{self.url}{job_id}/resume/").status_code == 409
+
+    def test_import_job_with_stray_quote_resumes(self, settings, tmp_path, monkeypatch):
+        settings.MEDIA_ROOT = tmp_path
+        settings.CSV_IMPORT = {"CHUNK_SIZE": 2, "BATCH_SIZE": 1}
+        save_checkpoint = jobs._save_checkpoint
+
+        def fail_after_row_30(job, checkpoint):
+            if checkpoint.rows > 30:
+                raise RuntimeError("database went away")
+            save_checkpoint(job, checkpoint)
+
+        monkeypatch.setattr(jobs, "_save_checkpoint", fail_after_row_30)
+        records = [
+            {"name": "User", "email": f"user{i}@example.com", "age": 30} for i in range(40)
+        ]
+        records[5]["name"] = 'Bob "The Builder'
+        file = self.create_csv_file_with_records(records)
+        response = self.client.post(
+            self.url, {"file": file, "async_mode": True}, format="multipart"
+        )
+        job_id = response.data["data"]["job_id"]
+        failed = run_import_job(job_id)
+
+        assert (failed.state, failed.rows_processed) == ("failed", 30)
+        monkeypatch.setattr(jobs, "_save_checkpoint", save_checkpoint)
+        self.client.post(f"{self.url}{job_id}/resume/")
+        job = run_import_job(job_id)
+
+        assert (job.state, job.rows_processed, job.uploaded_count) == ("completed", 40, 40)
+        assert User.objects.count() == 40
+
+    def test_failed_upload_is_kept_for_resuming(self, settings, tmp_path, monkeypatch):
+        settings.MEDIA_ROOT = tmp_path
+        settings.CSV_IMPORT = {"BATCH_SIZE": 1}
+        original_insert = importer_module.insert_records
+
+        def insert_records(records, *args):
+            if "dee@example.com" in records["email"].tolist():
+                raise RuntimeError("database went away")
+            return original_insert(records, *args)
+
+        monkeypatch.setattr(importer_module, "insert_records", insert_records)
+        file = self.create_csv_file_with_records(self.resume_records)
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 400
+        assert response.data["detail"]["rows_processed"] == 3
+        job_id = response.data["detail"]["job_id"]
+
+        monkeypatch.setattr(importer_module, "insert_records", original_insert)
+        assert self.client.post(f"{self.url}{job_id}/resume/").status_code == 202
+        job = run_import_job(job_id)
+
+        assert (job.state, job.uploaded_count, job.rows_processed) == ("completed", 4, 6)
+        assert User.objects.count() == 4
+
+    def test_import_job_failing_to_start_is_marked_failed(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        job = ImportJob.objects.create(
+            file=self.create_csv_file_with_records(self.resume_records),
+            schema="missing",
+        )
+
+        jobs._run_in_worker(job.pk)
+        job.refresh_from_db()
+
+        assert (job.state, job.attempts) == ("failed", 1)
+        assert job.finished_at is not None
+
+    def test_pending_import_jobs_are_resumed(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        file = self.create_csv_file_with_records(self.resume_records)
+        response = self.client.post(
+            self.url, {"file": file, "async_mode": True}, format="multipart"
+        )
+        job_id = response.data["data"]["job_id"]
+        # Queued on commit, which never happens inside this test.
+        assert ImportJob.objects.get(pk=job_id).state == "pending"
+
+        call_command("resume_import_jobs", stdout=io.StringIO())
+
+        job = ImportJob.objects.get(pk=job_id)
+        assert (job.state, job.uploaded_count) == ("completed", 4)
+
+    def test_unparsable_upload_is_not_kept(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        settings.CSV_IMPORT = {"CHUNK_SIZE": 10, "PARSER_ENGINE": "c", "STREAM_PARSE_MAX_BYTES": 0}
+        rows = b"".join(b"User,user%d@example.com,30\n" % i for i in range(50))
+        file = SimpleUploadedFile(
+            "users.csv",
+            b"name,email,age\n" + rows + b'Bob,"bob@example.com,30\n',
+            content_type="text/csv",
+        )
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 400
+        assert response.data["detail"] is None
+        assert User.objects.exists()
+        assert not ImportJob.objects.exists()
+
+    def test_expired_failed_uploads_are_deleted(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        settings.CSV_IMPORT = {"FAILED_IMPORT_TTL": 60}
+        job = ImportJob.objects.create(
+            file=SimpleUploadedFile("users.csv", b"name,email,age\n"),
+            client_ident="ip:127.0.0.1",
+            state=ImportJob.State.FAILED,
+            finished_at=timezone.now() - timedelta(minutes=2),
+        )
+        path = job.file.path
+
+        jobs.delete_expired_uploads()
+        job.refresh_from_db()
+
+        assert not job.file
+        assert not os.path.exists(path)
+        assert self.client.post(f"{self.url}{job.pk}/resume/").status_code == 409
+
+    @pytest.mark.parametrize("strategy", ["query", "shared", "bloom"])
+    def test_async_upload_view_imports_csv(self, settings, strategy):
+        settings.CSV_IMPORT = {"EMAIL_LOOKUP": strategy, "CHUNK_SIZE": 2}
+        User.objects.create(email="ann@example.com", name="Ann")
+        file = self.create_csv_file_with_records(
+            [
+                {"name": "Ann", "email": "ANN@example.com", "age": 30},
+                {"name": "Bob", "email": "bob@example.com", "age": 30},
+                {"name": "Bob", "email": "bob@example.com", "age": 30},
+                {"name": "Cid", "email": "cid@example.com", "age": 300},
+            ]
+        )
+        response = self.client.post(
+            "/api/file-upload/async/", {"file": file}, format="multipart"
+        )
+
+        detail = response.json()["detail"]
+        assert response.status_code == 200
+        assert detail["success"] == ["1 user records uploaded successfully"]
+        assert "1 user records failed due to existing email" in detail["failed"]
+        assert "1 user records failed due to duplicate email within file" in detail["failed"]
+        assert User.objects.filter(email="bob@example.com").exists()
+
+    def test_async_upload_view_errors_match_sync_view(self, settings):
+        settings.REST_FRAMEWORK = {
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {"upload_requests": "1/min"},
+        }
+        url = "/api/file-upload/async/"
+        file = SimpleUploadedFile("users.xlsx", b"PK\x03\x04\x00\x00")
+
+        invalid = self.client.post(url, {"file": file}, format="multipart")
+        throttled = self.client.post(url, {"file": file}, format="multipart")
+
+        assert invalid.status_code == 400
+        assert invalid.json()["error_type"] == "validation_error"
+        assert throttled.status_code == 429
+        assert throttled.has_header("Retry-After")
+
+    def test_async_import_job_reports_progress(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        file = self.create_csv_file_with_records(
+            [
+                {"name": "Ann", "email": "ann@example.com", "age": 30},
+                {"name": "Bob", "email": "bob@example.com", "age": 300},
+            ]
+        )
+        response = self.client.post(
+            self.url, {"file": file, "async_mode": True}, format="multipart"
+        )
+        assert response.status_code == 202
+        job_id = response.data["data"]["job_id"]
+
+        status_response = self.client.get(f"{self.url}{job_id}/")
+        assert status_response.data["data"]["state"] == "pending"
+
+        run_import_job(job_id)
+
+        status_response = self.client.get(f"{self.url}{job_id}/")
+        assert status_response.status_code == 200
+        assert status_response.data["data"]["state"] == "completed"
+        assert status_response.data["data"]["rows_processed"] == 2
+        assert status_response.data["data"]["failures"]["invalid_age"] == 1
+        assert status_response.data["detail"]["success"] == [
+            "1 user records uploaded successfully"
+        ]
+
+    @pytest.mark.parametrize("store", ["local", "database"])
+    @pytest.mark.parametrize("algorithm", ["token_bucket", "sliding_window"])
+    def test_upload_requests_are_throttled(self, settings, store, algorithm):
+        settings.CSV_IMPORT = {"THROTTLE_STORE": store, "THROTTLE_ALGORITHM": algorithm}
+        settings.REST_FRAMEWORK = {
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {"upload_requests": "1/min"},
+        }
+        records = [{"name": "Ann", "email": "ann@example.com", "age": 30}]
+
+        first = self.client.post(
+            self.url,
+            {"file": self.create_csv_file_with_records(records)},
+            format="multipart",
+        )
+        second = self.client.post(
+            self.url,
+            {"file": self.create_csv_file_with_records(records)},
+            format="multipart",
+        )
+
+        assert first.status_code == 200
+        assert second.status_code == 429
+        assert second.data["error_type"] == "rate_limit_error"
+        assert 1 <= int(second["Retry-After"]) <= 60
+
+    def test_upload_rows_are_charged_after_import(self, settings):
+        settings.REST_FRAMEWORK = {
+            **settings.REST_FRAMEWORK,
+            "DEFAULT_THROTTLE_RATES": {"upload_rows": "3/hour"},
+        }
+        records = [
+            {"name": "Ann", "email": f"ann{i}@example.com", "age": 30} for i in range(5)
+        ]
+
+        first = self.client.post(
+            self.url,
+            {"file": self.create_csv_file_with_records(records)},
+            format="multipart",
+        )
+        second = self.client.post(
+            self.url,
+            {"file": self.create_csv_file_with_records(records)},
+            format="multipart",
+        )
+
+        assert first.status_code == 200
+        assert second.status_code == 429
+
+    @pytest.mark.parametrize("strategy", ["query", "snapshot", "hashed", "shared", "bloom"])
+    def test_existing_emails_are_detected(self, settings, strategy):
+        settings.CSV_IMPORT = {"EMAIL_LOOKUP": strategy, "CHUNK_SIZE": 1}
+        User.objects.create(email="Ann@Example.com", name="Ann")
+        file = self.create_csv_file_with_records(
+            [
+                {"name": "Ann", "email": "ann@example.com", "age": 30},
+                {"name": "Bob", "email": "bob@example.com", "age": 30},
+                {"name": "Bob", "email": "BOB@example.com", "age": 30},
+            ]
+        )
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        failed = response.data["detail"]["failed"]
+        assert response.status_code == 200
+        assert "1 user records failed due to existing email" in failed
+        assert "1 user records failed due to duplicate email within file" in failed
+
+    @pytest.mark.parametrize("engine", ["c", "pyarrow"])
+    def test_csv_import_reads_only_required_columns(self, settings, engine):
+        if engine == "pyarrow":
+            pytest.importorskip("pyarrow")
+        settings.CSV_IMPORT = {"PARSER_ENGINE": engine}
+        content = (
+            b"Extra, NAME ,Email,age,notes\n"
+            b"1,Ann,ann@example.com,30,\"long, quoted\"\n"
+            b"2,Bob,,40,x\n"
+            b"3,Cid,cid@example.com,,x\n"
+        )
+        file = SimpleUploadedFile("users.csv", content, content_type="text/csv")
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 200
+        assert response.data["detail"]["success"] == [
+            "1 user records uploaded successfully"
+        ]
+        assert "1 user records failed due to null email" in response.data["detail"]["failed"]
+        assert "1 user records failed due to invalid age" in response.data["detail"]["failed"]
+
+    def test_csv_header_is_checked_before_body(self):
+        content = b"name,email,name\n" + b"\xff\xfe garbage\n" * 10
+        file = SimpleUploadedFile("users.csv", content, content_type="text/csv")
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 400
+        assert response.data["message"] == "Duplicate column names found in uploaded csv file"
+
+    @pytest.mark.parametrize("stream_limit", [0, 1 << 20])
+    def test_upload_parsed_while_received_matches_file_parse(self, settings, stream_limit):
+        settings.CSV_IMPORT = {"STREAM_PARSE_MAX_BYTES": stream_limit}
+        content = (
+            b'name,email,age\n"Ann\nAnn",ann@example.com,30\n'
+            b'"Bob ""B""",bob@example.com,old\nCid,cid@example.com,40'
+        )
+        file = SimpleUploadedFile("users.csv", content, content_type="text/csv")
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 200
+        stages = [part.split(";")[0] for part in response["Server-Timing"].split(", ")]
+        assert ("stream_parse" in stages) == bool(stream_limit)
+        assert response.data["detail"]["success"] == ["2 user records uploaded successfully"]
+        assert User.objects.get(email="ann@example.com").name == "Ann\nAnn"
+
+    def test_upload_exposes_stage_timings_and_metrics(self):
+        file = self.create_csv_file_with_records(
+            [{"name": "Ann", "email": "ann@example.com", "age": 30}]
+        )
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 200
+        stages = [part.split(";")[0] for part in response["Server-Timing"].split(", ")]
+        assert {"header", "read", "validate", "existing_emails", "insert"} <= set(stages)
+
+        metrics = self.client.get("/api/metrics/")
+        assert metrics.status_code == 200
+        assert metrics["Content-Type"].startswith("text/plain")
+        body = metrics.content.decode()
+        assert "# TYPE csv_upload_stage_seconds histogram" in body
+        assert 'csv_upload_stage_seconds_count{stage="insert"}' in body
+
+    def test_upload_timings_can_be_disabled(self, settings):
+        settings.CSV_IMPORT = {"METRICS_ENABLED": False}
+        file = self.create_csv_file_with_records(
+            [{"name": "Ann", "email": "ann@example.com", "age": 30}]
+        )
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 200
+        assert "Server-Timing" not in response
+
+    @pytest.mark.parametrize(
+        "conflict_mode, expected_success, expected_existing",
+        [
+            ("ignore", ["1 user records uploaded successfully"], 1),
+            (
+                "update",
+                [
+                    "1 user records uploaded successfully",
+                    "1 user records updated successfully",
+                ],
+                0,
+            ),
+        ],
+    )
+    def test_insert_conflicts_without_email_lookup(
+        self, settings, conflict_mode, expected_success, expected_existing
+    ):
+        settings.CSV_IMPORT = {
+            "EMAIL_LOOKUP": "none",
+            "INSERT_CONFLICTS": conflict_mode,
+            "BATCH_SIZE": 1,
+        }
+        User.objects.create(email="ann@example.com", name="Ann", age=20)
+        file = self.create_csv_file_with_records(
+            [
+                {"name": "Ann Updated", "email": "ann@example.com", "age": 31},
+                {"name": "Bob", "email": "bob@example.com", "age": 40},
+            ]
+        )
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 200
+        assert response.data["detail"]["success"] == expected_success
+        assert (
+            f"{expected_existing} user records failed due to existing email"
+            in response.data["detail"]["failed"]
+        )
+        ann = User.objects.get(email="ann@example.com")
+        if conflict_mode == "update":
+            assert (ann.name, ann.age) == ("Ann Updated", 31)
+        else:
+            assert (ann.name, ann.age) == ("Ann", 20)
+
+    def test_identical_reupload_replays_cached_result(self, settings):
+        settings.CSV_IMPORT = {"RESULT_CACHE": "hash"}
+        records = [{"name": "Ann", "email": "ann@example.com", "age": 30}]
+        first = self.client.post(
+            self.url,
+            {"file": self.create_csv_file_with_records(records)},
+            format="multipart",
+        )
+        second = self.client.post(
+            self.url,
+            {"file": self.create_csv_file_with_records(records)},
+            format="multipart",
+        )
+
+        assert second.status_code == 200
+        assert second["Idempotent-Replayed"] == "true"
+        assert second.data["detail"] == first.data["detail"]
+        assert UploadResult.objects.get().hits == 1
+
+    def test_idempotency_key_mode(self, settings):
+        settings.CSV_IMPORT = {"RESULT_CACHE": "key"}
+        records = [{"name": "Ann", "email": "ann@example.com", "age": 30}]
+
+        without_key = self.client.post(
+            self.url,
+            {"file": self.create_csv_file_with_records(records)},
+            format="multipart",
+        )
+        with_key = self.client.post(
+            self.url,
+            {"file": self.create_csv_file_with_records(records)},
+            format="multipart",
+            HTTP_IDEMPOTENCY_KEY="abc",
+        )
+        replayed = self.client.post(
+            self.url,
+            {"file": self.create_csv_file_with_records(records)},
+            format="multipart",
+            HTTP_IDEMPOTENCY_KEY="abc",
+        )
+        reused = self.client.post(
+            self.url,
+            {"file": self.create_csv_file_with_records(records * 2)},
+            format="multipart",
+            HTTP_IDEMPOTENCY_KEY="abc",
+        )
+
+        assert "Idempotent-Replayed" not in without_key
+        assert "Idempotent-Replayed" not in with_key
+        assert replayed["Idempotent-Replayed"] == "true"
+        assert replayed.data["detail"] == with_key.data["detail"]
+        assert reused.status_code == 422
+
+    def test_replay_returns_rejection_report(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        records = [
+            {"name": "Ann", "email": "ann@example.com", "age": 30},
+            {"name": "Bob", "email": "bob@example", "age": 30},
+        ]
+        responses = [
+            self.client.post(
+                self.url,
+                {
+                    "file": self.create_csv_file_with_records(records),
+                    "rejection_report": True,
+                },
+                format="multipart",
+                HTTP_IDEMPOTENCY_KEY="abc",
+            )
+            for _ in range(2)
+        ]
+
+        first, replayed = responses
+        assert replayed["Idempotent-Replayed"] == "true"
+        assert replayed.data["data"] == first.data["data"]
+        upload_id = replayed.data["data"]["upload_id"]
+        report = self.client.get(f"{self.url}{upload_id}/rejections.csv")
+        assert b"".join(report.streaming_content) == b"row,reason\n2,invalid_email\n"
+
     def test_other_file_format(self):
         file = SimpleUploadedFile("users.txt", b"Hello, world!")
         response = self.client.post(self.url, {"file": file}, format="multipart")
         assert response.status_code == 400
 
+    def test_binary_file_is_rejected(self):
+        file = SimpleUploadedFile("users.csv", b"PK\x03\x04\x14\x00\x00\x00")
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+        assert response.status_code == 400
+
+    @pytest.mark.parametrize("file_format", ["csv.gz", "csv.zst", "parquet", "ndjson"])
+    def test_compressed_and_columnar_uploads(self, file_format):
+        df = pd.DataFrame(
+            {
+                "Name": ["Ann", "Bob", "Cid"],
+                "Email": ["ann@example.com", "bob@example", "cid@example.com"],
+                "Age": [30, 40, 300],
+            }
+        )
+        if file_format == "csv.gz":
+            content = gzip.compress(df.to_csv(index=False).encode())
+        elif file_format == "csv.zst":
+            pa = pytest.importorskip("pyarrow")
+            content = pa.compress(df.to_csv(index=False).encode(), "zstd", asbytes=True)
+        elif file_format == "parquet":
+            pytest.importorskip("pyarrow")
+            content = df.to_parquet(index=False)
+        else:
+            content = df.to_json(orient="records", lines=True).encode()
+        # Detection ignores the name.
+        file = SimpleUploadedFile("upload.bin", content)
+
+        response = self.client.post(self.url, {"file": file}, format="multipart")
+
+        assert response.status_code == 200
+        assert response.data["detail"]["success"] == [
+            "1 user records uploaded successfully"
+        ]
+        assert "1 user records failed due to invalid email" in response.data["detail"]["failed"]
+        assert "1 user records failed due to invalid age" in response.data["detail"]["failed"]
+        assert User.objects.get().email == "ann@example.com"
+
     def test_csv_import_with_other_columns(self):
         file = self.create_other_columns_file()
         response = self.client.post(self.url, {"file": file}, format="multipart")
         assert response.status_code == 400
+
+
+class TestStreamingCsvParser:
+    def test_pieces_split_anywhere_parse_like_the_whole_file(self):
+        content = (
+            b"Email,Name,Age,notes\n"
+            + b"".join(
+                f'user{i}@example.com,"User ""{i}""",{i % 90},"line\n{i}, more"\n'.encode()
+                for i in range(500)
+            )
+            + b"last@example.com,Last,30,"
+        )
+        parser = StreamingCsvParser(block_size=1000)
+        for start in range(0, len(content), 37):
+            parser.feed(content[start : start + 37])
+        chunks = list(parser.close().drain())
+
+        expected = pd.concat(read_csv_chunks(io.BytesIO(content), 100), ignore_index=True)
+        streamed = pd.concat(chunks, ignore_index=True)
+        assert len(chunks) > 1
+        pd.testing.assert_frame_equal(streamed[expected.columns], expected)
+
+    def test_blank_lines_before_the_header_are_skipped(self):
+        content = b"\xef\xbb\xbf\n\r\n  \nname,email,age\nAnn,ann@example.com,30\n"
+        parser = StreamingCsvParser(block_size=1000)
+        for byte in range(len(content)):
+            parser.feed(content[byte : byte + 1])
+        streamed = pd.concat(parser.close().drain(), ignore_index=True)
+
+        blocks = read_csv_blocks(io.BytesIO(content), 10)
+        assert streamed["email"].tolist() == ["ann@example.com"]
+        assert next(blocks)[2]["email"].tolist() == ["ann@example.com"]
+
+    def test_stray_quote_stops_streaming_within_the_parse_window(self):
+        content = (
+            b'name,email,age\nBob "The Builder,bob@example.com,30\n'
+            + b"Ann,ann@example.com,30\n" * 5000
+        )
+        parser = StreamingCsvParser(block_size=1000)
+
+        with pytest.raises(ValueError):
+            for start in range(0, len(content), 64):
+                parser.feed(content[start : start + 64])
+        assert len(parser._pending) <= 4 * 1000 + 64
+
+    def test_spooled_uploads_are_memory_mapped(self, tmp_path):
+        path = tmp_path / "users.csv"
+        path.write_bytes(b"name,email,age\nAnn,ann@example.com,30\n")
+
+        with open_upload(str(path)) as source:
+            assert isinstance(source, mmap.mmap)
+            chunks = list(read_chunks(source, 10))
+        assert chunks[0]["email"].tolist() == ["ann@example.com"]
+
+    def test_spooled_uploads_are_not_mapped_when_disabled(
+        self, settings, tmp_path, monkeypatch
+    ):
+        settings.CSV_IMPORT = {"MMAP_UPLOADS": False}
+        path = tmp_path / "users.csv"
+        path.write_bytes(b"name,email,age\nAnn,ann@example.com,30\n")
+
+        mapped = []
+
+        class RecordingMap(mmap.mmap):
+            def __new__(cls, *args, **kwargs):
+                mapped.append(args)
+                return super().__new__(cls, *args, **kwargs)
+
+        monkeypatch.setattr(mmap, "mmap", RecordingMap)
+        with open_upload(str(path)) as source:
+            assert not isinstance(source, mmap.mmap)
+            assert mapped == []
+            chunks = list(read_chunks(source, 10))
+        assert chunks[0]["email"].tolist() == ["ann@example.com"]
+
+
+class TestUserFrameValidation:
+    def create_messy_frame(self, size=2000):
+        emails = [fake.email() for _ in range(size // 4)]
+        records = []
+        for _ in range(size):
+            records.append(
+                {
+                    "email": random.choice(
+                        [None, "not-an-email", f"  {random.choice(emails).upper()} "]
+                        + emails
+                    ),
+                    "name": random.choice([None, "", "   ", fake.name()]),
+                    "age": random.choice([None, -1, 121, 25.7, 0, 120, 40]),
+                }
+            )
+        return pd.DataFrame(records), set(random.sample(emails, 20))
+
+    def test_vectorized_validation_matches_per_row_path(self):
+        df, existing_emails = self.create_messy_frame()
+
+        vectorized = validate_user_frame(df, existing_emails)
+        per_row = validate_user_rows(df, existing_emails)
+
+        assert vectorized.failures == per_row.failures
+        pd.testing.assert_frame_equal(vectorized.users, per_row.users)
+
+    def test_parallel_validation_matches_serial_path(self, settings):
+        settings.CSV_IMPORT = {"PARALLEL_WORKERS": 2}
+        df, existing_emails = self.create_messy_frame()
+
+        parallel = validate_user_frame_parallel(df, existing_emails)
+        serial = validate_user_frame(df, existing_emails)
+
+        assert parallel.failures == serial.failures
+        pd.testing.assert_frame_equal(parallel.users, serial.users)
+
+    def test_vectorized_validation_with_text_ages(self):
+        df = pd.DataFrame(
+            {
+                "email": ["a@x.com", "b@x.com", "c@x.com", "d@x.com"],
+                "name": ["A", "B", "C", "D"],
+                "age": [" 30 ", "30.0", "abc", "+7"],
+            }
+        )
+
+        vectorized = validate_user_frame(df, set())
+        per_row = validate_user_rows(df, set())
+
+        assert vectorized.failures == per_row.failures
+        assert vectorized.users["age"].tolist() == [30, 30, 7]
+
+    def test_batched_email_validation_matches_per_row_check(self):
+        emails = pd.Series(
+            [fake.email() for _ in range(200)]
+            + ["josé@example.com", "a@b.co\n", "no-at.example.com", "a@b", "", None]
+        )
+
+        expected = [email is not None and is_valid_email(email) for email in emails]
+
+        assert validate_emails(emails).tolist() == expected
+
+    @pytest.mark.django_db
+    @pytest.mark.parametrize("strategy", ["hashed", "bloom"])
+    def test_compact_email_index_tracks_added_emails(self, strategy):
+        User.objects.create(email="Stored@Example.com", name="Stored", age=30)
+        index = EMAIL_INDEXES[strategy]()
+
+        index.add(["added@example.com"])
+        found = index.contains(
+            pd.Series(["stored@example.com", "added@example.com", "new@example.com", None])
+        )
+
+        # Bloom hits are confirmed in the database, where nothing was inserted.
+        assert found.tolist() == [True, strategy == "hashed", False, False]
+
+
+@pytest.mark.django_db
+class TestImportSchema:
+    schema = ImportSchema(
+        name="staff",
+        model="apis.User",
+        record_label="staff",
+        columns=(
+            Column("login", type=EMAIL, unique=True, field="email"),
+            Column("full_name", regex=r"^[A-Z]", field="name"),
+        ),
+    )
+
+    @pytest.mark.parametrize("engine", ["c", "pyarrow"])
+    def test_nullable_columns_store_none(self, engine):
+        schema = ImportSchema(
+            name="profiles",
+            model="apis.User",
+            columns=(
+                Column("email", type=EMAIL, unique=True),
+                Column("name", nullable=True),
+                Column("age", type=INTEGER, nullable=True),
+            ),
+        )
+        content = b"email,name,age\na@x.com,,\nb@x.com,Bee,5\nc@x.com,  ,7.0\n"
+        df = next(read_csv_chunks(io.BytesIO(content), 10, engine=engine, schema=schema))
+
+        users = resolve_rows(check_rows(df, schema), set(), schema=schema).users
+        objects = _build_objects(User, users)
+
+        assert [(user.name, user.age) for user in objects] == [
+            (None, None),
+            ("Bee", 5),
+            (None, 7),
+        ]
+        assert get_upload_detail(2, {}, schema=schema)["success"] == [
+            "2 records uploaded successfully"
+        ]
+
+    def test_schema_is_compiled_once(self):
+        assert compile_schema(self.schema) is compile_schema(self.schema)
+
+    def test_custom_schema_drives_import(self):
+        User.objects.create(email="taken@example.com", name="Taken", age=30)
+        file = SimpleUploadedFile(
+            "staff.csv",
+            b"Full_Name,Login,extra\n"
+            b"Ann,ann@example.com,x\n"
+            b"bob,bob@example.com,x\n"
+            b"Cat,TAKEN@example.com,x\n"
+            b"Dan,,x\n",
+        )
+
+        importer = CsvImporter(schema=self.schema).run(file)
+
+        assert importer.failures == {
+            "invalid_login": 1,
+            "existing_login": 1,
+            "duplicate_login": 0,
+            "invalid_full_name": 1,
+        }
+        ann = User.objects.get(email="ann@example.com")
+        assert (ann.name, ann.age) == ("Ann", 0)
+        assert importer.detail()["failed"][-1] == "3 total staff records skipped"
+
+
+@pytest.mark.django_db
+class TestTokenLogin:
+    def setup_method(self):
+        self.client = APIClient()
+        self.url = "/api/token/"
+        forget_missing_email("ann@example.com")
+
+    def login(self, email, password="ann-password-123"):
+        return self.client.post(self.url, {"email": email, "password": password})
+
+    def test_unknown_email_is_cached_until_the_user_is_created(
+        self, django_assert_num_queries
+    ):
+        assert self.login("ann@example.com").status_code == 404
+        with django_assert_num_queries(0):
+            assert self.login("ANN@example.com").status_code == 404
+
+        User.objects.create_user(email="Ann@Example.com", password="ann-password-123")
+        response = self.login("ann@EXAMPLE.com")
+        assert response.status_code == 200
+        assert set(response.json()["data"]) == {"access", "refresh"}
+        assert self.login("ann@example.com", "wrong").status_code == 400
+
+    def test_service_accounts_use_the_cheaper_hasher(self, settings):
+        settings.CSV_IMPORT = {"SERVICE_ACCOUNT_HASH_ITERATIONS": 1_000}
+        user = User.objects.create_user(
+            email="ann@example.com", password="ann-password-123", is_service_account=True
+        )
+        assert user.password.startswith(f"{SERVICE_ACCOUNT_HASHER}$1000$")
+
+        User.objects.filter(pk=user.pk).update(is_service_account=False)
+        assert self.login("ann@example.com").status_code == 200
+        user.refresh_from_db()
+        assert user.password.startswith("pbkdf2_sha256$")
+
+
+@pytest.mark.django_db
+class TestDatabaseProfiles:
+    @pytest.mark.parametrize(
+        "profile,expected",
+        [
+            ("import", {"journal_mode": "wal", "synchronous": 1, "mmap_size": 268435456}),
+            ("default", {"journal_mode": "delete", "synchronous": 2, "mmap_size": 0}),
+        ],
+    )
+    def test_pragmas_apply_to_new_connections(self, settings, tmp_path, profile, expected):
+        settings.CSV_IMPORT = {"DB_PROFILE": profile}
+        scratch = DatabaseWrapper(
+            {**connection.settings_dict, "NAME": str(tmp_path / "db.sqlite3")},
+            alias="scratch",
+        )
+        try:
+            pragmas = read_pragmas(scratch, names=list(expected))
+        finally:
+            scratch.close()
+        assert pragmas == expected
+
+
+class TestDatabaseThrottleStore:
+    @pytest.mark.parametrize("options", [{}, {"transaction_mode": "IMMEDIATE"}])
+    @pytest.mark.parametrize("profile", ["import", "default"])
+    def test_concurrent_updates_on_a_file_database(
+        self, settings, tmp_path, django_db_blocker, options, profile
+    ):
+        settings.CSV_IMPORT = {"DB_PROFILE": profile}
+        alias = "throttle_scratch"
+        connections.settings[alias] = {
+            **connection.settings_dict,
+            "NAME": str(tmp_path / "db.sqlite3"),
+            "OPTIONS": {**options, "timeout": 20},
+        }
+        store = DatabaseThrottleStore(using=alias)
+        errors = []
+
+        def count(state):
+            count = (state or {}).get("count", 0) + 1
+            return count, {"count": count}
+
+        def consume():
+            try:
+                for _ in range(50):
+                    store.update("client", count, timeout=60)
+            except Exception as e:
+                errors.append(e)
+            finally:
+                connections[alias].close()
+
+        # A file database of its own, outside the test database.
+        with django_db_blocker.unblock():
+            try:
+                with connections[alias].schema_editor() as editor:
+                    editor.create_model(ThrottleBucket)
+                threads = [threading.Thread(target=consume) for _ in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                assert errors == []
+                assert store.update("client", count, timeout=60) == 401
+            finally:
+                connections[alias].close()
+                del connections[alias]
+                del connections.settings[alias]
+
+
+class TestThrottleAlgorithms:
+    def test_token_bucket_refills_over_time(self):
+        allowed, _, state = token_bucket(None, 0, 10, 10, 60)
+        assert allowed
+        allowed, wait, state = token_bucket(state, 1, 1, 10, 60)
+        assert not allowed
+        assert wait == pytest.approx(5)
+        allowed, _, _ = token_bucket(state, 7, 1, 10, 60)
+        assert allowed
+
+    def test_sliding_window_weights_previous_window(self):
+        _, _, state = sliding_window(None, 0, 10, 10, 60)
+        allowed, wait, state = sliding_window(state, 30, 1, 10, 60)
+        assert not allowed
+        allowed, wait, state = sliding_window(state, 60, 1, 10, 60)
+        assert not allowed
+        assert wait == pytest.approx(6)
+        allowed, _, _ = sliding_window(state, 67, 1, 10, 60)
+        assert allowed
+
+
+class TestImportAdmission:
+    @pytest.fixture(autouse=True)
+    def limits(self, settings):
+        settings.CSV_IMPORT = {
+            "IMPORT_MAX_CONCURRENT": 2,
+            "IMPORT_MAX_CONCURRENT_PER_USER": 1,
+            "IMPORT_MEMORY_BUDGET": 10_000,
+            "IMPORT_ROW_MEMORY_BYTES": 100,
+            "IMPORT_QUEUE_SIZE": 1,
+            "IMPORT_QUEUE_TIMEOUT": 5,
+            "STREAM_PARSE_MAX_BYTES": 1 << 20,
+        }
+        self.controller = AdmissionController()
+
+    def test_per_client_and_queue_limits_are_rejected(self):
+        first = self.controller.acquire("user:1", 64)
+        with pytest.raises(AdmissionRejected) as per_user:
+            self.controller.acquire("user:1", 64)
+        self.controller.acquire("user:2", 64)
+        waiter = threading.Thread(target=self.controller.acquire, args=("user:3", 64))
+        waiter.start()
+        while not self.controller._queue:
+            waiter.join(0.01)
+        with pytest.raises(AdmissionRejected) as queue_full:
+            self.controller.acquire("user:4", 64)
+        first.release()
+        waiter.join()
+
+        assert per_user.value.status_code == 429
+        assert queue_full.value.status_code == 503
+        assert self.controller.running == 2
+
+    def test_queued_import_is_admitted_in_order_within_memory_budget(self):
+        # 64 bytes per estimated row: 6_400 bytes hold 100 rows, 10_000 bytes.
+        running = self.controller.acquire("user:1", 6_400)
+        admitted = []
+        waiter = threading.Thread(
+            target=lambda: admitted.append(self.controller.acquire("user:2", 64))
+        )
+        waiter.start()
+        waiter.join(0.2)
+        assert not admitted and len(self.controller._queue) == 1
+
+        running.release()
+        waiter.join()
+
+        assert admitted[0].granted
+        assert self.controller.memory == 100
+
+    def test_wait_times_out(self, settings):
+        settings.CSV_IMPORT = {**settings.CSV_IMPORT, "IMPORT_QUEUE_TIMEOUT": 0.05}
+        self.controller.acquire("user:1", 64)
+        self.controller.acquire("user:2", 64)
+
+        with pytest.raises(AdmissionRejected) as timeout:
+            self.controller.acquire("user:3", 64)
+
+        assert timeout.value.status_code == 503
+        assert not self.controller._queue
+
+    @pytest.mark.django_db
+    def test_upload_over_client_limit_is_rejected(self):
+        ticket = import_admission.acquire("ip:127.0.0.1")
+        try:
+            response = APIClient().post(
+                "/api/file-upload/",
+                {"file": SimpleUploadedFile("users.csv", b"name,email,age\n")},
+                format="multipart",
+            )
+        finally:
+            ticket.release()
+
+        assert response.status_code == 429
+        assert response.data["error_type"] == "rate_limit_error"
+        assert response["Retry-After"] == "5"
+
+
+@pytest.mark.django_db(transaction=True)
+class TestSharedEmailSnapshot:
+    @pytest.fixture(autouse=True)
+    def fresh_snapshot(self):
+        email_snapshot.invalidate()
+        email_snapshot.stats.clear()
+        yield
+        # Flushing the test database sends no delete signals.
+        email_snapshot.invalidate()
+
+    def test_snapshot_refreshes_incrementally_and_invalidates(self):
+        User.objects.create(email="Ann@Example.com", name="Ann", age=30)
+        emails = pd.Series(["ann@example.com", "bob@example.com", "cat@example.com"])
+
+        assert SharedEmailIndex().contains(emails).tolist() == [True, False, False]
+        User.objects.create(email="bob@example.com", name="Bob", age=30)
+        assert SharedEmailIndex().contains(emails).tolist() == [True, True, False]
+        SharedEmailIndex()
+        assert (email_snapshot.stats["loads"], email_snapshot.stats["refreshes"]) == (1, 1)
+        assert email_snapshot.stats["hits"] == 1
+
+        User.objects.filter(email="bob@example.com").update(name="Robert")
+        User.objects.get(email="bob@example.com").delete()
+        user = User.objects.get(email="Ann@Example.com")
+        user.email = "cat@example.com"
+        user.save()
+
+        assert SharedEmailIndex().contains(emails).tolist() == [False, False, True]
+        assert email_snapshot.stats["invalidations"] == 1
+        assert email_snapshot.stats["loads"] == 2
+
+
+@pytest.mark.django_db
+class TestImportBenchmark:
+    def test_bench_import_reports_stage_timings(self, tmp_path):
+        output = tmp_path / "bench.json"
+        call_command(
+            "bench_import", "--rows", "2000", "--output", str(output), stdout=io.StringIO()
+        )
+
+        report = json.loads(output.read_text())
+        result = report["results"][0]
+        assert set(result["seconds"]) == {
+            "header",
+            "read",
+            "validate",
+            "existing_emails",
+            "insert",
+        }
+        assert result["uploaded"] + sum(result["failures"].values()) == 2000
+        assert User.objects.count() == 0
+
+
+@pytest.mark.django_db
+class TestResumableUploadAPI:
+    def setup_method(self):
+        self.client = APIClient()
+        self.url = "/api/uploads/"
+        STORES["local"].clear()
+
+    def put_part(self, upload_id, content, start, size, checksum=None):
+        headers = {"HTTP_CONTENT_RANGE": f"bytes {start}-{start + len(content) - 1}/{size}"}
+        if checksum is not None:
+            headers["HTTP_X_CHECKSUM_SHA256"] = checksum
+        return self.client.put(
+            f"{self.url}{upload_id}/",
+            data=content,
+            content_type="application/octet-stream",
+            **headers,
+        )
+
+    def test_resumable_upload_flow(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        content = b"name,email,age\nAnn,ann@example.com,30\nBob,bob@example.com,40\n"
+        first, second = content[:20], content[20:]
+
+        created = self.client.post(
+            self.url,
+            {
+                "filename": "users.csv",
+                "size": len(content),
+                "sha256": hashlib.sha256(content).hexdigest(),
+            },
+            format="json",
+        )
+        assert created.status_code == 201
+        upload_id = created.data["data"]["id"]
+
+        response = self.put_part(
+            upload_id, first, 0, len(content), hashlib.sha256(first).hexdigest()
+        )
+        assert response.status_code == 200
+        assert response.data["data"]["received_bytes"] == 20
+
+        response = self.put_part(upload_id, second, 0, len(content))
+        assert response.status_code == 409
+        assert response.data["detail"] == {"offset": 20}
+
+        response = self.put_part(upload_id, second, 20, len(content), "0" * 64)
+        assert response.status_code == 400
+        assert self.client.get(f"{self.url}{upload_id}/").data["data"]["received_bytes"] == 20
+
+        incomplete = self.client.post(f"{self.url}{upload_id}/finalize/")
+        assert incomplete.status_code == 400
+
+        response = self.put_part(upload_id, second, 20, len(content))
+        assert response.status_code == 200
+
+        finalized = self.client.post(f"{self.url}{upload_id}/finalize/")
+        assert finalized.status_code == 202
+        job = run_import_job(finalized.data["data"]["job_id"])
+        assert job.state == "completed"
+        assert job.uploaded_count == 2
+
+    def test_sessions_are_only_visible_to_their_owner(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        content = b"name,email,age\nAnn,ann@example.com,30\n"
+        created = self.client.post(
+            self.url, {"filename": "users.csv", "size": len(content)}, format="json"
+        )
+        upload_id = created.data["data"]["id"]
+
+        other = APIClient(REMOTE_ADDR="10.0.0.2")
+        user = APIClient()
+        user.force_authenticate(User.objects.create(email="eve@example.com", name="Eve"))
+
+        for client in (other, user):
+            assert client.get(f"{self.url}{upload_id}/").status_code == 404
+            assert client.post(f"{self.url}{upload_id}/finalize/").status_code == 404
+        assert self.client.get(f"{self.url}{upload_id}/").status_code == 200
+
+    def test_session_size_is_capped(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        settings.CSV_IMPORT = {"UPLOAD_SESSION_MAX_BYTES": 100}
+        response = self.client.post(
+            self.url, {"filename": "users.csv", "size": 101}, format="json"
+        )
+
+        assert response.status_code == 400
+        assert "size" in response.data["detail"]
+
+    def test_stale_open_sessions_are_deleted(self, settings, tmp_path):
+        settings.MEDIA_ROOT = tmp_path
+        settings.CSV_IMPORT = {"UPLOAD_SESSION_TTL": 60}
+        stale = self.client.post(
+            self.url, {"filename": "users.csv", "size": 10}, format="json"
+        ).data["data"]["id"]
+        UploadSession.objects.filter(pk=stale).update(
+            updated_at=timezone.now() - timedelta(minutes=2)
+        )
+        path = UploadSession.objects.get(pk=stale).file.path
+
+        self.client.post(self.url, {"filename": "users.csv", "size": 10}, format="json")
+
+        assert not UploadSession.objects.filter(pk=stale).exists()
+        assert not os.path.exists(path)
+        assert self.client.get(f"{self.url}{stale}/").status_code == 404
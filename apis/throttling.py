@@ -0,0 +1,222 @@
+import math
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils import timezone
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from .conf import import_setting
+from .models import ThrottleBucket
+
+
+def token_bucket(state, now, cost, limit, duration, force=False):
+    """Token bucket holding ``limit`` tokens refilled evenly over ``duration``.
+
+    Returns ``(allowed, wait, new_state)``. A single cost larger than the
+    bucket is admitted once the bucket is full and drives it negative, so the
+    long term rate still holds. ``force`` debits the cost even when denied.
+    """
+    rate = limit / duration
+    tokens = limit if state is None else state["tokens"]
+    updated = now if state is None else state["updated"]
+    tokens = min(limit, tokens + (now - updated) * rate)
+
+    required = min(cost, limit)
+    allowed = tokens >= required
+    wait = None if allowed else (required - tokens) / rate
+    if allowed or force:
+        tokens -= cost
+    return allowed, wait, {"tokens": tokens, "updated": now}
+
+
+def sliding_window(state, now, cost, limit, duration, force=False):
+    """Sliding window counter weighting the previous fixed window by its overlap.
+
+    Returns ``(allowed, wait, new_state)``; ``force`` counts the cost even
+    when denied.
+    """
+    window = int(now // duration)
+    current, previous = 0, 0
+    if state is not None:
+        if state["window"] == window:
+            current, previous = state["current"], state["previous"]
+        elif state["window"] == window - 1:
+            previous = state["current"]
+
+    elapsed = now - window * duration
+    estimate = previous * (1 - elapsed / duration) + current
+    required = min(cost, limit)
+    allowed = estimate + required <= limit
+    wait = None
+    if not allowed:
+        excess = estimate + required - limit
+        if previous and excess <= previous * (1 - elapsed / duration):
+            wait = excess * duration / previous
+        else:
+            wait = duration - elapsed
+    if allowed or force:
+        current += cost
+    return allowed, wait, {"window": window, "current": current, "previous": previous}
+
+
+ALGORITHMS = {
+    "token_bucket": token_bucket,
+    "sliding_window": sliding_window,
+}
+
+
+class LocalThrottleStore:
+    """In-process store, only correct when a single worker serves uploads."""
+
+    def __init__(self):
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def update(self, key, func, timeout):
+        with self._lock:
+            result, self._states[key] = func(self._states.get(key))
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._states.clear()
+
+
+class CacheThrottleStore:
+    """Django cache backed store shared by every worker using the same cache.
+
+    Updates are read-modify-write, so concurrent requests of one client may
+    occasionally both be admitted.
+    """
+
+    def update(self, key, func, timeout):
+        result, state = func(cache.get(key))
+        cache.set(key, state, timeout)
+        return result
+
+
+class DatabaseThrottleStore:
+    """Stores bucket state in ``ThrottleBucket`` rows, updated under a row lock.
+
+    SQLite ignores ``select_for_update``, so every update starts with a
+    write, which takes the database write lock before the state is read
+    even in a deferred transaction.
+    """
+
+    def __init__(self, using: str = DEFAULT_DB_ALIAS):
+        self.using = using
+
+    def update(self, key, func, timeout):
+        buckets = ThrottleBucket.objects.using(self.using)
+        with transaction.atomic(using=self.using):
+            buckets.filter(key=key).update(updated_at=timezone.now())
+            bucket, _ = buckets.select_for_update().get_or_create(key=key)
+            result, bucket.state = func(bucket.state or None)
+            bucket.save(update_fields=["state", "updated_at"])
+        return result
+
+
+STORES = {
+    "local": LocalThrottleStore(),
+    "cache": CacheThrottleStore(),
+    "database": DatabaseThrottleStore(),
+}
+
+
+def get_throttle_store():
+    return STORES[import_setting("THROTTLE_STORE")]
+
+
+class UploadThrottle(BaseThrottle):
+    """Throttle uploads per JWT user, falling back to the client IP.
+
+    ``scope`` selects the rate from ``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']``
+    and ``get_cost`` how much of it one request uses.
+    """
+
+    scope = None
+
+    def __init__(self):
+        self.limit, self.duration = self.parse_rate(
+            api_settings.DEFAULT_THROTTLE_RATES.get(self.scope)
+        )
+        self.algorithm = ALGORITHMS[import_setting("THROTTLE_ALGORITHM")]
+        self.store = get_throttle_store()
+        self._wait = None
+
+    def parse_rate(self, rate):
+        """Parse DRF style rates such as ``"30/min"`` into ``(limit, seconds)``."""
+        if rate is None:
+            return None, None
+        num, period = rate.split("/")
+        return int(num), {"s": 1, "m": 60, "h": 3600, "d": 86400}[period[0]]
+
+    def get_client_ident(self, request):
+        user = getattr(request, "user", None)
+        if user is not None and user.is_authenticated:
+            return f"user:{user.pk}"
+        return f"ip:{self.get_ident(request)}"
+
+    def get_cache_key(self, ident):
+        return f"throttle:{self.scope}:{ident}"
+
+    def get_cost(self, request):
+        return 1
+
+    def consume(self, ident, cost, force=False):
+        """Take ``cost`` from the client's budget, returning ``(allowed, wait)``."""
+
+        def apply(state):
+            allowed, wait, new_state = self.algorithm(
+                state, time.time(), cost, self.limit, self.duration, force=force
+            )
+            return (allowed, wait), new_state
+
+        return self.store.update(
+            self.get_cache_key(ident), apply, timeout=self.duration * 2
+        )
+
+    def allow_request(self, request, view):
+        if self.limit is None:
+            return True
+        allowed, self._wait = self.consume(
+            self.get_client_ident(request), self.get_cost(request)
+        )
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class UploadRequestThrottle(UploadThrottle):
+    scope = "upload_requests"
+
+
+class UploadBytesThrottle(UploadThrottle):
+    scope = "upload_bytes"
+
+    def get_cost(self, request):
+        try:
+            return int(request.META.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            return 0
+
+
+class UploadRowsThrottle(UploadThrottle):
+    """Row budget. Rows are only known after parsing, so admission takes a
+    single row and ``charge`` debits the parsed rows once the import ran.
+    """
+
+    scope = "upload_rows"
+
+    def charge(self, ident, rows):
+        if self.limit is None or not rows:
+            return
+        self.consume(ident, rows, force=True)
+
+
+def retry_after(wait) -> str:
+    return str(max(1, math.ceil(wait)))
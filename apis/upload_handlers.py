@@ -0,0 +1,176 @@
+from collections import deque
+import codecs
+import time
+
+from django.core.files.uploadhandler import (
+    StopFutureHandlers,
+    TemporaryFileUploadHandler,
+)
+
+from .conf import import_setting
+from .parsing import (
+    CSV,
+    ESTIMATED_ROW_BYTES,
+    MAX_PENDING_BLOCKS,
+    RowScanner,
+    check_header,
+    empty_frame,
+    parse_header_line,
+    parse_rows,
+    sniff_format,
+)
+from .result_cache import new_fingerprint, result_cache_enabled
+from .schema import USER_SCHEMA, ImportSchema
+
+
+class ParsedChunks(deque):
+    """Frames parsed ahead of the import, plus the time spent per stage."""
+
+    def __init__(self):
+        super().__init__()
+        self.durations = {}
+
+    def drain(self):
+        # Frames are released as soon as the importer has taken them.
+        while self:
+            yield self.popleft()
+
+
+class StreamingCsvParser:
+    """Parse csv bytes pushed in arbitrary pieces into frames of complete rows.
+
+    Bytes are buffered until at least ``block_size`` of them arrived, then
+    every complete row in the buffer is parsed at once by ``parse_rows``.
+    Row boundaries are found with the quote parity rule of ``RowScanner``,
+    so quoted fields may contain newlines and span receive chunks. When no
+    boundary turns up within ``MAX_PENDING_BLOCKS`` blocks, ``feed`` raises
+    ``ValueError`` and the upload is read from its file instead.
+    """
+
+    def __init__(self, schema: ImportSchema = USER_SCHEMA, block_size: int = None):
+        self.schema = schema
+        self.block_size = block_size or (
+            import_setting("CHUNK_SIZE") * ESTIMATED_ROW_BYTES
+        )
+        self.header = None
+        self.positions = None
+        self.chunks = ParsedChunks()
+        self._pending = bytearray()
+        self._rows = RowScanner()
+
+    def feed(self, data: bytes):
+        self._pending += data
+        if self.header is None:
+            self._skip_blank_lines()
+        self._rows.scan(self._pending)
+        if self.header is None and self._rows.first > 0:
+            self._read_header(self._rows.first)
+        if self.header is not None and len(self._pending) >= self.block_size:
+            self._parse(self._rows.last)
+        if len(self._pending) > MAX_PENDING_BLOCKS * self.block_size:
+            raise ValueError("No csv row boundary found in the parse window")
+
+    def close(self) -> ParsedChunks:
+        if self.header is None:
+            self._read_header(len(self._pending))
+        self._parse(len(self._pending))
+        if not self.chunks:
+            self.chunks.append(empty_frame(self.schema))
+        return self.chunks
+
+    def _skip_blank_lines(self):
+        """Drop blank lines before the header, as ``read_header`` does."""
+        start = len(codecs.BOM_UTF8) if self._pending.startswith(codecs.BOM_UTF8) else 0
+        content = len(self._pending) - len(self._pending[start:].lstrip())
+        blank = self._pending.rfind(b"\n", 0, content) + 1
+        if blank:
+            del self._pending[:blank]
+            self._rows.cut(blank)
+
+    def _read_header(self, end: int):
+        started = time.perf_counter()
+        self.header = parse_header_line(bytes(self._pending[:end]))
+        self.positions = check_header(self.header, self.schema.column_names)
+        del self._pending[:end]
+        self._rows.cut(end)
+        self._add_duration("header", started)
+
+    def _parse(self, end: int):
+        if not end:
+            return
+        started = time.perf_counter()
+        block = bytes(self._pending[:end])
+        del self._pending[:end]
+        self._rows.cut(end)
+        self.chunks.append(parse_rows(block, self.header, self.positions))
+        self._add_duration("stream_parse", started)
+
+    def _add_duration(self, name, started):
+        durations = self.chunks.durations
+        durations[name] = durations.get(name, 0.0) + time.perf_counter() - started
+
+
+class StreamingCsvUploadHandler(TemporaryFileUploadHandler):
+    """Spool multipart csv uploads to disk and parse them while they arrive.
+
+    Requests of at most ``STREAM_PARSE_MAX_BYTES`` are handled here: every
+    received chunk is written to the temporary file, fed to a
+    ``StreamingCsvParser`` and hashed for the result cache, so parsing
+    overlaps the transfer and the import never reads the file back. The
+    frames end up on ``file.parsed_chunks``. Other formats, parse errors
+    and larger requests fall back to reading the file, which reports the
+    same errors as before.
+    """
+
+    def __init__(self, request=None, schema: ImportSchema = USER_SCHEMA):
+        super().__init__(request)
+        self.schema = schema
+        self.activated = False
+        self.parser = None
+        self.digest = None
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        limit = import_setting("STREAM_PARSE_MAX_BYTES")
+        self.activated = bool(limit) and 0 < (content_length or 0) <= limit
+
+    def new_file(self, *args, **kwargs):
+        if not self.activated:
+            return
+        super().new_file(*args, **kwargs)
+        self.parser = StreamingCsvParser(self.schema)
+        self.digest = None
+        idempotency_key = ""
+        if self.request is not None:
+            idempotency_key = self.request.headers.get("Idempotency-Key", "")
+        if result_cache_enabled(idempotency_key):
+            self.digest = new_fingerprint(self.schema.name)
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.activated:
+            return raw_data
+        self.file.write(raw_data)
+        if self.digest is not None:
+            self.digest.update(raw_data)
+        if self.parser is not None:
+            try:
+                if start == 0 and sniff_format(raw_data) != CSV:
+                    self.parser = None
+                else:
+                    self.parser.feed(raw_data)
+            except Exception:
+                self.parser = None
+
+    def file_complete(self, file_size):
+        if not self.activated:
+            return None
+        file = super().file_complete(file_size)
+        if self.digest is not None:
+            file.fingerprints = {self.schema.name: self.digest.hexdigest()}
+        if self.parser is not None:
+            try:
+                file.parsed_chunks = self.parser.close()
+            except Exception:
+                pass
+            self.parser = None
+        return file
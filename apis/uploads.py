@@ -0,0 +1,190 @@
+from datetime import timedelta
+import hashlib
+import os
+import re
+import shutil
+import tempfile
+
+from django.db import transaction
+from django.utils import timezone
+from rest_framework import status
+
+from .conf import import_setting
+from .constants import CLIENT_ERROR_TYPE, VALIDATION_ERROR_TYPE
+from .jobs import submit_import_job
+from .models import ImportJob, UploadSession
+from .utils import ServiceError
+
+CONTENT_RANGE_REGEX = re.compile(r"^bytes (\d+)-(\d+)/(\d+|\*)$")
+READ_BLOCK_SIZE = 1 << 16
+
+
+def create_upload_session(
+    user, filename: str, size: int, sha256: str = "", client_ident: str = ""
+):
+    """Create a session and the empty file its parts are appended to."""
+    delete_expired_sessions()
+    session = UploadSession(
+        user=user, client_ident=client_ident, filename=filename, size=size, sha256=sha256
+    )
+    session.file.name = f"uploads/{session.id}.part"
+    os.makedirs(os.path.dirname(session.file.path), exist_ok=True)
+    open(session.file.path, "wb").close()
+    session.save()
+    return session
+
+
+def delete_expired_sessions():
+    """Delete open sessions without a part for ``UPLOAD_SESSION_TTL`` seconds.
+
+    Finalized sessions are kept, their file belongs to the import job.
+    """
+    ttl = timedelta(seconds=import_setting("UPLOAD_SESSION_TTL"))
+    expired = UploadSession.objects.filter(
+        state=UploadSession.State.OPEN, updated_at__lt=timezone.now() - ttl
+    )
+    for session in expired:
+        session.file.delete(save=False)
+        session.delete()
+
+
+def _lock_session(session):
+    """Lock the session row for the rest of the transaction.
+
+    SQLite ignores ``select_for_update``, so the row is written first, which
+    takes the database write lock even in a deferred transaction.
+    """
+    sessions = UploadSession.objects.filter(pk=session.pk)
+    sessions.update(updated_at=timezone.now())
+    return sessions.select_for_update().get()
+
+
+def parse_content_range(value: str, size: int):
+    """Return the inclusive ``(start, end)`` byte range of a part."""
+    match = CONTENT_RANGE_REGEX.match(value or "")
+    if match is None:
+        raise ServiceError(
+            detail="Content-Range header must look like 'bytes <start>-<end>/<size>'",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            error_type=VALIDATION_ERROR_TYPE,
+        )
+    start, end = int(match.group(1)), int(match.group(2))
+    if end < start or end >= size:
+        raise ServiceError(
+            detail="Content-Range is outside of the declared upload size",
+            status_code=status.HTTP_400_BAD_REQUEST,
+            error_type=VALIDATION_ERROR_TYPE,
+        )
+    return start, end
+
+
+def _offset_mismatch(session):
+    return ServiceError(
+        detail="Upload offset does not match the bytes received so far",
+        status_code=status.HTTP_409_CONFLICT,
+        error_type=CLIENT_ERROR_TYPE,
+        detail_error_response={"offset": session.received_bytes},
+    )
+
+
+def _check_appendable(session, start: int):
+    if session.state != UploadSession.State.OPEN:
+        raise ServiceError(
+            detail="Upload session is already finalized",
+            status_code=status.HTTP_409_CONFLICT,
+            error_type=CLIENT_ERROR_TYPE,
+        )
+    if start != session.received_bytes:
+        raise _offset_mismatch(session)
+
+
+def append_part(session, stream, content_range: str, sha256: str = None):
+    """Append one byte range read from ``stream`` to the session file.
+
+    The part must start exactly at the number of bytes received so far. It
+    is received into a temporary file and hashed on the way when ``sha256``
+    is given, so a bad part never touches the session file and a client
+    only has to retry the failed part. The session is then locked while
+    the offset is checked again and the part is copied, so a retried part
+    racing the original is written only once.
+    """
+    start, end = parse_content_range(content_range, session.size)
+    _check_appendable(session, start)
+
+    expected = end - start + 1
+    with tempfile.TemporaryFile() as part:
+        digest = hashlib.sha256()
+        written = 0
+        while written < expected:
+            block = stream.read(min(READ_BLOCK_SIZE, expected - written))
+            if not block:
+                break
+            digest.update(block)
+            part.write(block)
+            written += len(block)
+
+        error = None
+        if written != expected or stream.read(1):
+            error = "Part length does not match its Content-Range"
+        elif sha256 and digest.hexdigest() != sha256.lower():
+            error = "Part checksum does not match"
+        if error is not None:
+            raise ServiceError(
+                detail=error,
+                status_code=status.HTTP_400_BAD_REQUEST,
+                error_type=VALIDATION_ERROR_TYPE,
+                detail_error_response={"offset": session.received_bytes},
+            )
+
+        with transaction.atomic():
+            session = _lock_session(session)
+            _check_appendable(session, start)
+            part.seek(0)
+            with open(session.file.path, "r+b") as f:
+                f.seek(start)
+                f.truncate()
+                shutil.copyfileobj(part, f, READ_BLOCK_SIZE)
+            session.received_bytes = end + 1
+            session.save(update_fields=["received_bytes", "updated_at"])
+    return session
+
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(READ_BLOCK_SIZE * 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def finalize_upload_session(session, client_ident: str = ""):
+    """Hand a fully received upload to the background import pipeline.
+
+    Finalizing twice returns the job created the first time.
+    """
+    with transaction.atomic():
+        session = _lock_session(session)
+        if session.state == UploadSession.State.FINALIZED:
+            return session
+        if session.received_bytes != session.size:
+            raise ServiceError(
+                detail="Upload is incomplete",
+                status_code=status.HTTP_400_BAD_REQUEST,
+                error_type=VALIDATION_ERROR_TYPE,
+                detail_error_response={"offset": session.received_bytes},
+            )
+        if session.sha256 and _file_sha256(session.file.path) != session.sha256.lower():
+            raise ServiceError(
+                detail="Uploaded file checksum does not match",
+                status_code=status.HTTP_400_BAD_REQUEST,
+                error_type=VALIDATION_ERROR_TYPE,
+            )
+
+        job = ImportJob.objects.create(
+            user=session.user, file=session.file.name, client_ident=client_ident
+        )
+        session.job = job
+        session.state = UploadSession.State.FINALIZED
+        session.save(update_fields=["job", "state", "updated_at"])
+        transaction.on_commit(lambda: submit_import_job(job.pk))
+    return session
@@ -4,4 +4,13 @@ from . import views
 urlpatterns = [
     path('token/', views.GetTokenView.as_view(), name='get_token'),
     path('file-upload/', views.FileUploadView.as_view(), name='upload_csv'),
-]
\ No newline at end of file
+    path('file-upload/async/', views.AsyncFileUploadView.as_view(), name='upload_csv_async'),
+    path('file-upload/<uuid:job_id>/', views.ImportJobStatusView.as_view(), name='import_job_status'),
+    path('file-upload/<uuid:job_id>/resume/', views.ImportJobResumeView.as_view(), name='import_job_resume'),
+    path('file-upload/<uuid:upload_id>/rejections.csv', views.RejectionReportView.as_view(), {'file_format': 'csv'}, name='rejection_report_csv'),
+    path('file-upload/<uuid:upload_id>/rejections.ndjson', views.RejectionReportView.as_view(), {'file_format': 'ndjson'}, name='rejection_report_ndjson'),
+    path('uploads/', views.UploadSessionCreateView.as_view(), name='upload_session_create'),
+    path('uploads/<uuid:upload_id>/', views.UploadSessionView.as_view(), name='upload_session'),
+    path('uploads/<uuid:upload_id>/finalize/', views.UploadSessionFinalizeView.as_view(), name='upload_session_finalize'),
+    path('metrics/', views.MetricsView.as_view(), name='metrics'),
+]
@@ -1,9 +1,19 @@
 from rest_framework_simplejwt.tokens import RefreshToken
 from rest_framework.exceptions import APIException
 from .models import User
+from .constants import UPLOAD_FAILURE_MESSAGES
 from typing import Any, Dict, Optional
 import re
 
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # pragma: no cover - pyarrow is optional
+    pa = None
+    pc = None
+
 
 def get_tokens_for_user(user: User):
     refresh = RefreshToken.for_user(user)
@@ -47,8 +57,53 @@ def get_formatted_response(
     return {"data": data, "message": message, "detail": detail}
 
 
+def get_upload_detail(
+    uploaded_count: int,
+    failures: Dict[str, int],
+    updated_count: Optional[int] = None,
+    schema=None,
+):
+    """Summarize an upload; ``schema`` supplies the failure messages and record label."""
+    messages = schema.messages if schema else UPLOAD_FAILURE_MESSAGES
+    records = schema.records if schema else "user records"
+    failed = [
+        f"{failures.get(reason, 0)} {message}" for reason, message in messages.items()
+    ]
+    skipped = sum(failures.get(reason, 0) for reason in messages)
+    failed.append(f"{skipped} total {records} skipped")
+    success = [f"{uploaded_count} {records} uploaded successfully"]
+    if updated_count is not None:
+        success.append(f"{updated_count} {records} updated successfully")
+    return {"success": success, "failed": failed}
+
+
 EMAIL_REGEX = r"^[\w\.-]+@[\w\.-]+\.\w+$"
+EMAIL_PATTERN = re.compile(EMAIL_REGEX)
 
 
 def is_valid_email(email: str) -> bool:
-    return re.match(EMAIL_REGEX, email) is not None
+    return EMAIL_PATTERN.match(email) is not None
+
+
+def validate_emails(emails: pd.Series) -> pd.Series:
+    """Vectorized ``is_valid_email`` over a series of strings; nulls are invalid.
+
+    With pyarrow the pattern runs in RE2 over the whole column. RE2's ``\\w``
+    is ASCII only and its ``$`` does not match before a trailing newline, so
+    the few non-ASCII values and values ending with a newline are checked
+    again with ``EMAIL_PATTERN`` to keep the result identical.
+    """
+    if pc is None:
+        return emails.astype(object).str.match(EMAIL_PATTERN, na=False)
+
+    values = pa.array(emails, type=pa.large_string(), from_pandas=True)
+    valid = pc.fill_null(pc.match_substring_regex(values, EMAIL_REGEX), False)
+    recheck = pc.fill_null(
+        pc.or_(pc.invert(pc.string_is_ascii(values)), pc.ends_with(values, "\n")),
+        False,
+    )
+    mask = valid.to_numpy(zero_copy_only=False)
+    recheck = recheck.to_numpy(zero_copy_only=False)
+    if recheck.any():
+        mask[recheck] = [is_valid_email(email) for email in emails.to_numpy()[recheck]]
+    return pd.Series(mask, index=emails.index)
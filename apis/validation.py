@@ -0,0 +1,348 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from functools import lru_cache
+import re
+
+import numpy as np
+import pandas as pd
+
+from .constants import (
+    DUPLICATE_EMAIL_FAILURE,
+    EXISTING_EMAIL_FAILURE,
+    INVALID_AGE_FAILURE,
+    INVALID_EMAIL_FAILURE,
+    INVALID_NAME_FAILURE,
+    NULL_EMAIL_FAILURE,
+)
+from .schema import EMAIL, INTEGER, MAX_AGE, MIN_AGE, USER_SCHEMA, ImportSchema
+from .utils import is_valid_email, validate_emails
+
+# Integer columns accept any decimal number, truncated like ``int(float)``:
+# pandas writes an integer column with missing values as "22.0".
+NUMBER_REGEX = r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?"
+
+
+@dataclass
+class ValidationResult:
+    """Accepted rows plus the number of rows skipped per failure reason.
+
+    ``users`` is named after the user import but holds the accepted rows of
+    any schema, one column per target model field.
+    """
+
+    users: pd.DataFrame
+    failures: Counter = field(default_factory=Counter)
+    # Model field of the unique column, if the schema has one.
+    key: str = None
+    # Per input row: 0 when accepted, else 1 + the index of its reason in
+    # ``ImportSchema.failure_reasons``.
+    reasons: np.ndarray = None
+
+    @property
+    def accepted_keys(self):
+        if self.key is None:
+            return []
+        return self.users[self.key].tolist()
+
+
+def normalize_emails(emails: pd.Series) -> pd.Series:
+    """Strip and lowercase every non null email, keeping nulls as NaN."""
+    emails = emails.astype(object)
+    return emails.where(emails.isna(), emails.astype(str).str.strip().str.lower())
+
+
+def coerce_integers(values: pd.Series, min_value=None, max_value=None):
+    """Return (numbers, invalid_mask), numbers truncated toward zero like ``int``.
+
+    Text is parsed as a decimal number first, so csv, Parquet and NDJSON
+    uploads agree on values such as "22.0" or "25.5".
+    """
+    if pd.api.types.is_numeric_dtype(values):
+        numeric = values.astype("float64")
+    else:
+        text = values.astype(str).str.strip()
+        numeric = pd.to_numeric(
+            text.where(text.str.fullmatch(NUMBER_REGEX, na=False)), errors="coerce"
+        )
+    numeric = np.trunc(numeric)
+    invalid = numeric.isna()
+    if min_value is not None:
+        invalid |= numeric.lt(min_value)
+    if max_value is not None:
+        invalid |= numeric.gt(max_value)
+    return numeric, invalid
+
+
+def _compile_column(column):
+    """Build the vectorized check of one column.
+
+    The returned function maps the raw values to ``(values, null, invalid)``
+    where ``invalid`` only covers non null values.
+    """
+    pattern = re.compile(column.regex) if column.regex else None
+
+    def mismatches(text: pd.Series, null: pd.Series) -> pd.Series:
+        if pattern is not None:
+            return ~null & ~text.str.match(pattern, na=False)
+        if column.type == EMAIL:
+            return ~null & ~validate_emails(text)
+        return pd.Series(False, index=text.index)
+
+    if column.type == EMAIL:
+
+        def check(values):
+            emails = normalize_emails(values)
+            null = emails.isna()
+            return emails, null, mismatches(emails, null)
+
+    elif column.type == INTEGER:
+
+        def check(values):
+            null = values.isna()
+            numbers, invalid = coerce_integers(values, column.min_value, column.max_value)
+            return numbers, null, ~null & invalid
+
+    else:
+
+        def check(values):
+            stripped = values.astype(str).str.strip()
+            null = values.isna() | stripped.eq("")
+            return values, null, mismatches(stripped, null)
+
+    return check
+
+
+class CompiledSchema:
+    """Vectorized checks of an ``ImportSchema``, built once by ``compile_schema``."""
+
+    def __init__(self, schema: ImportSchema):
+        self.schema = schema
+        self.checks = [(column, _compile_column(column)) for column in schema.columns]
+        self.unique = schema.unique_column
+        self.reason_codes = {
+            reason: code for code, reason in enumerate(schema.failure_reasons, start=1)
+        }
+
+    def check_rows(self, df: pd.DataFrame) -> pd.DataFrame:
+        data = {}
+        for column, check in self.checks:
+            values, null, invalid = check(df[column.name])
+            data[column.name] = values
+            data[f"{column.name}__null"] = null
+            data[f"{column.name}__invalid"] = invalid
+        return pd.DataFrame(data, index=df.index)
+
+    def column_ok(self, checked: pd.DataFrame, column) -> pd.Series:
+        ok = ~checked[f"{column.name}__invalid"]
+        if not column.nullable:
+            ok &= ~checked[f"{column.name}__null"]
+        return ok
+
+    def find_known(self, checked: pd.DataFrame, existing) -> pd.Series:
+        if self.unique is None:
+            return pd.Series(False, index=checked.index)
+        key_ok = self.column_ok(checked, self.unique)
+        return key_ok & _is_known(existing, checked[self.unique.name].where(key_ok))
+
+    async def afind_known(self, checked: pd.DataFrame, existing) -> pd.Series:
+        """``find_known`` for indexes with an async ``acontains`` lookup."""
+        if self.unique is None:
+            return pd.Series(False, index=checked.index)
+        key_ok = self.column_ok(checked, self.unique)
+        return key_ok & await existing.acontains(checked[self.unique.name].where(key_ok))
+
+    def resolve_rows(self, checked: pd.DataFrame, existing, known=None, seen=None):
+        all_ok = pd.Series(True, index=checked.index)
+        for column, _ in self.checks:
+            all_ok &= self.column_ok(checked, column)
+
+        existing_rows = pd.Series(False, index=checked.index)
+        duplicate_rows = pd.Series(False, index=checked.index)
+        if self.unique is not None:
+            if known is None:
+                known = self.find_known(checked, existing)
+            key_ok = self.column_ok(checked, self.unique)
+            keys = checked[self.unique.name]
+            # Values accepted from earlier chunks of the same upload.
+            seen_before = pd.Series(False, index=checked.index)
+            if seen is not None:
+                seen_before = key_ok & _is_known(seen, keys.where(key_ok))
+            # Within the chunk a value is only "taken" by the first row that
+            # passes every check; any later row with the same value is a
+            # duplicate, found with one hash grouping pass.
+            candidate = all_ok & ~known & ~seen_before
+            positions = np.arange(len(checked))
+            first_candidate = candidate & ~keys.where(candidate).duplicated(keep="first")
+            first_position = pd.Series(
+                positions[first_candidate.to_numpy()],
+                index=keys[first_candidate].to_numpy(),
+            )
+            taken_earlier = keys.map(first_position).lt(positions)
+            # Rows accepted earlier are stored by now, so they are also
+            # ``known``; being a duplicate takes precedence.
+            duplicate_rows = seen_before | (key_ok & taken_earlier)
+            existing_rows = known & ~duplicate_rows
+
+        failures = Counter({reason: 0 for reason in self.schema.failure_reasons})
+        reasons = np.zeros(len(checked), dtype=np.uint8)
+        remaining = pd.Series(True, index=checked.index)
+        for column, _ in self.checks:
+            steps = [(checked[f"{column.name}__invalid"], column.failure)]
+            if not column.nullable:
+                steps.insert(0, (checked[f"{column.name}__null"], column.null_failure))
+            if column is self.unique:
+                steps.append((duplicate_rows, column.duplicate_failure))
+                steps.append((existing_rows, column.existing_failure))
+            for failed, reason in steps:
+                failed_here = (remaining & failed).to_numpy()
+                failures[reason] += int(failed_here.sum())
+                reasons[failed_here] = self.reason_codes[reason]
+                remaining &= ~failed
+
+        return ValidationResult(
+            users=self.accepted_frame(checked, remaining),
+            failures=failures,
+            key=self.unique.model_field if self.unique is not None else None,
+            reasons=reasons,
+        )
+
+    def accepted_frame(self, checked: pd.DataFrame, accepted: pd.Series) -> pd.DataFrame:
+        data = {}
+        for column, _ in self.checks:
+            values = checked[column.name][accepted]
+            if column.type == INTEGER and not column.nullable:
+                data[column.model_field] = pd.Series(values.to_numpy(), dtype="int64")
+                continue
+            if column.type == INTEGER:
+                values = values.astype("Int64")
+            values = values.astype(object).to_numpy()
+            if column.nullable:
+                # Nulls reach the model as None, not as NaN, pd.NA or blank text.
+                null = checked[f"{column.name}__null"][accepted].to_numpy()
+                values = np.where(null, None, values)
+            data[column.model_field] = pd.Series(values, dtype=object)
+        return pd.DataFrame(data)
+
+
+@lru_cache(maxsize=None)
+def compile_schema(schema: ImportSchema) -> CompiledSchema:
+    return CompiledSchema(schema)
+
+
+def _is_known(existing, values: pd.Series) -> pd.Series:
+    """Membership mask against a plain set or an index from ``apis.dedup``."""
+    if hasattr(existing, "contains"):
+        return existing.contains(values)
+    return values.isin(existing)
+
+
+def check_rows(df: pd.DataFrame, schema: ImportSchema = USER_SCHEMA) -> pd.DataFrame:
+    """Run the checks that only depend on a row itself.
+
+    This is the CPU heavy part of validation and is safe to run on separate
+    partitions of a frame, see ``apis.parallel``.
+    """
+    return compile_schema(schema).check_rows(df)
+
+
+def find_known(
+    checked: pd.DataFrame, existing, schema: ImportSchema = USER_SCHEMA
+) -> pd.Series:
+    """Mask of rows with a valid unique value that is already stored."""
+    return compile_schema(schema).find_known(checked, existing)
+
+
+async def afind_known(
+    checked: pd.DataFrame, existing, schema: ImportSchema = USER_SCHEMA
+) -> pd.Series:
+    return await compile_schema(schema).afind_known(checked, existing)
+
+
+def resolve_rows(
+    checked: pd.DataFrame,
+    existing,
+    known: pd.Series = None,
+    schema: ImportSchema = USER_SCHEMA,
+    seen=None,
+) -> ValidationResult:
+    """Apply the uniqueness checks to ``check_rows`` output and count failures.
+
+    For the user schema reasons are assigned in the same order as the
+    per-row path: null email, invalid email, duplicate email (accepted
+    earlier in the same file), existing email, invalid name and finally
+    invalid age. ``known`` may be passed when ``find_known`` was already run
+    for the chunk, and ``seen`` holds the values accepted from earlier
+    chunks of the same file.
+    """
+    return compile_schema(schema).resolve_rows(checked, existing, known=known, seen=seen)
+
+
+def validate_user_frame(
+    df: pd.DataFrame, existing_emails, schema: ImportSchema = USER_SCHEMA
+) -> ValidationResult:
+    """Validate an uploaded frame column-wise."""
+    return resolve_rows(check_rows(df, schema), existing_emails, schema=schema)
+
+
+def validate_user_rows(df: pd.DataFrame, existing_emails) -> ValidationResult:
+    """Per-row reference implementation kept for benchmarks and parity tests."""
+    existing_emails = set(existing_emails)
+    seen = set()
+    failures = Counter(
+        {
+            NULL_EMAIL_FAILURE: 0,
+            INVALID_EMAIL_FAILURE: 0,
+            EXISTING_EMAIL_FAILURE: 0,
+            DUPLICATE_EMAIL_FAILURE: 0,
+            INVALID_NAME_FAILURE: 0,
+            INVALID_AGE_FAILURE: 0,
+        }
+    )
+    emails, names, ages = [], [], []
+    for _, row in df.iterrows():
+        email = row.get("email", "")
+        if pd.isna(email):
+            failures[NULL_EMAIL_FAILURE] += 1
+            continue
+        normalized_email = str(email).strip().lower()
+        if not is_valid_email(normalized_email):
+            failures[INVALID_EMAIL_FAILURE] += 1
+            continue
+        if normalized_email in seen:
+            failures[DUPLICATE_EMAIL_FAILURE] += 1
+            continue
+        if normalized_email in existing_emails:
+            failures[EXISTING_EMAIL_FAILURE] += 1
+            continue
+
+        name = row.get("name", "")
+        if pd.isna(name) or not str(name).strip():
+            failures[INVALID_NAME_FAILURE] += 1
+            continue
+
+        age = row.get("age")
+        if isinstance(age, str):
+            age = age.strip()
+            age = float(age) if re.fullmatch(NUMBER_REGEX, age) else None
+        try:
+            age = int(age)
+        except (ValueError, TypeError, OverflowError):
+            failures[INVALID_AGE_FAILURE] += 1
+            continue
+        if not MIN_AGE <= age <= MAX_AGE:
+            failures[INVALID_AGE_FAILURE] += 1
+            continue
+
+        emails.append(normalized_email)
+        names.append(name)
+        ages.append(age)
+        seen.add(normalized_email)
+
+    users = pd.DataFrame(
+        {
+            "email": pd.Series(emails, dtype=object),
+            "name": pd.Series(names, dtype=object),
+            "age": pd.Series(ages, dtype="int64"),
+        }
+    )
+    return ValidationResult(users=users, failures=failures, key="email")
@@ -1,19 +1,58 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException, Throttled
 from rest_framework.generics import GenericAPIView
-from .serializers import FileUploadSerializer, LoginSerializer, TokenResponseSerializer
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from .serializers import (
+    FileUploadSerializer,
+    ImportJobSerializer,
+    LoginSerializer,
+    TokenResponseSerializer,
+    UploadSessionCreateSerializer,
+    UploadSessionSerializer,
+)
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.response import Response
-from .models import User
+from .models import ImportJob, RejectionReport, UploadSession
 from rest_framework import status
 from .utils import (
     get_tokens_for_user,
     ServiceError,
     get_formatted_response,
-    is_valid_email,
+    get_upload_detail,
+)
+from .admission import declared_length, import_admission
+from .auth import find_login_user
+from .importer import CsvImporter
+from .upload_handlers import StreamingCsvUploadHandler
+from .jobs import keep_failed_upload, queue_import_job, resume_import_job
+from .metrics import StageTimer, record_upload, registry
+from .parsing import PARSE_ERRORS
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from .throttling import (
+    UploadBytesThrottle,
+    UploadRequestThrottle,
+    UploadRowsThrottle,
+)
+from .result_cache import (
+    fingerprint,
+    get_cached_result,
+    result_cache_enabled,
+    store_result,
 )
+from .reports import REPORT_FORMATS, RejectionWriter, create_report
+from .schema import USER_SCHEMA, get_schema
+from .uploads import append_part, create_upload_session, finalize_upload_session
+from django.shortcuts import get_object_or_404
 from drf_spectacular.utils import extend_schema
 from .constants import CLIENT_ERROR_TYPE, VALIDATION_ERROR_TYPE
-import pandas as pd
-from django.db.models.functions import Lower
+from .exception_handler import custom_exception_handler
 import logging
 
 logger = logging.getLogger(__name__)
@@ -32,9 +71,8 @@ class GetTokenView(GenericAPIView):
         email = serializer.validated_data["email"]
         password = serializer.validated_data["password"]
 
-        try:
-            user = User.objects.get(email__iexact=email)
-        except User.DoesNotExist:
+        user = find_login_user(email)
+        if user is None:
             raise ServiceError(
                 detail="User with this email does not exist",
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -61,11 +99,121 @@ class GetTokenView(GenericAPIView):
         return Response(response, status=status.HTTP_200_OK)
 
 
+def _import_error(request, error):
+    """Pass service errors through and hide anything else behind a generic 400."""
+    if isinstance(error, ServiceError):
+        return error
+    logger.error(f"METHOD: {request.method}, PATH: {request.path}, MESSAGE: {error}")
+    return ServiceError(
+        detail="Unable to read a uploaded csv file",
+        status_code=status.HTTP_400_BAD_REQUEST,
+        error_type=VALIDATION_ERROR_TYPE,
+    )
+
+
+def _failed_import(request, error, file, importer, rejections, schema_name):
+    """Error response of a failed import.
+
+    An upload that failed part way for any reason other than its content,
+    such as a database error, is kept as a failed job holding the last
+    checkpoint, and the error detail names it so the client can resume the
+    import instead of sending the file again.
+    """
+    job = None
+    if (
+        importer is not None
+        and importer.rows_processed
+        and not isinstance(error, (ServiceError, *PARSE_ERRORS))
+    ):
+        user = request.user if request.user.is_authenticated else None
+        client_ident = UploadRowsThrottle().get_client_ident(request)
+        try:
+            job = keep_failed_upload(
+                user, file, client_ident, schema_name, importer, rejections
+            )
+        except Exception as e:
+            logger.error(f"METHOD: {request.method}, PATH: {request.path}, MESSAGE: {e}")
+    if rejections is not None:
+        if job is None:
+            rejections.discard()
+        else:
+            rejections.close()
+    service_error = _import_error(request, error)
+    if job is not None:
+        service_error.detail_error_response = {
+            "job_id": str(job.pk),
+            "rows_processed": job.rows_processed,
+        }
+    return service_error
+
+
+def _finish_upload(
+    request, importer, timer, file, client_ident, content_hash, idempotency_key, rejections
+):
+    """Charge the row budget, cache the result and publish metrics of an upload."""
+    UploadRowsThrottle().charge(client_ident, importer.rows_processed)
+    if content_hash is not None:
+        store_result(
+            client_ident,
+            content_hash,
+            importer.detail(),
+            idempotency_key,
+            data=_upload_data(rejections),
+        )
+    record_upload(timer, importer, file.size)
+    if timer.enabled:
+        logger.info(
+            f"METHOD: {request.method}, PATH: {request.path}, ROWS: {importer.rows_processed}, BYTES: {file.size}",
+            extra={
+                "stages": timer.durations,
+                "rows": importer.rows_processed,
+                "bytes": file.size,
+            },
+        )
+
+
+def _upload_data(rejections):
+    return {"upload_id": str(rejections.report.pk)} if rejections else None
+
+
+def _upload_response(importer, timer, rejections):
+    response = get_formatted_response(
+        data=_upload_data(rejections),
+        message="File uploaded successfully",
+        detail=importer.detail(),
+    )
+    headers = {"Server-Timing": timer.server_timing()} if timer.enabled else None
+    return response, headers
+
+
 @extend_schema(tags=["File Upload"])
 class FileUploadView(GenericAPIView):
+    """Generic csv import endpoint; subclasses set ``import_schema`` for other imports."""
+
     serializer_class = FileUploadSerializer
     parser_classes = (MultiPartParser, FormParser)
-    REQUIRED_COLUMNS = {"name", "email", "age"}
+    throttle_classes = (UploadRequestThrottle, UploadBytesThrottle, UploadRowsThrottle)
+    import_schema = USER_SCHEMA
+
+    admission_ticket = None
+
+    def initial(self, request, *args, **kwargs):
+        # Upload handlers must be in place before the body is parsed.
+        request.upload_handlers.insert(
+            0, StreamingCsvUploadHandler(request._request, schema=self.import_schema)
+        )
+        super().initial(request, *args, **kwargs)
+        # Admitted after authentication and throttling but before the body
+        # is read, which is where an upload starts to take memory.
+        if request.method == "POST":
+            self.admission_ticket = import_admission.acquire(
+                UploadRowsThrottle().get_client_ident(request), declared_length(request)
+            )
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if self.admission_ticket is not None:
+            self.admission_ticket.release()
+        return super().finalize_response(request, response, *args, **kwargs)
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
@@ -79,127 +227,373 @@ class FileUploadView(GenericAPIView):
 
         file = serializer.validated_data["file"]
 
+        with_report = serializer.validated_data["rejection_report"]
+        if serializer.validated_data["async_mode"]:
+            return self._queue_import_job(request, file, with_report)
+
+        client_ident = UploadRowsThrottle().get_client_ident(request)
+        idempotency_key = request.headers.get("Idempotency-Key", "")
+        content_hash = None
+        if result_cache_enabled(idempotency_key):
+            content_hash = fingerprint(file, self.import_schema.name)
+            result = get_cached_result(
+                client_ident, content_hash, idempotency_key, with_report
+            )
+            if result is not None:
+                response = get_formatted_response(
+                    data=result.data,
+                    message="File uploaded successfully",
+                    detail=result.detail,
+                )
+                return Response(
+                    response,
+                    status=status.HTTP_200_OK,
+                    headers={"Idempotent-Replayed": "true"},
+                )
+
+        timer = StageTimer()
+        rejections = None
+        if with_report:
+            user = request.user if request.user.is_authenticated else None
+            report = create_report(
+                user, self.import_schema.name, client_ident=client_ident
+            )
+            rejections = RejectionWriter(report)
+        importer = None
         try:
-            df = pd.read_csv(file)
+            importer = CsvImporter(
+                timer=timer, schema=self.import_schema, rejections=rejections
+            )
+            importer.run(file)
         except Exception as e:
-            logger.error(
-                f"METHOD: {request.method}, PATH: {request.path}, MESSAGE: {e}"
+            raise _failed_import(
+                request, e, file, importer, rejections, self.import_schema.name
             )
+        if rejections is not None:
+            rejections.close()
+
+        _finish_upload(
+            request,
+            importer,
+            timer,
+            file,
+            client_ident,
+            content_hash,
+            idempotency_key,
+            rejections,
+        )
+        response, headers = _upload_response(importer, timer, rejections)
+        return Response(response, status=status.HTTP_200_OK, headers=headers)
+
+    def _queue_import_job(self, request, file, with_report=False):
+        """Store the upload and hand it to the background worker pool."""
+        user = request.user if request.user.is_authenticated else None
+        job = queue_import_job(
+            user,
+            file,
+            UploadRowsThrottle().get_client_ident(request),
+            self.import_schema.name,
+            with_report,
+        )
+
+        response = get_formatted_response(
+            data={"job_id": str(job.pk)}, message="File accepted for import"
+        )
+        return Response(response, status=status.HTTP_202_ACCEPTED)
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncFileUploadView(View):
+    """Async variant of ``FileUploadView`` for ASGI deployments.
+
+    Django's ASGI handler buffers the request body without blocking the
+    event loop. Form parsing, hashing, csv parsing and validation run in
+    executor threads and inserts use the async ORM, so a worker keeps
+    serving other requests while slow uploads are imported. Authentication,
+    throttling, errors and responses match ``FileUploadView``.
+    """
+
+    authentication_classes = api_settings.DEFAULT_AUTHENTICATION_CLASSES
+    throttle_classes = FileUploadView.throttle_classes
+    import_schema = USER_SCHEMA
+
+    async def post(self, request, *args, **kwargs):
+        try:
+            return await self.upload(request)
+        except APIException as exc:
+            response = custom_exception_handler(exc, {"request": request, "view": self})
+            response.accepted_renderer = JSONRenderer()
+            response.accepted_media_type = JSONRenderer.media_type
+            response.renderer_context = {}
+            return response.render()
+
+    def authenticate(self, request):
+        for authentication_class in self.authentication_classes:
+            result = authentication_class().authenticate(request)
+            if result is not None:
+                return result[0]
+        return AnonymousUser()
+
+    def check_throttles(self, request):
+        waits = [
+            throttle.wait()
+            for throttle in (throttle_class() for throttle_class in self.throttle_classes)
+            if not throttle.allow_request(request, self)
+        ]
+        if waits:
+            waits = [wait for wait in waits if wait is not None]
+            raise Throttled(wait=max(waits) if waits else None)
+
+    @staticmethod
+    def parse_form(request):
+        data = request.POST.copy()
+        data.update(request.FILES)
+        return data
+
+    async def upload(self, request):
+        request.user = await sync_to_async(self.authenticate)(request)
+        await sync_to_async(self.check_throttles)(request)
+        ticket = await import_admission.aacquire(
+            UploadRowsThrottle().get_client_ident(request), declared_length(request)
+        )
+        with ticket:
+            return await self.import_upload(request)
+
+    async def import_upload(self, request):
+        loop = asyncio.get_running_loop()
+        serializer = FileUploadSerializer(
+            data=await loop.run_in_executor(None, self.parse_form, request)
+        )
+        if not serializer.is_valid():
             raise ServiceError(
-                detail="Unable to read a uploaded csv file",
+                detail="Validation error",
+                detail_error_response=serializer.errors,
                 status_code=status.HTTP_400_BAD_REQUEST,
                 error_type=VALIDATION_ERROR_TYPE,
             )
-        df.columns = df.columns.str.strip().str.lower()
-        if df.columns.duplicated().any():
-            raise ServiceError(
-                detail="Duplicate column names found in uploaded csv file",
-                status_code=status.HTTP_400_BAD_REQUEST,
-                error_type=CLIENT_ERROR_TYPE,
+
+        file = serializer.validated_data["file"]
+        with_report = serializer.validated_data["rejection_report"]
+        user = request.user if request.user.is_authenticated else None
+        client_ident = UploadRowsThrottle().get_client_ident(request)
+        if serializer.validated_data["async_mode"]:
+            job = await sync_to_async(queue_import_job)(
+                user, file, client_ident, self.import_schema.name, with_report
             )
-        if not self.REQUIRED_COLUMNS.issubset(set(df.columns)):
-            missing_columns = self.REQUIRED_COLUMNS - set(df.columns)
-            raise ServiceError(
-                detail=f"Missing required columns: {', '.join(missing_columns)}",
-                status_code=status.HTTP_400_BAD_REQUEST,
-                error_type=VALIDATION_ERROR_TYPE,
+            response = get_formatted_response(
+                data={"job_id": str(job.pk)}, message="File accepted for import"
             )
+            return JsonResponse(response, status=status.HTTP_202_ACCEPTED)
 
-        self._init_required_variables()
-
-        USER_OBJS = []
-        try:
-            for index, row in df.iterrows():
-                is_skipped, normalized_email = self._check_email_validation(
-                    row.get("email", "")
+        idempotency_key = request.headers.get("Idempotency-Key", "")
+        content_hash = None
+        if result_cache_enabled(idempotency_key):
+            content_hash = await loop.run_in_executor(
+                None, fingerprint, file, self.import_schema.name
+            )
+            result = await sync_to_async(get_cached_result)(
+                client_ident, content_hash, idempotency_key, with_report
+            )
+            if result is not None:
+                response = get_formatted_response(
+                    data=result.data,
+                    message="File uploaded successfully",
+                    detail=result.detail,
+                )
+                return JsonResponse(
+                    response,
+                    status=status.HTTP_200_OK,
+                    headers={"Idempotent-Replayed": "true"},
                 )
-                if is_skipped:
-                    continue
-                name = row.get("name", "")
-                if self._is_invalid_name(name):
-                    self.NAME_VALIDATION_FAILED_COUNT += 1
-                    continue
-
-                age = row.get("age")
-                is_skipped, age = self.check_age_validation(age)
-                if is_skipped:
-                    continue
-
-                USER_OBJS.append(User(email=normalized_email, name=name, age=age))
-                self.EXISTING_MAILS.add(normalized_email)
-
-            User.objects.bulk_create(USER_OBJS)
-            detail = {
-                "success": [f"{len(USER_OBJS)} user records uploaded successfully"],
-                "failed": [
-                    f"{self.NULL_EMAIL_VALIDATION_FAILED_COUNT} user records failed due to null email",
-                    f"{self.EXISTING_EMAIL_VALIDATION_FAILED_COUNT} user records failed due to existing email",
-                    f"{self.NAME_VALIDATION_FAILED_COUNT} user records failed due to invalid name",
-                    f"{self.VALID_EMAIL_FAILED_COUNT} user records failed due to invalid email",
-                    f"{self.AGE_VALIDATION_FAILED_COUNT} user records failed due to invalid age",
-                    f"{self.NULL_EMAIL_VALIDATION_FAILED_COUNT + self.EXISTING_EMAIL_VALIDATION_FAILED_COUNT + self.NAME_VALIDATION_FAILED_COUNT + self.VALID_EMAIL_FAILED_COUNT + self.AGE_VALIDATION_FAILED_COUNT} total user records skipped",
-                ],
-            }
 
-            response = get_formatted_response(
-                data=None, message="File uploaded successfully", detail=detail
+        timer = StageTimer()
+        rejections = None
+        if with_report:
+            report = await sync_to_async(create_report)(
+                user, self.import_schema.name, client_ident=client_ident
             )
-            return Response(response, status=status.HTTP_200_OK)
+            rejections = RejectionWriter(report)
+        importer = await sync_to_async(CsvImporter)(
+            timer=timer, schema=self.import_schema, rejections=rejections
+        )
+        try:
+            await importer.arun(file)
         except Exception as e:
-            logger.error(
-                f"METHOD: {request.method}, PATH: {request.path}, MESSAGE: {e}"
+            raise await sync_to_async(_failed_import)(
+                request, e, file, importer, rejections, self.import_schema.name
+            )
+        if rejections is not None:
+            await sync_to_async(rejections.close)()
+
+        await sync_to_async(_finish_upload)(
+            request,
+            importer,
+            timer,
+            file,
+            client_ident,
+            content_hash,
+            idempotency_key,
+            rejections,
+        )
+        response, headers = _upload_response(importer, timer, rejections)
+        return JsonResponse(response, status=status.HTTP_200_OK, headers=headers)
+
+
+class OwnedObjectsMixin:
+    """Limit ``queryset`` to the objects created by the requesting client.
+
+    Authenticated users see their own objects, anonymous clients those
+    created anonymously from the same ``get_client_ident``; others get a 404.
+    """
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.request.user.is_authenticated:
+            return queryset.filter(user=self.request.user)
+        return queryset.filter(
+            user=None, client_ident=UploadRowsThrottle().get_client_ident(self.request)
+        )
+
+
+@extend_schema(tags=["File Upload"])
+class ImportJobStatusView(OwnedObjectsMixin, GenericAPIView):
+    serializer_class = ImportJobSerializer
+    queryset = ImportJob.objects.all()
+
+    def get(self, request, job_id, *args, **kwargs):
+        job = get_object_or_404(self.get_queryset(), pk=job_id)
+        detail = None
+        if job.state == ImportJob.State.COMPLETED:
+            detail = get_upload_detail(
+                job.uploaded_count,
+                job.failures,
+                updated_count=job.updated_count,
+                schema=get_schema(job.schema),
             )
+
+        response = get_formatted_response(
+            data=self.get_serializer(job).data,
+            message=f"Import job is {job.state}",
+            detail=detail,
+        )
+        return Response(response, status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=["File Upload"], request=None)
+class ImportJobResumeView(OwnedObjectsMixin, GenericAPIView):
+    """Run a failed import job again from its last checkpoint."""
+
+    serializer_class = ImportJobSerializer
+    queryset = ImportJob.objects.all()
+
+    def post(self, request, job_id, *args, **kwargs):
+        job = resume_import_job(get_object_or_404(self.get_queryset(), pk=job_id))
+        response = get_formatted_response(
+            data=self.get_serializer(job).data, message="Import job resumed"
+        )
+        return Response(response, status=status.HTTP_202_ACCEPTED)
+
+
+@extend_schema(tags=["File Upload"], responses={200: str})
+class RejectionReportView(OwnedObjectsMixin, GenericAPIView):
+    """Stream the skipped rows of an upload without loading the report in memory."""
+
+    queryset = RejectionReport.objects.all()
+
+    def get(self, request, upload_id, file_format, *args, **kwargs):
+        report = get_object_or_404(self.get_queryset(), pk=upload_id)
+        if not report.file.storage.exists(report.file.name):
+            raise Http404
+        stream, content_type = REPORT_FORMATS[file_format]
+        response = StreamingHttpResponse(stream(report), content_type=content_type)
+        response["Content-Disposition"] = (
+            f'attachment; filename="rejections-{report.pk}.{file_format}"'
+        )
+        return response
+
+
+@extend_schema(tags=["Metrics"], responses={200: str})
+class MetricsView(GenericAPIView):
+    def get(self, request, *args, **kwargs):
+        return HttpResponse(
+            registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8"
+        )
+
+
+@extend_schema(tags=["Resumable Upload"])
+class UploadSessionCreateView(GenericAPIView):
+    serializer_class = UploadSessionCreateSerializer
+    throttle_classes = (UploadRequestThrottle,)
+
+    def post(self, request, *args, **kwargs):
+        serializer = self.get_serializer(data=request.data)
+        if not serializer.is_valid():
             raise ServiceError(
-                detail="Unable to read a uploaded csv file",
+                detail="Validation error",
+                detail_error_response=serializer.errors,
                 status_code=status.HTTP_400_BAD_REQUEST,
                 error_type=VALIDATION_ERROR_TYPE,
             )
 
-    def _init_required_variables(self):
-        """Initialize required variables"""
-
-        self.NULL_EMAIL_VALIDATION_FAILED_COUNT = 0
-        self.EXISTING_EMAIL_VALIDATION_FAILED_COUNT = 0
-        self.VALID_EMAIL_FAILED_COUNT = 0
-        self.NAME_VALIDATION_FAILED_COUNT = 0
-        self.AGE_VALIDATION_FAILED_COUNT = 0
-        self.EXISTING_MAILS = set(
-            User.objects.annotate(lower_email=Lower("email")).values_list(
-                "lower_email", flat=True
-            )
-        )
-
-    def _check_email_validation(self, email: str):
-        """Accept Email and check if it is valid or not. If valid return normalized email else return None."""
-        if pd.isna(email):
-            self.NULL_EMAIL_VALIDATION_FAILED_COUNT += 1
-            return True, None
-        normalized_email = email.strip().lower()
-
-        if not is_valid_email(normalized_email):
-            self.VALID_EMAIL_FAILED_COUNT += 1
-            return True, None
-        if normalized_email in self.EXISTING_MAILS:
-            self.EXISTING_EMAIL_VALIDATION_FAILED_COUNT += 1
-            return True, None
-        return False, normalized_email
-
-    def check_age_validation(self, age):
-        """Accept age and check if it is valid or not. If valid return age else return None."""
-        if pd.isna(age):
-            self.AGE_VALIDATION_FAILED_COUNT += 1
-            return True, None
-        try:
-            age = int(age)
-            if age >= 0 and age <= 120:
-                return False, age
-            else:
-                self.AGE_VALIDATION_FAILED_COUNT += 1
-                return True, None
-        except (ValueError, TypeError):
-            self.AGE_VALIDATION_FAILED_COUNT += 1
-            return True, None
-
-    def _is_invalid_name(self, name) -> bool:
-        """Accept name and check if it is valid or not. If valid return False else return True."""
-        return pd.isna(name) or not str(name).strip()
+        user = request.user if request.user.is_authenticated else None
+        session = create_upload_session(
+            user=user,
+            client_ident=UploadRowsThrottle().get_client_ident(request),
+            **serializer.validated_data,
+        )
+        response = get_formatted_response(
+            data=UploadSessionSerializer(session).data,
+            message="Upload session created",
+        )
+        return Response(response, status=status.HTTP_201_CREATED)
+
+
+@extend_schema(tags=["Resumable Upload"])
+class UploadSessionView(OwnedObjectsMixin, GenericAPIView):
+    """GET reports the received offset, PUT appends a byte range.
+
+    PUT bodies are raw bytes described by a ``Content-Range`` header and an
+    optional ``X-Checksum-SHA256`` hex digest of the part.
+    """
+
+    serializer_class = UploadSessionSerializer
+    queryset = UploadSession.objects.all()
+    throttle_classes = (UploadBytesThrottle,)
+
+    def get(self, request, upload_id, *args, **kwargs):
+        session = get_object_or_404(self.get_queryset(), pk=upload_id)
+        response = get_formatted_response(
+            data=self.get_serializer(session).data,
+            message=f"Upload session is {session.state}",
+        )
+        return Response(response, status=status.HTTP_200_OK)
+
+    def put(self, request, upload_id, *args, **kwargs):
+        session = get_object_or_404(self.get_queryset(), pk=upload_id)
+        session = append_part(
+            session,
+            request.stream,
+            request.headers.get("Content-Range"),
+            sha256=request.headers.get("X-Checksum-SHA256"),
+        )
+        response = get_formatted_response(
+            data=self.get_serializer(session).data, message="Part received"
+        )
+        return Response(response, status=status.HTTP_200_OK)
+
+
+@extend_schema(tags=["Resumable Upload"], request=None)
+class UploadSessionFinalizeView(OwnedObjectsMixin, GenericAPIView):
+    serializer_class = UploadSessionSerializer
+    queryset = UploadSession.objects.all()
+    throttle_classes = (UploadRowsThrottle,)
+
+    def post(self, request, upload_id, *args, **kwargs):
+        session = get_object_or_404(self.get_queryset(), pk=upload_id)
+        session = finalize_upload_session(
+            session, client_ident=UploadRowsThrottle().get_client_ident(request)
+        )
+        response = get_formatted_response(
+            data={"job_id": str(session.job_id)}, message="File accepted for import"
+        )
+        return Response(response, status=status.HTTP_202_ACCEPTED)
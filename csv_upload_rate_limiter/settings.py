@@ -81,6 +81,17 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Keep connections open between requests; CSV_IMPORT['DB_PROFILE']
+        # sets the PRAGMAs they start with.
+        'CONN_MAX_AGE': 60,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # Transactions take the write lock when they begin, so concurrent
+            # imports wait for each other instead of failing with
+            # "database is locked" when a read turns into a write.
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -104,13 +115,29 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The first hasher is used for new passwords; service accounts use the
+# cheaper apis.auth.ServiceAccountPasswordHasher instead.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'apis.auth.ServiceAccountPasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
 
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
     'DEFAULT_AUTHENTICATION_CLASSES': (
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ),
-     'EXCEPTION_HANDLER': 'apis.exception_handler.custom_exception_handler'
+     'EXCEPTION_HANDLER': 'apis.exception_handler.custom_exception_handler',
+    'DEFAULT_THROTTLE_RATES': {
+        'upload_requests': '30/min',
+        'upload_bytes': '1073741824/hour',
+        'upload_rows': '10000000/hour',
+    },
 }
 
 # Internationalization
@@ -130,6 +157,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -144,6 +174,50 @@ SPECTACULAR_SETTINGS = {
     'COMPONENT_SPLIT_REQUEST': True,
 }
 
+CSV_IMPORT = {
+    'CHUNK_SIZE': 50_000,
+    'BATCH_SIZE': 1_000,
+    # error, ignore or update
+    'INSERT_CONFLICTS': 'error',
+    # auto, pyarrow or c
+    'PARSER_ENGINE': 'auto',
+    'MMAP_UPLOADS': True,
+    # 0 disables parsing while the upload is received
+    'STREAM_PARSE_MAX_BYTES': 32 * 1024 * 1024,
+    # Per worker process admission control, 0 disables a limit
+    'IMPORT_MAX_CONCURRENT': 4,
+    'IMPORT_MAX_CONCURRENT_PER_USER': 2,
+    'IMPORT_MEMORY_BUDGET': 1024 * 1024 * 1024,
+    'IMPORT_ROW_MEMORY_BYTES': 600,
+    'IMPORT_QUEUE_SIZE': 16,
+    'IMPORT_QUEUE_TIMEOUT': 30,
+    'JOB_WORKERS': 2,
+    'FAILED_IMPORT_TTL': 86_400,
+    'UPLOAD_SESSION_MAX_BYTES': 4 * 1024 * 1024 * 1024,
+    'UPLOAD_SESSION_TTL': 86_400,
+    # query, snapshot, hashed, shared, bloom or none
+    'EMAIL_LOOKUP': 'shared',
+    'BLOOM_FALSE_POSITIVE_RATE': 0.01,
+    'EMAIL_SNAPSHOT_MAX_AGE': 300,
+    # 0 disables process-pool validation
+    'PARALLEL_WORKERS': 0,
+    'PARALLEL_MIN_ROWS': 20_000,
+    # off, hash or key
+    'RESULT_CACHE': 'key',
+    'RESULT_CACHE_TTL': 3600,
+    'RESULT_CACHE_MAX_ENTRIES': 1000,
+    'REJECTION_REPORT_TTL': 86_400,
+    'SERVICE_ACCOUNT_HASH_ITERATIONS': 10_000,
+    'LOGIN_MISSING_CACHE_TTL': 30,
+    # import or default
+    'DB_PROFILE': 'import',
+    'METRICS_ENABLED': True,
+    # token_bucket or sliding_window
+    'THROTTLE_ALGORITHM': 'token_bucket',
+    # local, cache or database
+    'THROTTLE_STORE': 'local',
+}
+
 SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),